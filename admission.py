@@ -0,0 +1,353 @@
+"""
+Admission queue for event registrations.
+
+When a popular event opens, every student's registration used to be its own
+SQLite write transaction, and most of them failed on the database lock. Now a
+registration is an intent: submit() records it with one INSERT in a small
+shared SQLite file (ADMISSION_DB, WAL mode) and returns at once with an intent
+id. Intents are numbered as they arrive, so the order of arrival is the order
+of admission across all worker processes.
+
+Every process runs a writer thread, but only the one holding the lock on
+ADMISSION_DB + '.lock' applies intents, so there is one writer per host; if its
+process exits, another takes over. It drains queued intents in batches of up
+to ADMISSION_BATCH_SIZE (looking again every ADMISSION_BATCH_WINDOW_MS when
+idle) and applies each batch in one transaction per shard:
+
+* capacity is read once per event in the batch, counting pending and confirmed
+  registrations, and seats are handed out in arrival order;
+* a student already registered for the event is answered 'duplicate' (backed by
+  the unique index on event_registrations (user_id, event_id)), a closed or
+  full event 'closed' / 'full'; a cancelled registration is reactivated;
+* free events are confirmed immediately, paid ones are held as 'pending' until
+  payment is reconciled. A hold still unpaid after ADMISSION_HOLD_TTL seconds
+  is cancelled (and its seat released) the next time the event is admitted to;
+* an event is closed when it does not take registrations, has already taken
+  place or is past its registration deadline.
+
+Outcomes are written back to the intent, so clients can poll
+/event/registrations/<intent_id> on any worker, optionally with ?wait=<seconds>
+to block until it is decided. Outcomes are kept for ADMISSION_RESULT_TTL
+seconds.
+"""
+import asyncio
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Not POSIX: every process writes, as before the shared store
+    fcntl = None
+
+from sqlalchemy import func
+
+from extensions import db
+from models import Event, EventRegistration, EventDirectory
+from sharding import shard_router
+
+QUEUED = 'queued'
+CONFIRMED = 'confirmed'
+PENDING = 'pending'
+DUPLICATE = 'duplicate'
+FULL = 'full'
+CLOSED = 'closed'
+FAILED = 'failed'
+
+MESSAGES = {
+    QUEUED: 'Your registration is in the queue.',
+    CONFIRMED: 'You are registered for this event.',
+    PENDING: 'Your seat is reserved until payment is received. Quote your payment reference.',
+    DUPLICATE: 'You are already registered for this event.',
+    FULL: 'Sorry, this event is full.',
+    CLOSED: 'Registration for this event is closed.',
+    FAILED: 'Your registration could not be processed. Please try again.',
+}
+
+HOLDS_SEAT = ('pending', 'confirmed')
+
+
+def registration_closed(event, today=None):
+    """Whether ``event`` (an Event or a row with the same columns) no longer takes registrations."""
+    today = today or date.today()
+    return (not event.registration_required or event.date < today
+            or bool(event.registration_deadline and today > event.registration_deadline))
+
+
+class Intent:
+    __slots__ = ('id', 'user_id', 'event_id', 'status', 'registration_id', 'payment_reference')
+
+    def __init__(self, id, user_id, event_id, status=QUEUED, registration_id=None, payment_reference=None):
+        self.id = id
+        self.user_id = user_id
+        self.event_id = event_id
+        self.status = status
+        self.registration_id = registration_id
+        self.payment_reference = payment_reference
+
+    def resolve(self, status, registration_id=None, payment_reference=None):
+        self.status = status
+        self.registration_id = registration_id
+        self.payment_reference = payment_reference
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_id': self.event_id,
+            'status': self.status,
+            'message': MESSAGES[self.status],
+            'registration_id': self.registration_id,
+            'payment_reference': self.payment_reference
+        }
+
+
+class IntentStore:
+    """Intents shared by every worker on the host, in their own SQLite file."""
+    COLUMNS = 'id, user_id, event_id, status, registration_id, payment_reference'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        # Opened on first use, so importing the app does not create the file
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS intents ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, user_id INTEGER NOT NULL, "
+                "event_id INTEGER NOT NULL, status TEXT NOT NULL, registration_id INTEGER, "
+                "payment_reference TEXT, decided_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_intents_status ON intents (status, seq)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_intents_decided_at ON intents (decided_at)")
+            self._local.conn = conn
+        return conn
+
+    def add(self, intent, max_queued):
+        """Queue ``intent`` unless ``max_queued`` are already waiting; returns whether it was queued."""
+        cursor = self._connect().execute(
+            "INSERT INTO intents (id, user_id, event_id, status) SELECT ?, ?, ?, ? "
+            "WHERE (SELECT COUNT(*) FROM intents WHERE status = ?) < ?",
+            (intent.id, intent.user_id, intent.event_id, QUEUED, QUEUED, max_queued)
+        )
+        return cursor.rowcount == 1
+
+    def get(self, intent_id):
+        row = self._connect().execute(
+            f"SELECT {self.COLUMNS} FROM intents WHERE id = ?", (intent_id,)).fetchone()
+        return Intent(*row) if row else None
+
+    def queued(self, limit):
+        """The oldest ``limit`` undecided intents, in arrival order."""
+        return [Intent(*row) for row in self._connect().execute(
+            f"SELECT {self.COLUMNS} FROM intents WHERE status = ? ORDER BY seq LIMIT ?", (QUEUED, limit))]
+
+    def save(self, intents):
+        """Record the outcomes of a batch in one transaction."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE intents SET status = ?, registration_id = ?, payment_reference = ?, decided_at = ? "
+                "WHERE id = ?",
+                [(i.status, i.registration_id, i.payment_reference, now, i.id) for i in intents]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def expire(self, ttl):
+        self._connect().execute("DELETE FROM intents WHERE decided_at < ?", (time.time() - ttl,))
+
+
+class AdmissionQueue:
+    def __init__(self):
+        self.store = None
+        self._writer = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._app = None
+
+    def init_app(self, app):
+        app.config.setdefault('ADMISSION_QUEUE_SIZE', 10000)
+        app.config.setdefault('ADMISSION_BATCH_SIZE', 200)
+        app.config.setdefault('ADMISSION_BATCH_WINDOW_MS', 50)
+        app.config.setdefault('ADMISSION_RESULT_TTL', 600)
+        app.config.setdefault('ADMISSION_HOLD_TTL', 48 * 3600)
+        app.config.setdefault('ADMISSION_DB', os.path.join(app.instance_path, 'admission.db'))
+        os.makedirs(os.path.dirname(app.config['ADMISSION_DB']), exist_ok=True)
+        self.store = IntentStore(app.config['ADMISSION_DB'])
+        self._app = app
+        app.extensions['admission'] = self
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name='admission-writer', daemon=True)
+                self._writer.start()
+
+    def submit(self, user_id, event_id):
+        """Queue a registration intent; returns it, or None when the queue is full."""
+        intent = Intent(secrets.token_urlsafe(12), user_id, event_id)
+        if not self.store.add(intent, self._app.config['ADMISSION_QUEUE_SIZE']):
+            return None
+        self._ensure_writer()
+        self._wakeup.set()
+        return intent
+
+    def get(self, intent_id, user_id):
+        intent = self.store.get(intent_id)
+        if intent is None or intent.user_id != user_id:
+            return None
+        return intent
+
+    def wait(self, intent, timeout, interval=0.05):
+        """Poll until ``intent`` is decided or ``timeout`` passes; returns its latest state."""
+        deadline = time.monotonic() + timeout
+        while intent.status == QUEUED and time.monotonic() < deadline:
+            time.sleep(interval)
+            intent = self.store.get(intent.id) or intent
+        return intent
+
+    async def wait_async(self, intent_id, timeout, interval=0.05):
+        """Await an intent's outcome on the event loop without holding a thread (see asgi.py)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            # A primary-key read on a local WAL file; cheap enough for the loop
+            intent = self.store.get(intent_id)
+            if intent is None or intent.status != QUEUED:
+                return
+            await asyncio.sleep(interval)
+
+    def _run(self):
+        if fcntl is not None:
+            # Blocks until no other process is the writer
+            lock_file = open(self._app.config['ADMISSION_DB'] + '.lock', 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        while True:
+            config = self._app.config
+            batch = self.store.queued(config['ADMISSION_BATCH_SIZE'])
+            if not batch:
+                self._wakeup.wait(config['ADMISSION_BATCH_WINDOW_MS'] / 1000)
+                self._wakeup.clear()
+                continue
+            with self._app.app_context():
+                try:
+                    self.apply(batch)
+                except Exception:
+                    self._app.logger.exception('Admission batch failed')
+                    for intent in batch:
+                        if intent.status == QUEUED:
+                            intent.resolve(FAILED)
+            # If the process dies before this, the batch is applied again and
+            # the already admitted students are answered 'duplicate'
+            self.store.save(batch)
+            self.store.expire(config['ADMISSION_RESULT_TTL'])
+
+    def apply(self, batch):
+        """Admit a batch of intents in arrival order, one transaction per shard."""
+        by_school = {}
+        event_schools = self._event_schools({intent.event_id for intent in batch})
+        for intent in batch:
+            school_id = event_schools.get(intent.event_id)
+            if school_id is None:
+                intent.resolve(CLOSED)
+            else:
+                by_school.setdefault(school_id, []).append(intent)
+
+        for school_id, intents in by_school.items():
+            session = shard_router.session_for(school_id)
+            try:
+                self._apply_shard(session, intents)
+            except Exception:
+                session.rollback()
+                raise
+
+    def _event_schools(self, event_ids):
+        if shard_router.enabled:
+            rows = db.session.query(EventDirectory.id, EventDirectory.school_id).filter(
+                EventDirectory.id.in_(event_ids))
+        else:
+            rows = db.session.query(Event.id, Event.school_id).filter(Event.id.in_(event_ids))
+        return dict(rows.all())
+
+    def _apply_shard(self, session, intents):
+        event_ids = {intent.event_id for intent in intents}
+        user_ids = {intent.user_id for intent in intents}
+
+        events = {row.id: row for row in session.query(
+            Event.id, Event.date, Event.capacity, Event.price, Event.registration_required,
+            Event.registration_deadline
+        ).filter(Event.id.in_(event_ids))}
+        self._release_expired_holds(session, event_ids)
+        taken = dict(session.query(EventRegistration.event_id, func.count(EventRegistration.id)).filter(
+            EventRegistration.event_id.in_(event_ids),
+            EventRegistration.status.in_(HOLDS_SEAT)
+        ).group_by(EventRegistration.event_id).all())
+        # Includes cancelled rows: they are reactivated, as (user_id, event_id) is unique
+        registered = {(registration.user_id, registration.event_id): registration
+                      for registration in session.query(EventRegistration).filter(
+                          EventRegistration.event_id.in_(event_ids),
+                          EventRegistration.user_id.in_(user_ids))}
+
+        admitted = []
+        today = date.today()
+        for intent in intents:
+            event = events.get(intent.event_id)
+            if event is None or registration_closed(event, today):
+                intent.resolve(CLOSED)
+                continue
+            key = (intent.user_id, intent.event_id)
+            existing = registered.get(key)
+            if existing is not None and existing.status != 'cancelled':
+                intent.resolve(DUPLICATE)
+                continue
+            if event.capacity and taken.get(event.id, 0) >= event.capacity:
+                intent.resolve(FULL)
+                continue
+
+            paid = bool(event.price)
+            registration = existing or EventRegistration(user_id=intent.user_id, event_id=intent.event_id)
+            registration.registration_date = datetime.utcnow()
+            registration.status = 'pending' if paid else 'confirmed'
+            registration.payment_status = 'unpaid'
+            registration.payment_amount = event.price or 0.0
+            registration.payment_date = None
+            # Quoted on the bank transfer so reconciliation.py can match it
+            registration.payment_reference = f'ES{event.id}-{secrets.token_hex(4).upper()}' if paid else None
+            if existing is None:
+                session.add(registration)
+            registered[key] = registration
+            taken[event.id] = taken.get(event.id, 0) + 1
+            admitted.append((intent, registration, PENDING if paid else CONFIRMED))
+
+        # One write transaction for the whole batch (the rollup listener runs on this flush)
+        session.flush()
+        outcomes = [(intent, status, registration.id, registration.payment_reference)
+                    for intent, registration, status in admitted]
+        session.commit()
+        for intent, status, registration_id, payment_reference in outcomes:
+            intent.resolve(status, registration_id, payment_reference)
+
+    def _release_expired_holds(self, session, event_ids):
+        """Cancel unpaid 'pending' holds older than ADMISSION_HOLD_TTL so their seats count as free."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self._app.config['ADMISSION_HOLD_TTL'])
+        # Loaded and changed one by one, not a bulk UPDATE, so the rollup listener sees them
+        for registration in session.query(EventRegistration).filter(
+                EventRegistration.event_id.in_(event_ids),
+                EventRegistration.status == 'pending',
+                EventRegistration.payment_status == 'unpaid',
+                EventRegistration.registration_date < cutoff):
+            registration.status = 'cancelled'
+        session.flush()
+
+
+admission_queue = AdmissionQueue()
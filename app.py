@@ -6,6 +6,16 @@ from flask_mail import Mail, Message
 from itsdangerous import URLSafeTimedSerializer
 from dotenv import load_dotenv
 from extensions import db, login_manager
+from sharding import shard_router
+import tokens
+from rate_limit import limiter
+import backup
+import reminders
+import media
+import assets
+import reconciliation
+from admission import admission_queue
+from shared_cache import shared_cache
 
 # Import models to ensure they are registered with SQLAlchemy
 from models import User, School, Event
@@ -13,17 +23,37 @@ from models import User, School, Event
 # Load environment variables
 load_dotenv()
 
-def create_app():
+def create_app(config=None):
     # Initialize Flask app
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-for-testing')
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///school_events.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Finished events and their registrations are moved here by archive.py
+    app.config['SQLALCHEMY_BINDS'] = {'archive': 'sqlite:///school_events_archive.db'}
+    app.config['ARCHIVE_HORIZON_DAYS'] = int(os.getenv('ARCHIVE_HORIZON_DAYS', '365'))
+    app.config['ARCHIVE_BATCH_SIZE'] = 500
+    app.config['PROVISIONING_BATCH_SIZE'] = 1000
+    app.config['PROVISIONING_WORKERS'] = None  # defaults to os.cpu_count()
+    # Per-school database files for events, contacts and registrations (see sharding.py)
+    app.config['SHARDING_ENABLED'] = os.getenv('SHARDING_ENABLED', '0') == '1'
+    # Throttles login, registration and password reset (see rate_limit.py)
+    app.config['RATE_LIMIT_BACKEND'] = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    # Cache shared by every worker on the host (see shared_cache.py)
+    app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memory')
+    
+    # Overrides, e.g. from query_budget.py
+    if config:
+        app.config.update(config)
 
     # Initialize extensions
     db.init_app(app)
+    shard_router.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
+    limiter.init_app(app)
+    shared_cache.init_app(app)
+    admission_queue.init_app(app)
     
     # Initialize CSRF protection
     csrf = CSRFProtect(app)
@@ -43,6 +73,10 @@ def create_app():
 
     # Initialize serializer
     app.serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'])
+    tokens.init_app(app)
+    backup.init_app(app)
+    reconciliation.init_app(app)
+    reminders.init_app(app)
     app.mail = mail  # Make mail instance available throughout the app
     
     # Configure email sending (in production, replace with a real email service)
@@ -54,12 +88,34 @@ def create_app():
     
     app.send_email = send_email
     
+    # Jinja bytecode cache and {% cache %} fragments for event cards
+    import template_cache
+    template_cache.init_app(app)
+    
+    # /media: range requests, content-hashed immutable URLs, precompressed assets
+    app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '0') == '1'
+    media.init_app(app)
+    
+    # /assets: content-addressed 3D models shared by event layouts
+    assets.init_app(app)
+    
     # Register blueprints
     from routes.main import main_bp
     from routes.auth import auth_bp
+    from routes.admin import admin_bp
+    from routes.api import api_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(api_bp, url_prefix='/api')
+    
+    # API clients authenticate with bearer tokens, not session cookies;
+    # tokens.token_required only falls back to the cookie for safe methods
+    csrf.exempt(api_bp)
+    
+    # Keep per-school registration rollups in step with every flush
+    import rollups  # noqa: F401
     
     # Error handlers
     @app.errorhandler(403)
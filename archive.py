@@ -0,0 +1,119 @@
+"""
+Hot/cold archival of finished events.
+
+Events whose date is older than ARCHIVE_HORIZON_DAYS are moved, together with
+their registrations, into the archive database (the 'archive' bind) in batches
+of ARCHIVE_BATCH_SIZE. Each batch is written to the archive first and only then
+deleted from the hot tables, so an interrupted run can simply be repeated.
+
+The moves use Core statements on purpose: the rollup flush listener must not
+treat archived registrations as cancelled, because the dashboard still counts
+them.
+
+Schedule it with cron, e.g. nightly:
+
+    15 3 * * * cd /srv/eventsync && python archive.py
+"""
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import select, insert, delete
+
+from extensions import db
+from models import School, Event, EventRegistration, ArchivedEvent, ArchivedEventRegistration
+from shared_cache import shared_cache
+from sharding import shard_router
+
+
+def _rows(session, stmt, target):
+    columns = [column.name for column in target.__table__.columns]
+    return [
+        {name: row[name] for name in columns if name in row}
+        for row in (r._mapping for r in session.execute(stmt))
+    ]
+
+
+def archive_batch(session, cutoff, batch_size):
+    """Move up to ``batch_size`` events older than ``cutoff``; returns how many moved."""
+    event_ids = [event_id for (event_id,) in session.query(Event.id).filter(
+        Event.date < cutoff).order_by(Event.id).limit(batch_size)]
+    if not event_ids:
+        return 0
+
+    events = _rows(session, select(Event.__table__).where(Event.id.in_(event_ids)), ArchivedEvent)
+    registrations = _rows(session, select(EventRegistration.__table__).where(
+        EventRegistration.event_id.in_(event_ids)), ArchivedEventRegistration)
+
+    # Copy into the archive in one transaction...
+    db.session.execute(insert(ArchivedEvent.__table__).prefix_with('OR REPLACE'), events)
+    if registrations:
+        db.session.execute(insert(ArchivedEventRegistration.__table__).prefix_with('OR REPLACE'), registrations)
+    db.session.commit()
+
+    # ...then drop from the hot tables in another
+    session.execute(delete(EventRegistration).where(EventRegistration.event_id.in_(event_ids)))
+    session.execute(delete(Event).where(Event.id.in_(event_ids)))
+    session.commit()
+    return len(event_ids)
+
+
+def archive_past_events(horizon_days=None, batch_size=None):
+    horizon_days = horizon_days if horizon_days is not None else current_app.config['ARCHIVE_HORIZON_DAYS']
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = date.today() - timedelta(days=horizon_days)
+
+    if shard_router.enabled:
+        sessions = [shard_router.session_for(school_id) for (school_id,) in db.session.query(School.id)]
+    else:
+        sessions = [db.session]
+
+    total = 0
+    for session in sessions:
+        while True:
+            moved = archive_batch(session, cutoff, batch_size)
+            total += moved
+            if moved < batch_size:
+                break
+    if total:
+        shared_cache.bump('events')
+    return total
+
+
+def past_events(school_id, limit, offset=0):
+    """
+    One page of a school's finished events, newest first: still-hot ones, then
+    the archive. Returns (events, whether there are more).
+    """
+    today = date.today()
+    session = shard_router.session_for(school_id)
+    hot_query = session.query(Event).filter(Event.school_id == school_id, Event.date < today)
+    hot = hot_query.order_by(Event.date.desc(), Event.id.desc()).offset(offset).limit(limit + 1).all()
+    if len(hot) > limit:
+        return hot[:limit], True
+
+    # The page runs into the archive: skip whatever part of the offset the hot rows did not use
+    if hot or not offset:
+        cold_offset = 0
+    else:
+        cold_offset = offset - hot_query.count()
+    remaining = limit - len(hot)
+    cold = ArchivedEvent.query.filter_by(school_id=school_id).order_by(
+        ArchivedEvent.date.desc(), ArchivedEvent.id.desc()
+    ).offset(cold_offset).limit(remaining + 1).all()
+    return hot + cold[:remaining], len(cold) > remaining
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Move past events into the archive database.')
+    parser.add_argument('--horizon-days', type=int, help='archive events older than this many days')
+    parser.add_argument('--batch-size', type=int, help='events per transaction')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        moved = archive_past_events(args.horizon_days, args.batch_size)
+        print(f"✅ Archived {moved} events")
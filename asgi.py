@@ -0,0 +1,183 @@
+"""
+Optional ASGI entry point.
+
+Flask stays a WSGI application: every request holds one worker thread from
+start to finish, including the time spent waiting or trickling bytes to a slow
+client. Under ASGI two endpoints are handled on the event loop instead:
+
+* GET /event/registrations/<intent_id>?wait=N: the admission long poll. The
+  wait happens on the event loop and the request then goes to the Flask view
+  without it, so the view still does the login and ownership checks. A
+  waiting client holds no thread.
+* GET /assets/<digest><ext>: immutable 3D models are streamed in chunks from
+  the event loop. Range requests fall through to Flask.
+
+Everything else (main_bp, auth_bp, admin, api) goes to the same Flask app
+through asgiref's WsgiToAsgi, which builds the WSGI environ. Stock WsgiToAsgi
+calls the app with thread_sensitive=True, i.e. on one thread per process, so
+each Flask request in a worker would wait for the previous one. Here the calls
+run on a pool of ASGI_DB_THREADS threads, which also caps the database sessions
+open at once however many connections are waiting.
+
+The trade-off: Flask routes get the concurrency of a threaded WSGI worker with
+ASGI_DB_THREADS threads, no more. Only the two endpoints above scale with the
+number of open connections.
+
+    pip install asgiref uvicorn
+    uvicorn asgi:app --workers 4
+
+bench_asgi.py compares how many concurrent connections this and wsgi.py sustain.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.exceptions import NotFound
+from werkzeug.routing import Map, Rule
+
+from admission import admission_queue
+from app import create_app
+from assets import ASSET_NAME_RE, ASSET_TYPES, IMMUTABLE_MAX_AGE
+
+CHUNK_SIZE = 256 * 1024
+MAX_WAIT = 25  # same cap as routes.main.registration_status
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+class PooledWsgiInstance(WsgiToAsgiInstance):
+    """
+    WsgiToAsgiInstance whose WSGI call runs on ``executor``. asgiref's own
+    run_wsgi_app is bound to a thread-sensitive sync_to_async at class level,
+    so it is replaced rather than rewrapped; the body follows asgiref 3.7
+    (pinned in requirements.txt).
+    """
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.run_wsgi_app = sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=executor)
+
+    def _run_wsgi_app(self, body):
+        environ = self.build_environ(self.scope, body)
+        bytes_sent = 0
+        for output in self.wsgi_application(environ, self.start_response):
+            if not self.response_started:
+                self.response_started = True
+                self.sync_send(self.response_start)
+            # Never send more than the Content-Length the app declared
+            if self.response_content_length is not None:
+                output = output[:self.response_content_length - bytes_sent]
+            self.sync_send({'type': 'http.response.body', 'body': output, 'more_body': True})
+            bytes_sent += len(output)
+            if bytes_sent == self.response_content_length:
+                break
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi running the app on ``executor`` instead of asgiref's single thread."""
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+
+class AsyncGateway:
+    def __init__(self, flask_app):
+        flask_app.config.setdefault('ASGI_DB_THREADS', 8)
+        self.flask_app = flask_app
+        self.db_pool = ThreadPoolExecutor(max_workers=flask_app.config['ASGI_DB_THREADS'],
+                                          thread_name_prefix='asgi-db')
+        self.wsgi = PooledWsgiToAsgi(flask_app, self.db_pool)
+        self.routes = Map([
+            Rule('/event/registrations/<intent_id>', endpoint=self.registration_status),
+            Rule('/assets/<filename>', endpoint=self.asset),
+        ])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            try:
+                handler, args = self.routes.bind('localhost').match(scope['path'])
+            except NotFound:
+                pass
+            else:
+                return await handler(scope, receive, send, **args)
+        return await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.db_pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def registration_status(self, scope, receive, send, intent_id):
+        query = parse_qsl(scope['query_string'].decode('latin-1'))
+        try:
+            wait = min(float(dict(query).get('wait', 0)), MAX_WAIT)
+        except ValueError:
+            wait = 0
+        if wait > 0:
+            # Returns at once for unknown or decided intents; the ids are
+            # unguessable, and the view still checks the login and the owner
+            await admission_queue.wait_async(intent_id, wait)
+        query = [(key, value) for key, value in query if key != 'wait']
+        await self.wsgi(dict(scope, query_string=urlencode(query).encode('latin-1')), receive, send)
+
+    async def asset(self, scope, receive, send, filename):
+        match = ASSET_NAME_RE.match(filename)
+        if match is None or match.group(2) not in ASSET_TYPES or _header(scope, b'range'):
+            return await self.wsgi(scope, receive, send)
+        digest, extension = match.groups()
+        path = os.path.join(self.flask_app.config['ASSET_DIR'], digest[:2], filename)
+        if not os.path.isfile(path):
+            return await self.wsgi(scope, receive, send)
+
+        headers = [
+            (b'etag', f'"{digest}"'.encode()),
+            (b'cache-control', f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'.encode()),
+            (b'accept-ranges', b'bytes'),
+        ]
+        if digest in (_header(scope, b'if-none-match') or ''):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        size = os.path.getsize(path)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers + [
+            (b'content-type', ASSET_TYPES[extension].encode()),
+            (b'content-length', str(size).encode()),
+        ]})
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, CHUNK_SIZE)
+                more = len(chunk) == CHUNK_SIZE
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more})
+                if not more:
+                    break
+
+
+app = AsyncGateway(create_app())
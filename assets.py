@@ -0,0 +1,317 @@
+"""
+Content-addressed library of 3D model assets.
+
+Uploaded GLTF/GLB/OBJ/FBX files are stored once per SHA-256 digest under
+ASSET_DIR/<first two hex digits>/<digest><ext>, whichever event they were
+uploaded for. Event layouts (Event.layout_3d) do not embed model data; a layout
+item refers to a model by its digest:
+
+    {"type": "model", "asset": "<digest>", "position": {...}, ...}
+
+Files are served from /assets/<digest><ext>. The URL changes whenever the
+content does, so responses are cached for a year as immutable and the browser
+downloads a shared stage or chair model once, not once per event.
+
+ModelAsset.ref_count is the number of event layouts (hot or archived) that
+reference an asset. save_layout() takes new references before the layout is
+committed and drops old ones only afterwards, so an interrupted save can leave
+a count too high but never too low. Assets whose count has been zero for
+ASSET_GC_GRACE_HOURS are deleted by collect_garbage(). The grace period keeps
+a fresh upload alive until the editor saves the layout that uses it.
+
+    python assets.py gc        # delete unreferenced assets
+    python assets.py recount   # rebuild ref counts from every layout
+    python assets.py extract   # move models embedded inline in layouts into the store
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, send_file, url_for, abort
+from sqlalchemy import update, delete, case, func, bindparam
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import School, Event, ArchivedEvent, ModelAsset
+from sharding import shard_router
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+CHUNK_SIZE = 1024 * 1024
+ASSET_TYPES = {
+    '.gltf': 'model/gltf+json',
+    '.glb': 'model/gltf-binary',
+    '.obj': 'model/obj',
+    '.fbx': 'application/octet-stream',
+}
+ASSET_NAME_RE = re.compile(r'^([0-9a-f]{64})(\.[a-z]+)$')
+
+assets_bp = Blueprint('assets', __name__)
+
+
+def asset_path(digest, extension):
+    return os.path.join(current_app.config['ASSET_DIR'], digest[:2], f'{digest}{extension}')
+
+
+def asset_url(digest, extension):
+    return url_for('assets.serve', filename=f'{digest}{extension}')
+
+
+def store_asset(stream, filename):
+    """Store an uploaded model, or return the existing asset with the same content."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in ASSET_TYPES:
+        raise ValueError('Unsupported file format. Upload a GLTF, GLB, OBJ or FBX file.')
+
+    root = current_app.config['ASSET_DIR']
+    max_bytes = current_app.config['ASSET_MAX_BYTES']
+    os.makedirs(root, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=root, suffix='.upload')
+    try:
+        # Hash while writing, so the upload is read once and never held in memory
+        digest, size = hashlib.sha256(), 0
+        with os.fdopen(fd, 'wb') as f:
+            for block in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(block)
+                if size > max_bytes:
+                    raise ValueError(f'Model files are limited to {max_bytes // (1024 * 1024)} MB.')
+                digest.update(block)
+                f.write(block)
+        digest = digest.hexdigest()
+
+        asset = ModelAsset.query.filter_by(digest=digest).first()
+        if asset is not None:
+            if not os.path.exists(asset_path(digest, asset.extension)):
+                _place(tmp_path, digest, asset.extension)
+            if asset.ref_count <= 0:
+                # Restart the grace period so gc leaves it for the layout about to use it
+                asset.released_at = datetime.utcnow()
+                db.session.commit()
+            return asset
+
+        _place(tmp_path, digest, extension)
+        asset = ModelAsset(digest=digest, extension=extension, size=size,
+                           original_name=os.path.basename(filename)[:200])
+        db.session.add(asset)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # The same file was stored by a concurrent upload
+            db.session.rollback()
+            asset = ModelAsset.query.filter_by(digest=digest).one()
+        return asset
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _place(tmp_path, digest, extension):
+    path = asset_path(digest, extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+
+
+def load_layout(text):
+    if not text:
+        return []
+    try:
+        layout = json.loads(text)
+    except ValueError:
+        return []
+    return layout if isinstance(layout, list) else []
+
+
+def layout_refs(layout):
+    """Digests of the assets a layout refers to."""
+    return {item['asset'] for item in layout if isinstance(item, dict) and item.get('asset')}
+
+
+def extract_inline(layout):
+    """
+    Replace models embedded in layout items (a glTF JSON object or a base64
+    data URI under 'model') with references to stored assets.
+    """
+    for item in layout:
+        model = item.get('model') if isinstance(item, dict) else None
+        if model is None:
+            continue
+        if isinstance(model, dict):
+            data, extension = json.dumps(model, separators=(',', ':')).encode(), '.gltf'
+        elif isinstance(model, str) and model.startswith('data:') and ',' in model:
+            data = base64.b64decode(model.split(',', 1)[1])
+            extension = '.' + (item.get('format') or 'glb').lower().lstrip('.')
+        else:
+            continue
+        asset = store_asset(io.BytesIO(data), f'{item.get("name") or "model"}{extension}')
+        del item['model']
+        item['asset'] = asset.digest
+        item['format'] = asset.extension.lstrip('.')
+    return layout
+
+
+def _adjust(digests, delta):
+    """Add ``delta`` to the ref counts of ``digests``; returns how many assets exist."""
+    count = ModelAsset.ref_count + delta
+    result = db.session.execute(
+        update(ModelAsset).where(ModelAsset.digest.in_(digests)).values(
+            ref_count=count,
+            released_at=case((count <= 0, datetime.utcnow()), else_=None)
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def save_layout(session, event, layout):
+    """Store ``layout`` on ``event`` (in its shard ``session``) and move the references."""
+    if not isinstance(layout, list) or not all(isinstance(item, dict) for item in layout):
+        raise ValueError('A layout is a list of items.')
+    layout = extract_inline(layout)
+    new_refs = layout_refs(layout)
+    old_refs = layout_refs(load_layout(event.layout_3d))
+    added, removed = new_refs - old_refs, old_refs - new_refs
+
+    if added and _adjust(added, 1) != len(added):
+        db.session.rollback()
+        raise ValueError('The layout refers to an unknown asset.')
+    db.session.commit()
+
+    event.layout_3d = json.dumps(layout, separators=(',', ':'))
+    session.commit()
+
+    if removed:
+        release_refs(removed)
+    return layout
+
+
+def release_refs(digests):
+    """Drop one reference to each of ``digests``, e.g. after deleting an event."""
+    if digests:
+        _adjust(digests, -1)
+        db.session.commit()
+
+
+def collect_garbage(grace_hours=None):
+    """Delete assets unreferenced for longer than the grace period; returns how many."""
+    grace_hours = grace_hours if grace_hours is not None else current_app.config['ASSET_GC_GRACE_HOURS']
+    cutoff = datetime.utcnow() - timedelta(hours=grace_hours)
+    candidates = db.session.query(ModelAsset.id, ModelAsset.digest, ModelAsset.extension).filter(
+        ModelAsset.ref_count <= 0,
+        func.coalesce(ModelAsset.released_at, ModelAsset.created_at) < cutoff
+    ).all()
+
+    removed = 0
+    for asset_id, digest, extension in candidates:
+        # Checked again in the DELETE: a layout may have taken a reference since the SELECT
+        result = db.session.execute(delete(ModelAsset).where(
+            ModelAsset.id == asset_id, ModelAsset.ref_count <= 0))
+        db.session.commit()
+        if result.rowcount:
+            try:
+                os.remove(asset_path(digest, extension))
+            except FileNotFoundError:
+                pass
+            removed += 1
+
+    # Uploads interrupted before they were moved into place
+    root = current_app.config['ASSET_DIR']
+    if os.path.isdir(root):
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.endswith('.upload') and datetime.utcfromtimestamp(os.path.getmtime(path)) < cutoff:
+                os.remove(path)
+    return removed
+
+
+def recount():
+    """Rebuild every ref count from the layouts in all shards and the archive."""
+    def collect(session, model=Event):
+        refs = {}
+        for (text,) in session.query(model.layout_3d).filter(model.layout_3d.isnot(None)).yield_per(500):
+            for digest in layout_refs(load_layout(text)):
+                refs[digest] = refs.get(digest, 0) + 1
+        return refs
+
+    counts = {}
+    for refs in shard_router.fan_out(collect) + [collect(db.session, ArchivedEvent)]:
+        for digest, n in refs.items():
+            counts[digest] = counts.get(digest, 0) + n
+
+    now = datetime.utcnow()
+    db.session.execute(update(ModelAsset.__table__).values(
+        ref_count=0, released_at=func.coalesce(ModelAsset.released_at, now)))
+    if counts:
+        db.session.execute(
+            update(ModelAsset.__table__).where(ModelAsset.digest == bindparam('d')).values(
+                ref_count=bindparam('n'), released_at=None),
+            [{'d': digest, 'n': n} for digest, n in counts.items()]
+        )
+    db.session.commit()
+    return len(counts)
+
+
+def extract_all():
+    """Rewrite layouts that still embed model data to reference stored assets."""
+    def rewrite(session):
+        changed = 0
+        for event in session.query(Event).filter(Event.layout_3d.like('%"model"%')).all():
+            layout = load_layout(event.layout_3d)
+            if any(isinstance(item, dict) and 'model' in item for item in layout):
+                save_layout(session, event, layout)
+                changed += 1
+        return changed
+
+    # save_layout writes to the catalog, so shards are visited one at a time here
+    if not shard_router.enabled:
+        return rewrite(db.session)
+    return sum(rewrite(shard_router.session_for(school_id)) for (school_id,) in db.session.query(School.id))
+
+
+@assets_bp.route('/assets/<filename>')
+def serve(filename):
+    match = ASSET_NAME_RE.match(filename)
+    if match is None or match.group(2) not in ASSET_TYPES:
+        abort(404)
+    digest, extension = match.groups()
+    path = asset_path(digest, extension)
+    if not os.path.isfile(path):
+        abort(404)
+
+    # The digest is the content, so it is also the ETag and the file never changes
+    response = send_file(path, mimetype=ASSET_TYPES[extension], conditional=True,
+                         etag=digest, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('ASSET_DIR', os.path.join(app.instance_path, 'assets'))
+    app.config.setdefault('ASSET_MAX_BYTES', 50 * 1024 * 1024)
+    app.config.setdefault('ASSET_GC_GRACE_HOURS', 24)
+    app.register_blueprint(assets_bp)
+    app.add_template_global(asset_url)
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Maintain the 3D model asset store.')
+    parser.add_argument('command', choices=('gc', 'recount', 'extract'))
+    parser.add_argument('--grace-hours', type=float, default=None)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if args.command == 'gc':
+            print(f"Deleted {collect_garbage(args.grace_hours)} unreferenced assets")
+        elif args.command == 'recount':
+            print(f"{recount()} assets are referenced by at least one layout")
+        else:
+            print(f"Rewrote {extract_all()} layouts")
@@ -0,0 +1,138 @@
+"""
+Online backups and per-school snapshot exports.
+
+Backups use SQLite's online backup API in steps of BACKUP_PAGES_PER_STEP pages,
+sleeping briefly between steps. The read lock is only held during each step,
+so the application keeps writing while a backup runs; pages changed during a
+step are copied again. Each database (main, archive and any school shards) is
+copied to a temporary file, then renamed into BACKUP_DIR/<timestamp>/.
+
+Exports stream one school's rows as gzip-compressed JSON lines, reading the
+tables in chunks, so memory use does not grow with the size of the school.
+
+    python backup.py backup
+    python backup.py export 3 school-3.jsonl.gz
+"""
+import glob
+import json
+import os
+import sqlite3
+import zlib
+from datetime import datetime, date, time
+
+from flask import current_app
+from sqlalchemy import select
+
+from extensions import db
+from models import School, Contact, Event, EventRegistration
+from sharding import shard_router
+
+
+def database_files():
+    """Name -> path of every SQLite file holding application data."""
+    files = {}
+    for bind_key, engine in db.engines.items():
+        if engine.url.database:
+            files[bind_key or 'main'] = engine.url.database
+    if shard_router.enabled:
+        for path in glob.glob(os.path.join(current_app.config['SHARD_DIR'], '*.db')):
+            files['shard_' + os.path.splitext(os.path.basename(path))[0]] = path
+    return files
+
+
+def online_backup(source_path, dest_path, pages=None, sleep=None):
+    pages = pages or current_app.config['BACKUP_PAGES_PER_STEP']
+    sleep = sleep if sleep is not None else current_app.config['BACKUP_STEP_SLEEP']
+    tmp_path = dest_path + '.part'
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+def backup_all(dest_dir=None):
+    dest_dir = dest_dir or os.path.join(
+        current_app.config['BACKUP_DIR'], datetime.utcnow().strftime('%Y%m%dT%H%M%SZ'))
+    os.makedirs(dest_dir, exist_ok=True)
+    written = {}
+    for name, path in database_files().items():
+        if os.path.exists(path):
+            dest = online_backup(path, os.path.join(dest_dir, f'{name}.db'))
+            written[name] = {'path': dest, 'bytes': os.path.getsize(dest)}
+    return written
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _lines(session, kind, stmt, chunk_size):
+    result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield ''.join(
+            json.dumps({'type': kind, 'data': dict(row._mapping)}, default=_json_default,
+                       separators=(',', ':')) + '\n'
+            for row in partition
+        )
+
+
+def export_school(school_id, chunk_size=None):
+    """Yield gzip-compressed chunks of a JSON-lines snapshot of one school."""
+    chunk_size = chunk_size or current_app.config['EXPORT_CHUNK_SIZE']
+    session = shard_router.session_for(school_id)
+    event_ids = select(Event.id).where(Event.school_id == school_id)
+    sources = [
+        (db.session, 'school', select(School.__table__).where(School.id == school_id)),
+        (session, 'contact', select(Contact.__table__).where(Contact.school_id == school_id)),
+        (session, 'event', select(Event.__table__).where(Event.school_id == school_id)),
+        (session, 'registration', select(EventRegistration.__table__).where(
+            EventRegistration.event_id.in_(event_ids))),
+    ]
+
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for source_session, kind, stmt in sources:
+        for text in _lines(source_session, kind, stmt, chunk_size):
+            data = compressor.compress(text.encode('utf-8'))
+            if data:
+                yield data
+    yield compressor.flush()
+
+
+def init_app(app):
+    app.config.setdefault('BACKUP_DIR', os.path.join(app.instance_path, 'backups'))
+    app.config.setdefault('BACKUP_PAGES_PER_STEP', 256)
+    app.config.setdefault('BACKUP_STEP_SLEEP', 0.01)
+    app.config.setdefault('EXPORT_CHUNK_SIZE', 500)
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Back up databases or export a school snapshot.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    backup_cmd = commands.add_parser('backup')
+    backup_cmd.add_argument('--dest', help='directory to write the copies to')
+    export_cmd = commands.add_parser('export')
+    export_cmd.add_argument('school_id', type=int)
+    export_cmd.add_argument('output')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.command == 'backup':
+            for name, info in backup_all(args.dest).items():
+                print(f"{name}: {info['path']} ({info['bytes']} bytes)")
+            print("✅ Backup completed")
+        else:
+            with open(args.output, 'wb') as f:
+                for chunk in export_school(args.school_id):
+                    f.write(chunk)
+            print(f"✅ Exported school {args.school_id} to {args.output}")
@@ -0,0 +1,114 @@
+"""
+Concurrent-connection benchmark: wsgi.py against asgi.py.
+
+Start both servers with the same number of worker processes, e.g.
+
+    gunicorn wsgi:app --workers 2 --threads 8 --bind 127.0.0.1:8000
+    uvicorn asgi:app --workers 2 --port 8001
+
+then hold increasing numbers of connections open against the same path:
+
+    python bench_asgi.py --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001 \\
+        --path '/api/events?limit=50' --header 'Authorization: Bearer <token>' \\
+        --concurrency 10,100,500,1000 --duration 10
+
+Each client sends a request, reads the whole response and repeats until the
+time is up. For every target and concurrency level the script prints completed
+requests per second, latency percentiles and the number of errors and timeouts.
+Long polls (/event/registrations/<id>?wait=20, with --header 'Cookie: ...') and
+large /assets/ downloads show the difference most clearly. Under WSGI each
+connection occupies a thread, so latency climbs once the connection count
+passes workers x threads. Under ASGI those connections wait on the event loop.
+
+Only the standard library is used.
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+async def _request(host, port, raw, timeout):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        length = None
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        if length is not None:
+            await asyncio.wait_for(reader.readexactly(length), timeout)
+        else:
+            await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def _client(url, path, headers, deadline, timeout, results):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    raw = (f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n'
+           + ''.join(f'{header}\r\n' for header in headers) + '\r\n').encode('latin-1')
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            status = await _request(host, port, raw, timeout)
+        except asyncio.TimeoutError:
+            results['timeouts'] += 1
+            continue
+        except OSError:
+            results['errors'] += 1
+            await asyncio.sleep(0.1)
+            continue
+        if status >= 500:
+            results['errors'] += 1
+        else:
+            results['latencies'].append(time.monotonic() - started)
+
+
+async def run_level(url, path, headers, concurrency, duration, timeout):
+    results = {'latencies': [], 'errors': 0, 'timeouts': 0}
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(_client(url, path, headers, deadline, timeout, results) for _ in range(concurrency)))
+    return results
+
+
+def _percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare concurrent-connection capacity of WSGI and ASGI servers.')
+    parser.add_argument('--target', action='append', required=True, help='name=http://host:port')
+    parser.add_argument('--path', default='/api/events?limit=50')
+    parser.add_argument('--header', action='append', default=[], help="e.g. 'Authorization: Bearer ...'")
+    parser.add_argument('--concurrency', default='10,100,500')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    targets = [target.split('=', 1) for target in args.target]
+
+    print(f"{'target':<8} {'conns':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'timeouts':>9}")
+    for concurrency in levels:
+        for name, url in targets:
+            results = asyncio.run(run_level(url, args.path, args.header, concurrency, args.duration, args.timeout))
+            latencies = results['latencies']
+            print(f"{name:<8} {concurrency:>6} {len(latencies) / args.duration:>9.1f} "
+                  f"{_percentile(latencies, 0.50) * 1000:>9.1f} {_percentile(latencies, 0.95) * 1000:>9.1f} "
+                  f"{_percentile(latencies, 0.99) * 1000:>9.1f} {results['errors']:>7} {results['timeouts']:>9}")
+
+
+if __name__ == '__main__':
+    main()
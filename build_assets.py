@@ -0,0 +1,60 @@
+"""
+Build-time asset preparation.
+
+1. Downloads the JS/CSS the templates load (media.VENDOR_ASSETS) into
+   static/vendor, so they are served locally with content-hashed, immutable URLs.
+2. Writes a gzip variant (<file>.gz) next to every compressible static file
+   that lacks an up-to-date one, so /media never compresses per request.
+
+    python build_assets.py            # vendor + compress
+    python build_assets.py --no-fetch # only compress what is already there
+"""
+import gzip
+import os
+import shutil
+import urllib.request
+
+from media import VENDOR_ASSETS, PRECOMPRESSED_TYPES
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+def fetch_vendor_assets():
+    vendor_dir = os.path.join(STATIC_DIR, 'vendor')
+    os.makedirs(vendor_dir, exist_ok=True)
+    for name, url in VENDOR_ASSETS.items():
+        target = os.path.join(vendor_dir, name)
+        if os.path.exists(target):
+            continue
+        print(f"Fetching {url}")
+        with urllib.request.urlopen(url, timeout=60) as response, open(target + '.part', 'wb') as f:
+            shutil.copyfileobj(response, f)
+        os.replace(target + '.part', target)
+
+
+def precompress():
+    written = 0
+    for root, _, files in os.walk(STATIC_DIR):
+        for name in files:
+            if not name.endswith(PRECOMPRESSED_TYPES):
+                continue
+            source = os.path.join(root, name)
+            target = source + '.gz'
+            if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+                continue
+            with open(source, 'rb') as src, gzip.GzipFile(target, 'wb', compresslevel=9, mtime=0) as dst:
+                shutil.copyfileobj(src, dst)
+            written += 1
+    return written
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Vendor and precompress static assets.')
+    parser.add_argument('--no-fetch', action='store_true', help='skip downloading vendored assets')
+    args = parser.parse_args()
+
+    if not args.no_fetch:
+        fetch_vendor_assets()
+    print(f"✅ Precompressed {precompress()} files")
@@ -0,0 +1,128 @@
+"""
+Batched event listing for integrations (GET /api/events).
+
+    /api/events?ids=4,8,15                    several events in one request
+    /api/events?school=3&from=2026-11-01      filter by school and date range
+    /api/events?fields=title,date,school      sparse fieldset
+
+Requested fields map to load_only(), so description and layout_3d are not read
+from the database unless a client asks for them. The 'school' field is loaded
+in one IN query against the catalog for every school on the page, which works
+whether or not the events live in per-school shards. Results go through the
+caller's policy scope and are encoded with a compact JSON encoder that is
+created once. Dates and times are converted to ISO strings while the rows are
+built, so the encoder never needs a fallback.
+"""
+import json
+from datetime import date
+
+from sqlalchemy.orm import load_only
+
+from assets import load_layout
+from extensions import db
+from models import School, Event, EventDirectory
+from policy import scoped
+from sharding import shard_router
+
+EVENT_FIELDS = (
+    'id', 'title', 'description', 'date', 'start_time', 'end_time', 'location', 'capacity',
+    'registration_required', 'registration_deadline', 'price', 'image_url', 'layout_3d', 'school_id'
+)
+DEFAULT_FIELDS = ('id', 'title', 'date', 'start_time', 'end_time', 'location', 'school_id', 'school')
+TEMPORAL_FIELDS = ('date', 'start_time', 'end_time', 'registration_deadline')
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500  # also caps ?ids=, staying under SQLite's bound-parameter limit
+
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, check_circular=False)
+
+
+def parse_fields(raw):
+    """Requested fields from '?fields=a,b'; unknown names are ignored."""
+    if not raw:
+        return DEFAULT_FIELDS
+    requested = [name.strip() for name in raw.split(',')]
+    fields = tuple(name for name in requested if name in EVENT_FIELDS or name == 'school')
+    if 'id' not in fields:
+        fields = ('id',) + fields
+    return fields
+
+
+def parse_ids(raw):
+    """Event ids from '?ids=1,2,3'; raises ValueError on anything else."""
+    ids = list(dict.fromkeys(int(part) for part in raw.split(',') if part.strip()))
+    if len(ids) > MAX_LIMIT:
+        raise ValueError(f'at most {MAX_LIMIT} ids per request')
+    return ids
+
+
+def _row(event, fields):
+    item = {}
+    for name in fields:
+        if name == 'school':
+            continue
+        value = getattr(event, name)
+        if name in TEMPORAL_FIELDS and value is not None:
+            value = value.isoformat()
+        elif name == 'layout_3d':
+            # Same reading as the 3D endpoints: a malformed layout is an empty one
+            value = load_layout(value)
+        item[name] = value
+    return item
+
+
+def _school_ids_for(ids):
+    """Shards holding ``ids`` (None means every shard, i.e. unsharded)."""
+    if not shard_router.enabled:
+        return None
+    return sorted({school_id for (school_id,) in db.session.query(EventDirectory.school_id).filter(
+        EventDirectory.id.in_(ids))})
+
+
+def list_events(user, fields=DEFAULT_FIELDS, ids=None, school_id=None, start=None, end=None, limit=DEFAULT_LIMIT):
+    """Events ``user`` may see, as a list of dicts with ``fields``, ordered by date."""
+    columns = [getattr(Event, name) for name in fields if name in EVENT_FIELDS]
+    # school_id is needed to attach schools; date orders the merged shard results
+    columns += [Event.school_id, Event.date]
+
+    def load(session):
+        query = scoped(session.query(Event), Event, user=user).options(load_only(*columns))
+        if ids is not None:
+            query = query.filter(Event.id.in_(ids))
+        if school_id is not None:
+            query = query.filter(Event.school_id == school_id)
+        if start is not None:
+            query = query.filter(Event.date >= start)
+        if end is not None:
+            query = query.filter(Event.date <= end)
+        events = query.order_by(Event.date, Event.id).limit(limit).all()
+        return [(event.date, event.id, event.school_id, _row(event, fields)) for event in events]
+
+    if ids is not None:
+        if not ids:
+            return []
+        school_ids = _school_ids_for(ids)
+    elif school_id is not None:
+        school_ids = [school_id]
+    else:
+        school_ids = None
+    if school_ids == []:
+        return []
+
+    rows = sorted(row for shard_rows in shard_router.fan_out(load, school_ids) for row in shard_rows)[:limit]
+
+    if 'school' in fields:
+        schools = dict(
+            (sid, {'id': sid, 'name': name}) for sid, name in db.session.query(School.id, School.name).filter(
+                School.id.in_({row[2] for row in rows}))
+        ) if rows else {}
+        for _, _, sid, item in rows:
+            item['school'] = schools.get(sid)
+    return [item for _, _, _, item in rows]
+
+
+def parse_date(raw):
+    return date.fromisoformat(raw) if raw else None
+
+
+def encode(payload):
+    return _encoder.encode(payload).encode('utf-8')
@@ -1,8 +1,10 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, DateField, HiddenField
+from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, DateField, HiddenField, IntegerField
+from wtforms.widgets import HiddenInput
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError, Optional
 from models import User, School
 from flask_login import current_user
+from school_index import school_index
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -20,7 +22,8 @@ class RegistrationForm(FlaskForm):
         ('student', 'Student'),
         ('teacher', 'Teacher')
     ], validators=[DataRequired()])
-    school_id = SelectField('School', coerce=int, validators=[Optional()])
+    # Picked through the /auth/schools/search typeahead; checked against the in-memory index
+    school_id = IntegerField('School', validators=[Optional()], widget=HiddenInput())
     submit = SubmitField('Register')
 
     def validate_username(self, username):
@@ -33,6 +36,10 @@ class RegistrationForm(FlaskForm):
         if user:
             raise ValidationError('Email already registered. Please use a different email.')
 
+    def validate_school_id(self, school_id):
+        if self.role.data == 'teacher' and not school_index.contains(school_id.data):
+            raise ValidationError('Please choose your school from the list.')
+
 from flask_wtf.file import FileField, FileAllowed
 
 class EventForm(FlaskForm):
@@ -0,0 +1,119 @@
+"""
+Static media serving.
+
+Files under the static folder (event images in static/uploads, vendored JS/CSS
+in static/vendor, 3D model assets) are served from /media/<path> with:
+
+* byte-range and conditional requests (ETag / Last-Modified), so large 3D
+  models can be resumed and fetched partially; the file body goes through the
+  server's wsgi.file_wrapper (sendfile), or X-Sendfile when USE_X_SENDFILE is on;
+* content-hashed URLs: media_url('uploads/a.png') renders as
+  /media/uploads/a.png?v=<hash>, and a request carrying the current hash is
+  answered with a one-year immutable Cache-Control;
+* precompressed variants: if <file>.gz exists (see build_assets.py) and the
+  client accepts gzip, it is sent instead of compressing per request.
+
+vendor_url('three.min.js') serves the vendored copy when build_assets.py has
+fetched it, and falls back to the CDN otherwise.
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Blueprint, current_app, request, send_from_directory, url_for, abort
+from werkzeug.security import safe_join
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DEFAULT_MAX_AGE = 3600
+PRECOMPRESSED_TYPES = ('.js', '.css', '.svg', '.json', '.gltf', '.obj')
+
+# Vendored copies of the libraries the templates used to load from CDNs
+VENDOR_ASSETS = {
+    'tailwind.min.css': 'https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css',
+    'three.min.js': 'https://cdn.jsdelivr.net/npm/three@0.132.2/build/three.min.js',
+    'OrbitControls.js': 'https://cdn.jsdelivr.net/npm/three@0.132.2/examples/js/controls/OrbitControls.js',
+    'GLTFLoader.js': 'https://cdn.jsdelivr.net/npm/three@0.132.2/examples/js/loaders/GLTFLoader.js',
+    'OBJLoader.js': 'https://cdn.jsdelivr.net/npm/three@0.132.2/examples/js/loaders/OBJLoader.js',
+    'FBXLoader.js': 'https://cdn.jsdelivr.net/npm/three@0.132.2/examples/js/loaders/FBXLoader.js',
+}
+
+media_bp = Blueprint('media', __name__)
+
+_hashes = {}  # path -> (mtime, size, digest)
+_hashes_lock = threading.Lock()
+
+
+def file_hash(path):
+    """Short content hash of a file, recomputed only when its mtime or size changes."""
+    stat = os.stat(path)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    value = digest.hexdigest()[:12]
+    with _hashes_lock:
+        _hashes[path] = (stat.st_mtime, stat.st_size, value)
+    return value
+
+
+def media_url(filename):
+    path = safe_join(current_app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return url_for('static', filename=filename)
+    return url_for('media.serve', filename=filename, v=file_hash(path))
+
+
+def vendor_url(name):
+    filename = f'vendor/{name}'
+    if os.path.isfile(os.path.join(current_app.static_folder, filename)):
+        return media_url(filename)
+    return VENDOR_ASSETS[name]
+
+
+@media_bp.route('/media/<path:filename>')
+def serve(filename):
+    static_folder = current_app.static_folder
+    path = safe_join(static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    immutable = request.args.get('v') == file_hash(path)
+    send_name = filename
+    encoded = False
+    if (not request.range and filename.endswith(PRECOMPRESSED_TYPES)
+            and 'gzip' in request.headers.get('Accept-Encoding', '')
+            and os.path.isfile(path + '.gz')):
+        send_name = filename + '.gz'
+        encoded = True
+
+    response = send_from_directory(
+        static_folder,
+        send_name,
+        mimetype=None if not encoded else _guess_type(filename),
+        conditional=True,
+        max_age=IMMUTABLE_MAX_AGE if immutable else DEFAULT_MAX_AGE
+    )
+    if encoded:
+        response.headers['Content-Encoding'] = 'gzip'
+    if filename.endswith(PRECOMPRESSED_TYPES):
+        response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _guess_type(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def init_app(app):
+    app.register_blueprint(media_bp)
+    app.add_template_global(media_url)
+    app.add_template_global(vendor_url)
@@ -0,0 +1,56 @@
+"""
+Migration: 20261019_add_archived_event_updated_at
+Description: Adds archived_events.updated_at to the archive database, so
+             archived rows keep the fragment cache key they had while hot.
+             Rows archived before this migration fall back to archived_at.
+"""
+import os
+import sqlite3
+
+
+def _archive_path(app):
+    path = os.path.join(app.instance_path, 'school_events_archive.db')
+    return path if os.path.exists(path) else None
+
+
+def upgrade():
+    """Apply the migration."""
+    from app import create_app
+
+    app = create_app()
+    path = _archive_path(app)
+    if path:
+        conn = sqlite3.connect(path)
+        try:
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(archived_events)")]
+            if columns and 'updated_at' not in columns:
+                conn.execute("ALTER TABLE archived_events ADD COLUMN updated_at DATETIME")
+                conn.execute("UPDATE archived_events SET updated_at = archived_at")
+                conn.commit()
+                print(f"Added archived_events.updated_at to {path}")
+        finally:
+            conn.close()
+    print("✅ Archived updated_at migration completed successfully!")
+
+
+def downgrade():
+    """Revert the migration."""
+    from app import create_app
+
+    app = create_app()
+    path = _archive_path(app)
+    if path:
+        conn = sqlite3.connect(path)
+        try:
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(archived_events)")]
+            if 'updated_at' in columns:
+                # Requires SQLite 3.35+
+                conn.execute("ALTER TABLE archived_events DROP COLUMN updated_at")
+                conn.commit()
+        finally:
+            conn.close()
+    print("✅ Archived updated_at migration reverted successfully!")
+
+
+if __name__ == '__main__':
+    upgrade()
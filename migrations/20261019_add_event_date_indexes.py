@@ -0,0 +1,56 @@
+"""
+Migration: 20261019_add_event_date_indexes
+Description: Indexes events.date and events.registration_deadline so the
+             reminder scheduler can read upcoming ranges without scanning, in
+             the main database and every school shard.
+"""
+import glob
+import os
+import sqlite3
+
+INDEXES = {
+    'ix_events_date': 'events (date)',
+    'ix_events_registration_deadline': 'events (registration_deadline)',
+}
+
+
+def _database_paths(app):
+    paths = [os.path.join(app.instance_path, 'school_events.db')]
+    paths += glob.glob(os.path.join(app.config['SHARD_DIR'], '*.db'))
+    return [path for path in paths if os.path.exists(path)]
+
+
+def upgrade():
+    """Apply the migration."""
+    from app import create_app
+
+    app = create_app()
+    for path in _database_paths(app):
+        conn = sqlite3.connect(path)
+        try:
+            for name, target in INDEXES.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+            conn.commit()
+        finally:
+            conn.close()
+    print("✅ Event date indexes created successfully!")
+
+
+def downgrade():
+    """Revert the migration."""
+    from app import create_app
+
+    app = create_app()
+    for path in _database_paths(app):
+        conn = sqlite3.connect(path)
+        try:
+            for name in INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+            conn.commit()
+        finally:
+            conn.close()
+    print("✅ Event date indexes dropped successfully!")
+
+
+if __name__ == '__main__':
+    upgrade()
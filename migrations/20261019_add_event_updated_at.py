@@ -0,0 +1,55 @@
+"""
+Migration: 20261019_add_event_updated_at
+Description: Adds events.updated_at, used to key cached event-card fragments,
+             to the main database and to every school shard.
+"""
+import glob
+import os
+import sqlite3
+
+
+def _database_paths(app):
+    paths = [os.path.join(app.instance_path, 'school_events.db')]
+    paths += glob.glob(os.path.join(app.config['SHARD_DIR'], '*.db'))
+    return [path for path in paths if os.path.exists(path)]
+
+
+def upgrade():
+    """Apply the migration."""
+    from app import create_app
+
+    app = create_app()
+    for path in _database_paths(app):
+        conn = sqlite3.connect(path)
+        try:
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(events)")]
+            if columns and 'updated_at' not in columns:
+                conn.execute("ALTER TABLE events ADD COLUMN updated_at DATETIME")
+                conn.execute("UPDATE events SET updated_at = CURRENT_TIMESTAMP")
+                conn.commit()
+                print(f"Added events.updated_at to {path}")
+        finally:
+            conn.close()
+    print("✅ updated_at migration completed successfully!")
+
+
+def downgrade():
+    """Revert the migration."""
+    from app import create_app
+
+    app = create_app()
+    for path in _database_paths(app):
+        conn = sqlite3.connect(path)
+        try:
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(events)")]
+            if 'updated_at' in columns:
+                # Requires SQLite 3.35+
+                conn.execute("ALTER TABLE events DROP COLUMN updated_at")
+                conn.commit()
+        finally:
+            conn.close()
+    print("✅ updated_at migration reverted successfully!")
+
+
+if __name__ == '__main__':
+    upgrade()
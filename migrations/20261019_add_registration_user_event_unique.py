@@ -0,0 +1,67 @@
+"""
+Migration: 20261019_add_registration_user_event_unique
+Description: Adds a unique index on event_registrations (user_id, event_id) in
+             the main database and every school shard, so a student can hold
+             only one registration per event. Databases that already contain
+             duplicate pairs are listed and left unchanged; resolve the
+             duplicates by hand and run the migration again.
+"""
+import glob
+import os
+import sqlite3
+
+INDEX = 'uq_event_registrations_user_event'
+
+
+def _database_paths(app):
+    paths = [os.path.join(app.instance_path, 'school_events.db')]
+    paths += glob.glob(os.path.join(app.config['SHARD_DIR'], '*.db'))
+    return [path for path in paths if os.path.exists(path)]
+
+
+def upgrade():
+    """Apply the migration."""
+    from app import create_app
+
+    app = create_app()
+    skipped = 0
+    for path in _database_paths(app):
+        conn = sqlite3.connect(path)
+        try:
+            duplicates = conn.execute(
+                "SELECT user_id, event_id, COUNT(*) FROM event_registrations "
+                "GROUP BY user_id, event_id HAVING COUNT(*) > 1"
+            ).fetchall()
+            if duplicates:
+                skipped += 1
+                print(f"Skipped {path}: {len(duplicates)} duplicate registrations")
+                for user_id, event_id, count in duplicates:
+                    print(f"  user {user_id}, event {event_id}: {count} rows")
+                continue
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {INDEX} ON event_registrations (user_id, event_id)")
+            conn.commit()
+        finally:
+            conn.close()
+    if skipped:
+        print(f"⚠️ Unique registration index not created in {skipped} database(s)")
+    else:
+        print("✅ Unique registration index created successfully!")
+
+
+def downgrade():
+    """Revert the migration."""
+    from app import create_app
+
+    app = create_app()
+    for path in _database_paths(app):
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(f"DROP INDEX IF EXISTS {INDEX}")
+            conn.commit()
+        finally:
+            conn.close()
+    print("✅ Unique registration index dropped successfully!")
+
+
+if __name__ == '__main__':
+    upgrade()
@@ -0,0 +1,105 @@
+"""
+Migration: 20261019_add_school_monthly_rollups
+Description: Creates school_monthly_rollups, which the rollups.py flush listener
+             upserts into on every Event or EventRegistration change, in the
+             main database and every school shard, and backfills it from the
+             existing registrations (including archived ones).
+"""
+import glob
+import os
+import re
+import sqlite3
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable
+
+TABLE = 'school_monthly_rollups'
+METRICS = ('registrations', 'confirmed', 'attended', 'cancelled', 'paid', 'revenue')  # as in rollups.py
+AGGREGATES = """
+    SELECT e.school_id AS school_id, strftime('%Y-%m', e.date) AS month,
+           COUNT(r.id) AS registrations,
+           SUM(CASE WHEN r.status = 'confirmed' THEN 1 ELSE 0 END) AS confirmed,
+           SUM(CASE WHEN r.status = 'attended' THEN 1 ELSE 0 END) AS attended,
+           SUM(CASE WHEN r.status = 'cancelled' THEN 1 ELSE 0 END) AS cancelled,
+           SUM(CASE WHEN r.payment_status = 'paid' THEN 1 ELSE 0 END) AS paid,
+           SUM(CASE WHEN r.payment_status = 'paid' THEN COALESCE(r.payment_amount, 0.0) ELSE 0.0 END) AS revenue
+    FROM {registrations} r JOIN {events} e ON r.event_id = e.id
+    WHERE e.date IS NOT NULL {where}
+    GROUP BY e.school_id, month
+"""
+
+
+def _database_paths(app):
+    paths = [os.path.join(app.instance_path, 'school_events.db')]
+    paths += glob.glob(os.path.join(app.config['SHARD_DIR'], '*.db'))
+    return [path for path in paths if os.path.exists(path)]
+
+
+def _has_table(conn, name, schema='main'):
+    return conn.execute(
+        f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def _backfill(conn, app, path):
+    """Insert totals for the registrations this database (and the archive) already holds."""
+    sources = []
+    if _has_table(conn, 'events') and _has_table(conn, 'event_registrations'):
+        sources.append(AGGREGATES.format(registrations='event_registrations', events='events', where=''))
+
+    # Archived events count towards the school that owns this database: the
+    # shard's school, or every school when the main database is not sharded
+    shard = re.match(r'school_(\d+)\.db$', os.path.basename(path))
+    archive_path = os.path.join(app.instance_path, 'school_events_archive.db')
+    if (shard or not app.config['SHARDING_ENABLED']) and os.path.exists(archive_path):
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        if _has_table(conn, 'archived_events', 'archive') and _has_table(conn, 'archived_event_registrations', 'archive'):
+            sources.append(AGGREGATES.format(
+                registrations='archive.archived_event_registrations', events='archive.archived_events',
+                where=f'AND e.school_id = {int(shard.group(1))}' if shard else ''))
+
+    if sources:
+        conn.execute(
+            f"INSERT INTO {TABLE} (school_id, month, {', '.join(METRICS)}) "
+            f"SELECT school_id, month, {', '.join(f'SUM({m})' for m in METRICS)} "
+            f"FROM ({' UNION ALL '.join(sources)}) GROUP BY school_id, month"
+        )
+
+
+def upgrade():
+    """Apply the migration."""
+    from app import create_app
+    from models import SchoolMonthlyRollup
+
+    app = create_app()
+    ddl = str(CreateTable(SchoolMonthlyRollup.__table__).compile(dialect=sqlite.dialect()))
+    for path in _database_paths(app):
+        conn = sqlite3.connect(path)
+        try:
+            if _has_table(conn, TABLE):
+                continue
+            conn.execute(ddl)
+            _backfill(conn, app, path)
+            conn.commit()
+            print(f"Created and backfilled {TABLE} in {path}")
+        finally:
+            conn.close()
+    print("✅ School monthly rollups migration completed successfully!")
+
+
+def downgrade():
+    """Revert the migration."""
+    from app import create_app
+
+    app = create_app()
+    for path in _database_paths(app):
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            conn.commit()
+        finally:
+            conn.close()
+    print("✅ School monthly rollups migration reverted successfully!")
+
+
+if __name__ == '__main__':
+    upgrade()
@@ -76,17 +76,18 @@ class Event(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     start_time = db.Column(db.Time, nullable=False, default=time(9, 0))  # Default to 9:00 AM
     end_time = db.Column(db.Time, nullable=False, default=time(17, 0))   # Default to 5:00 PM
     location = db.Column(db.String(200), nullable=True)
     capacity = db.Column(db.Integer, nullable=True)
     registration_required = db.Column(db.Boolean, default=False)
-    registration_deadline = db.Column(db.Date, nullable=True)
+    registration_deadline = db.Column(db.Date, nullable=True, index=True)
     price = db.Column(db.Float, default=0.0)
     image_url = db.Column(db.String(200), nullable=True)
     image_path = db.Column(db.String(200), nullable=True)  # For file uploads
     layout_3d = db.Column(db.Text, nullable=True)  # Store JSON string of the 3D layout
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Fragment cache key
     
     # Foreign keys
     school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), nullable=False)
@@ -94,7 +95,7 @@ class Event(db.Model):
     
     # Relationships
     school = db.relationship('School', back_populates='events')
-    registrations = db.relationship('EventRegistration', back_populates='event')
+    registrations = db.relationship('EventRegistration', back_populates='event', cascade='all, delete-orphan')
     
     @property
     def formatted_date(self):
@@ -120,6 +121,10 @@ class Event(db.Model):
 
 class EventRegistration(db.Model):
     __tablename__ = 'event_registrations'
+    __table_args__ = (
+        # One registration per student and event; admission.py reactivates cancelled ones
+        db.Index('uq_event_registrations_user_event', 'user_id', 'event_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -129,10 +134,128 @@ class EventRegistration(db.Model):
     payment_status = db.Column(db.String(20), default='unpaid')  # unpaid, paid, refunded
     payment_amount = db.Column(db.Float, default=0.0)
     payment_date = db.Column(db.DateTime, nullable=True)
-    payment_reference = db.Column(db.String(100), nullable=True)
+    payment_reference = db.Column(db.String(100), nullable=True, index=True)  # Matched by reconciliation.py
     
     # Relationships
     user = db.relationship('User', backref='event_registrations')
     event = db.relationship('Event', back_populates='registrations')
 # In models.py, add to your Event model
-layout_3d = db.Column(db.Text, nullable=True)  # Store JSON string of the 3D layout
\ No newline at end of file
+layout_3d = db.Column(db.Text, nullable=True)  # Store JSON string of the 3D layout
+
+
+class SchoolMonthlyRollup(db.Model):
+    __tablename__ = 'school_monthly_rollups'
+    
+    # One row per school and calendar month of the event date ('YYYY-MM').
+    # Maintained incrementally by rollups.py; never aggregate event_registrations for dashboards.
+    school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)
+    registrations = db.Column(db.Integer, nullable=False, default=0)
+    confirmed = db.Column(db.Integer, nullable=False, default=0)
+    attended = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    paid = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def to_dict(self):
+        return {
+            'school_id': self.school_id,
+            'month': self.month,
+            'registrations': self.registrations,
+            'confirmed': self.confirmed,
+            'attended': self.attended,
+            'cancelled': self.cancelled,
+            'paid': self.paid,
+            'revenue': self.revenue
+        }
+
+
+class EventDirectory(db.Model):
+    __tablename__ = 'event_directory'
+    
+    # Global catalog entry used when sharding is enabled: hands out event ids that
+    # are unique across shards and records which school's shard holds each event.
+    id = db.Column(db.Integer, primary_key=True)
+    school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), nullable=False, index=True)
+
+
+class ArchivedEvent(db.Model):
+    __tablename__ = 'archived_events'
+    __bind_key__ = 'archive'
+    
+    # Same columns as Event, moved here by archive.py once an event is past the
+    # archive horizon. Lives in the archive database, so no foreign keys.
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    start_time = db.Column(db.Time, nullable=True)
+    end_time = db.Column(db.Time, nullable=True)
+    location = db.Column(db.String(200), nullable=True)
+    capacity = db.Column(db.Integer, nullable=True)
+    registration_required = db.Column(db.Boolean, default=False)
+    registration_deadline = db.Column(db.Date, nullable=True)
+    price = db.Column(db.Float, default=0.0)
+    image_url = db.Column(db.String(200), nullable=True)
+    image_path = db.Column(db.String(200), nullable=True)
+    layout_3d = db.Column(db.Text, nullable=True)
+    school_id = db.Column(db.Integer, nullable=False, index=True)
+    created_by = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)  # copied from Event; fragment cache key
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def formatted_date(self):
+        return self.date.strftime('%B %d, %Y')
+
+
+class ArchivedEventRegistration(db.Model):
+    __tablename__ = 'archived_event_registrations'
+    __bind_key__ = 'archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    event_id = db.Column(db.Integer, nullable=False, index=True)
+    registration_date = db.Column(db.DateTime)
+    status = db.Column(db.String(20))
+    payment_status = db.Column(db.String(20))
+    payment_amount = db.Column(db.Float, default=0.0)
+    payment_date = db.Column(db.DateTime, nullable=True)
+    payment_reference = db.Column(db.String(100), nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class SchedulerState(db.Model):
+    __tablename__ = 'scheduler_state'
+    
+    # Small key/value store for background jobs, e.g. the reminder cursor
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.String(200), nullable=True)
+
+
+class ModelAsset(db.Model):
+    __tablename__ = 'model_assets'
+    
+    # Uploaded 3D model file, stored once per content hash (see assets.py).
+    # Event layouts reference it by digest; ref_count is the number of event
+    # layouts that do, and released_at is when it last dropped to zero.
+    id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(64), unique=True, nullable=False)
+    extension = db.Column(db.String(8), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    original_name = db.Column(db.String(200), nullable=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    released_at = db.Column(db.DateTime, nullable=True)
+    
+    @property
+    def filename(self):
+        return f'{self.digest}{self.extension}'
+    
+    def to_dict(self):
+        return {
+            'id': self.digest,
+            'format': self.extension.lstrip('.'),
+            'size': self.size,
+            'name': self.original_name
+        }
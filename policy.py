@@ -0,0 +1,92 @@
+"""
+Row-level authorization expressed as SQL filters.
+
+Instead of loading an object and then comparing current_user.role/school_id in
+Python, routes ask for the filter matching the user and the action and apply it
+to the query before it runs:
+
+    events = scoped(session.query(Event), Event).all()
+    event = scoped(session.query(Event), Event, 'edit').filter(Event.id == event_id).first()
+
+Rules:
+    admin    everything
+    teacher  views and creates in their own school; edits/deletes their own events there
+    student  views every school and its events, edits nothing, sees only their own registrations
+
+Students are deliberately not limited to one school: accounts are created with
+no school (auth.register only stores school_id for teachers) and students may
+register for any school's events. The index stays cheap for them because the
+per-school counts are aggregated in SQL, not loaded per school.
+
+Anything that carries ``id``, ``role`` and ``school_id`` (a User, or an API
+token principal) can be passed as ``user``; the default is current_user.
+"""
+from flask_login import current_user
+from sqlalchemy import true, false, select
+
+from models import School, Event, EventRegistration
+
+VIEW = 'view'
+CREATE = 'create'
+EDIT = 'edit'
+DELETE = 'delete'
+
+
+def _school_column(model):
+    return model.id if model is School else model.school_id
+
+
+def filter_for(model, user=None, action=VIEW):
+    """SQL criterion restricting ``model`` rows to those ``user`` may ``action``."""
+    user = user if user is not None else current_user
+    if not getattr(user, 'is_authenticated', False):
+        return false()
+    if user.role == 'admin':
+        return true()
+
+    if model is EventRegistration:
+        if user.role == 'teacher' and action == VIEW:
+            return EventRegistration.event_id.in_(
+                select(Event.id).where(Event.school_id == user.school_id))
+        return EventRegistration.user_id == user.id
+
+    school_column = _school_column(model)
+    if user.role == 'teacher':
+        if user.school_id is None:
+            return false()
+        criterion = school_column == user.school_id
+        if action in (EDIT, DELETE) and hasattr(model, 'created_by'):
+            criterion = criterion & (model.created_by == user.id)
+        return criterion
+
+    # Students
+    return true() if action == VIEW else false()
+
+
+def scoped(query, model, action=VIEW, user=None):
+    """Apply filter_for() to an existing query."""
+    return query.filter(filter_for(model, user, action))
+
+
+def scope_key(model, user=None, action=VIEW):
+    """Hashable summary of what filter_for() lets ``user`` see, for use in cache keys."""
+    user = user if user is not None else current_user
+    if not getattr(user, 'is_authenticated', False):
+        return 'none'
+    if user.role == 'admin':
+        return 'all'
+
+    # Same branches as filter_for()
+    if model is EventRegistration:
+        if user.role == 'teacher' and action == VIEW:
+            return f'school:{user.school_id}'
+        return f'user:{user.id}'
+
+    if user.role == 'teacher':
+        if user.school_id is None:
+            return 'none'
+        if action in (EDIT, DELETE) and hasattr(model, 'created_by'):
+            return f'school:{user.school_id}:user:{user.id}'
+        return f'school:{user.school_id}'
+
+    return 'all' if action == VIEW else 'none'
@@ -0,0 +1,236 @@
+"""
+Bulk user provisioning from CSV or JSON.
+
+Rows are processed in batches. For each batch the usernames and emails are
+checked against the users table with one set-based query, the passwords of the
+valid rows are hashed across a process pool (hashing dominates the cost), and
+the batch is inserted in a single transaction. Every input row gets a line in
+the report, either 'created' or the reason it was skipped; unreadable rows and
+files (bad JSON, non-object items, invalid UTF-8) are reported the same way.
+The pool is started once per process and reused by later uploads.
+
+CSV columns / JSON keys: username, email, name, password, role (student or
+teacher, default student), school_id (optional, defaults to --school).
+
+    python provisioning.py students.csv --school 3
+"""
+import csv
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from sqlalchemy import func, insert, or_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import User, School
+
+ROLES = ('student', 'teacher')
+MIN_PASSWORD_LENGTH = 8  # Same as RegistrationForm
+
+_pool = None  # (executor, worker count)
+_pool_lock = threading.Lock()
+
+
+def _item(item):
+    if isinstance(item, dict):
+        return item, None
+    return None, 'each item must be a JSON object'
+
+
+def read_rows(stream, filename=''):
+    """
+    Yield (row dict, error) per input row of a CSV or JSON (array or JSON lines)
+    text stream. A file that cannot be read any further (not UTF-8, not a valid
+    JSON array, broken CSV) ends with one error item instead of raising.
+    """
+    try:
+        if filename.lower().endswith('.json'):
+            text = stream.read()
+            if text.lstrip().startswith('['):
+                try:
+                    items = json.loads(text)
+                except ValueError as e:
+                    yield None, f'invalid JSON: {e}'
+                    return
+                for item in items:
+                    yield _item(item)
+            else:
+                for line in text.splitlines():
+                    if not line.strip():
+                        continue
+                    try:
+                        item = json.loads(line)
+                    except ValueError as e:
+                        yield None, f'invalid JSON: {e}'
+                        continue
+                    yield _item(item)
+        else:
+            for row in csv.DictReader(stream):
+                yield row, None
+    except UnicodeDecodeError:
+        yield None, 'file is not valid UTF-8'
+    except csv.Error as e:
+        yield None, f'invalid CSV: {e}'
+
+
+def _text(row, key):
+    value = row.get(key)
+    return str(value).strip() if value is not None else ''
+
+
+def _clean(row, default_school_id):
+    username = _text(row, 'username')
+    email = _text(row, 'email').lower()
+    name = _text(row, 'name')
+    password = row.get('password') or ''
+    role = (_text(row, 'role') or 'student').lower()
+    school_id = row.get('school_id') or default_school_id
+
+    if not username or not email or not name:
+        raise ValueError('username, email and name are required')
+    if '@' not in email:
+        raise ValueError('invalid email')
+    if not isinstance(password, str) or len(password) < MIN_PASSWORD_LENGTH:
+        raise ValueError(f'password must be at least {MIN_PASSWORD_LENGTH} characters')
+    if role not in ROLES:
+        raise ValueError(f'role must be one of {", ".join(ROLES)}')
+    try:
+        school_id = int(school_id) if school_id not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError('invalid school_id')
+    return {
+        'username': username,
+        'email': email,
+        'name': name,
+        'password': password,
+        'role': role,
+        'school_id': school_id,
+        'is_active': True
+    }
+
+
+def _provision_batch(batch, pool, workers, seen, school_ids, report):
+    """batch is a list of (row number, cleaned row)."""
+    usernames = [row['username'] for _, row in batch]
+    emails = [row['email'] for _, row in batch]
+    # Emails are lowercased on input, but older rows may be stored mixed-case
+    taken = db.session.query(User.username, User.email).filter(
+        or_(User.username.in_(usernames), func.lower(User.email).in_(emails))).all()
+    taken_usernames = {username for username, _ in taken}
+    taken_emails = {email.lower() for _, email in taken}
+
+    accepted = []
+    for number, row in batch:
+        if row['username'] in taken_usernames or row['username'] in seen['username']:
+            error = 'username already exists'
+        elif row['email'] in taken_emails or row['email'] in seen['email']:
+            error = 'email already exists'
+        elif row['school_id'] is not None and row['school_id'] not in school_ids:
+            error = 'unknown school_id'
+        else:
+            error = None
+        if error:
+            report.append({'row': number, 'username': row['username'], 'status': 'error', 'error': error})
+            continue
+        seen['username'].add(row['username'])
+        seen['email'].add(row['email'])
+        accepted.append((number, row))
+    if not accepted:
+        return
+
+    passwords = [row.pop('password') for _, row in accepted]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    for (_, row), password_hash in zip(accepted, pool.map(generate_password_hash, passwords, chunksize=chunksize)):
+        row['password_hash'] = password_hash
+
+    try:
+        db.session.execute(insert(User), [row for _, row in accepted])
+        db.session.commit()
+    except IntegrityError:
+        # Lost a race with another writer; fall back to one row at a time
+        db.session.rollback()
+        for number, row in accepted:
+            try:
+                db.session.execute(insert(User), [row])
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                report.append({'row': number, 'username': row['username'], 'status': 'error',
+                               'error': 'username or email already exists'})
+            else:
+                report.append({'row': number, 'username': row['username'], 'status': 'created'})
+        return
+    report.extend({'row': number, 'username': row['username'], 'status': 'created'} for number, row in accepted)
+
+
+def hashing_pool(workers=None):
+    """
+    Process pool for password hashing, started on first use and kept for the
+    life of the process, so an upload does not spawn workers inside the request.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = workers or current_app.config['PROVISIONING_WORKERS'] or os.cpu_count()
+            _pool = (ProcessPoolExecutor(max_workers=workers), workers)
+        return _pool
+
+
+def provision_users(rows, default_school_id=None, batch_size=None, workers=None):
+    """Create users from an iterable of (row, error) pairs; returns the per-row report."""
+    batch_size = batch_size or current_app.config['PROVISIONING_BATCH_SIZE']
+    pool, workers = hashing_pool(workers)
+    school_ids = {school_id for (school_id,) in db.session.query(School.id)}
+    seen = {'username': set(), 'email': set()}
+    report = []
+
+    batch = []
+    for number, (raw, error) in enumerate(rows, start=1):
+        if error is None:
+            try:
+                batch.append((number, _clean(raw, default_school_id)))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            report.append({'row': number, 'username': _text(raw, 'username') if raw else None,
+                           'status': 'error', 'error': error})
+        if len(batch) >= batch_size:
+            _provision_batch(batch, pool, workers, seen, school_ids, report)
+            batch = []
+    if batch:
+        _provision_batch(batch, pool, workers, seen, school_ids, report)
+
+    report.sort(key=lambda line: line['row'])
+    return report
+
+
+def provision_file(file_storage, default_school_id=None):
+    """Provision from an uploaded werkzeug FileStorage."""
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    return provision_users(read_rows(stream, file_storage.filename or ''), default_school_id)
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Bulk-create users from a CSV or JSON file.')
+    parser.add_argument('path')
+    parser.add_argument('--school', type=int, help='school id for rows without one')
+    parser.add_argument('--workers', type=int, help='password hashing processes')
+    parser.add_argument('--batch-size', type=int)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context(), open(args.path, encoding='utf-8-sig', newline='') as f:
+        report = provision_users(read_rows(f, args.path), args.school, args.batch_size, args.workers)
+        created = sum(1 for line in report if line['status'] == 'created')
+        for line in report:
+            if line['status'] != 'created':
+                print(f"Row {line['row']} ({line['username']}): {line['error']}")
+        print(f"✅ Created {created} of {len(report)} users")
@@ -0,0 +1,376 @@
+"""
+Query-count regression guard for the routes in routes/main.py and routes/auth.py.
+
+Builds a synthetic dataset in a throwaway SQLite database, requests every
+route as an anonymous visitor, a student, a teacher and an admin, and records
+each SQL statement and the number of rows fetched. A route that goes over its
+budget in BUDGETS fails. The output shows how far over it went, plus a diff of
+its statements against the last snapshot, or the repeated statements when there
+is no snapshot yet. An N+1 shows up as one statement repeated per row.
+
+tests/test_query_budget.py runs every scenario under pytest and also fails when
+a route in either blueprint has no budget. From the command line:
+
+    python query_budget.py             # check, exit status 1 on violations
+    python query_budget.py --snapshot  # also record current statements for future diffs
+    python query_budget.py -v          # print every route's statements
+"""
+import difflib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import Counter, namedtuple
+from datetime import date, timedelta, time
+
+from werkzeug.security import generate_password_hash
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_baseline.json')
+
+# Synthetic dataset size
+SCHOOLS = 20
+EVENTS_PER_SCHOOL = 30
+STUDENTS = 200
+REGISTRATIONS_PER_EVENT = 15
+CONTACTS_PER_SCHOOL = 3
+
+# label: (max queries, max rows fetched). load_user accounts for one query per logged-in request.
+BUDGETS = {
+    'main.index [admin]': (5, 80),
+    'main.index [teacher]': (5, 30),
+    'main.index [student]': (5, 80),
+    'main.school_events [admin]': (4, 40),
+    'main.school_events [teacher]': (4, 40),
+    'main.school_events [student]': (4, 40),
+    'main.school_past_events [student]': (5, 40),
+    'main.new_event [teacher]': (3, 5),
+    'main.edit_event [teacher]': (4, 5),
+    'main.delete_event POST [teacher]': (8, REGISTRATIONS_PER_EVENT + 5),  # the cascade loads the registrations
+    'main.event_3d_viewer [student]': (3, 5),
+    'main.event_3d_builder [teacher]': (3, 5),
+    'main.upload_event_asset POST [teacher]': (5, 5),
+    'main.save_event_layout POST [teacher]': (5, 5),
+    'main.register_for_event POST [student]': (3, 5),
+    'main.registration_status [student]': (1, 1),
+    'main.contact [anonymous]': (0, 0),
+    'main.student_demo [anonymous]': (0, 0),
+    'auth.login [anonymous]': (0, 0),
+    'auth.register [anonymous]': (0, 0),
+    'auth.logout [student]': (1, 1),
+    'auth.search_schools [anonymous]': (1, SCHOOLS + 5),
+    'auth.change_password POST [student]': (3, 1),
+    'auth.forgot_password POST [anonymous]': (1, 1),
+    'auth.reset_password POST [anonymous]': (3, 1),
+}
+
+# Logged-in roles and the seeded account each one uses
+ACCOUNTS = {'admin': 'admin', 'teacher': 'teacher1', 'student': 'student0'}
+
+# url and form values are formatted with the ids returned by seed(). own_session
+# logs in a separate client first, for requests that change the login itself.
+class Scenario(namedtuple('Scenario', 'endpoint role url method data json own_session',
+                          defaults=('GET', None, None, False))):
+    __slots__ = ()
+
+    @property
+    def label(self):
+        method = f' {self.method}' if self.method != 'GET' else ''
+        return f'{self.endpoint}{method} [{self.role}]'
+
+SCENARIOS = [
+    Scenario('main.index', 'admin', '/'),
+    Scenario('main.index', 'teacher', '/'),
+    Scenario('main.index', 'student', '/'),
+    Scenario('main.school_events', 'admin', '/school/{school_id}'),
+    Scenario('main.school_events', 'teacher', '/school/{school_id}'),
+    Scenario('main.school_events', 'student', '/school/{school_id}'),
+    Scenario('main.school_past_events', 'student', '/school/{school_id}/past'),
+    Scenario('main.new_event', 'teacher', '/school/{school_id}/event/new'),
+    Scenario('main.edit_event', 'teacher', '/event/edit/{event_id}'),
+    Scenario('main.delete_event', 'teacher', '/event/delete/{deleted_event_id}', 'POST'),
+    Scenario('main.event_3d_viewer', 'student', '/event/{event_id}/3d'),
+    Scenario('main.event_3d_builder', 'teacher', '/event/{event_id}/3d/edit'),
+    Scenario('main.upload_event_asset', 'teacher', '/event/{event_id}/3d/assets', 'POST',
+             data={'file': (b'{"asset":{"version":"2.0"}}', 'booth.gltf')}),
+    Scenario('main.save_event_layout', 'teacher', '/event/{event_id}/3d/layout', 'POST',
+             json={'layout': [{'type': 'booth', 'position': [0, 0, 0]}]}),
+    Scenario('main.register_for_event', 'student', '/event/{registration_event_id}/register', 'POST'),
+    Scenario('main.registration_status', 'student', '/event/registrations/{intent_id}'),
+    Scenario('main.contact', 'anonymous', '/contact'),
+    Scenario('main.student_demo', 'anonymous', '/student-demo'),
+    Scenario('auth.login', 'anonymous', '/auth/login'),
+    Scenario('auth.register', 'anonymous', '/auth/register'),
+    Scenario('auth.logout', 'student', '/auth/logout', own_session=True),
+    Scenario('auth.search_schools', 'anonymous', '/auth/schools/search?q=school%200'),
+    # The GET pages of these three have no template in this tree; their POSTs are budgeted
+    Scenario('auth.change_password', 'student', '/auth/change-password', 'POST', own_session=True,
+             data={'current_password': 'password123', 'new_password': 'password123',
+                   'confirm_password': 'password123'}),
+    Scenario('auth.forgot_password', 'anonymous', '/auth/forgot-password', 'POST',
+             data={'email': 'student1@example.com'}),
+    Scenario('auth.reset_password', 'anonymous', '/auth/reset-password/{reset_token}', 'POST',
+             data={'password': 'password456', 'confirm_password': 'password456'}),
+]
+
+Measurement = namedtuple('Measurement', 'label status_code statements rows')
+
+
+class Recorder:
+    """Counts the statements of one thread; the admission writer's run beside the request."""
+
+    def __init__(self):
+        self.thread = None
+        self.statements = []
+        self.rows = 0
+
+    @property
+    def active(self):
+        return self.thread == threading.get_ident()
+
+    def start(self):
+        self.statements, self.rows, self.thread = [], 0, threading.get_ident()
+
+    def stop(self):
+        self.thread = None
+        return self.statements, self.rows
+
+
+recorder = Recorder()
+
+
+class CountingCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        if recorder.active:
+            recorder.statements.append(sql)
+        return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        if recorder.active:
+            recorder.statements.append(sql)
+        return super().executemany(sql, *args)
+
+    def _count(self, rows):
+        if recorder.active:
+            recorder.rows += len(rows)
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None and recorder.active:
+            recorder.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        return self._count(super().fetchmany(*args))
+
+    def fetchall(self):
+        return self._count(super().fetchall())
+
+
+class CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+
+def _creator(path):
+    return lambda: sqlite3.connect(path, factory=CountingConnection, check_same_thread=False)
+
+
+def normalize(sql):
+    sql = ' '.join(sql.split())
+    return re.sub(r'\(\?(?:, \?)+\)', '(?, ...)', sql)
+
+
+def seed(db):
+    """Insert the synthetic dataset with Core statements and return ids the scenarios need."""
+    from models import User, School, Contact, Event, EventRegistration
+
+    password_hash = generate_password_hash('password123')
+    today = date.today()
+    conn = db.session.connection()
+
+    conn.execute(School.__table__.insert(), [
+        {'id': i, 'name': f'School {i:03d}', 'location': f'City {i % 7}', 'about': 'Synthetic school'}
+        for i in range(1, SCHOOLS + 1)
+    ])
+    conn.execute(Contact.__table__.insert(), [
+        {'name': f'Contact {s}-{c}', 'phone': '000', 'is_primary': c == 0, 'school_id': s}
+        for s in range(1, SCHOOLS + 1) for c in range(CONTACTS_PER_SCHOOL)
+    ])
+    users = [{'id': 1, 'username': 'admin', 'email': 'admin@example.com', 'name': 'Admin',
+              'role': 'admin', 'school_id': None}]
+    users += [{'id': 1 + s, 'username': f'teacher{s}', 'email': f'teacher{s}@example.com', 'name': f'Teacher {s}',
+               'role': 'teacher', 'school_id': s} for s in range(1, SCHOOLS + 1)]
+    first_student = SCHOOLS + 2
+    users += [{'id': first_student + n, 'username': f'student{n}', 'email': f'student{n}@example.com',
+               'name': f'Student {n}', 'role': 'student', 'school_id': 1 + n % SCHOOLS} for n in range(STUDENTS)]
+    conn.execute(User.__table__.insert(), [dict(user, password_hash=password_hash, is_active=True) for user in users])
+
+    events, registrations = [], []
+    event_id = 0
+    for s in range(1, SCHOOLS + 1):
+        for e in range(EVENTS_PER_SCHOOL):
+            event_id += 1
+            events.append({
+                'id': event_id, 'title': f'Event {event_id}', 'description': 'Synthetic event ' * 20,
+                'date': today + timedelta(days=e - EVENTS_PER_SCHOOL // 2), 'start_time': time(9, 0),
+                'end_time': time(17, 0), 'capacity': 100, 'registration_required': True, 'school_id': s,
+                'created_by': 1 + s
+            })
+            registrations += [{
+                'user_id': first_student + (event_id * 7 + r) % STUDENTS, 'event_id': event_id,
+                'status': 'confirmed', 'payment_status': 'unpaid', 'payment_amount': 0.0
+            } for r in range(REGISTRATIONS_PER_EVENT)]
+    conn.execute(Event.__table__.insert(), events)
+    conn.execute(EventRegistration.__table__.insert(), registrations)
+    db.session.commit()
+
+    # All of school 1's events are created by teacher1. Event 20 is upcoming and student0 is not
+    # registered for it
+    return {
+        'school_id': 1,
+        'student_id': first_student,
+        'event_id': 1,
+        'registration_event_id': 20,
+        'deleted_event_id': EVENTS_PER_SCHOOL,
+    }
+
+
+class BudgetRun:
+    """The app on a freshly seeded database in ``workdir``, with a logged-in client per role."""
+
+    def __init__(self, workdir):
+        from admission import admission_queue
+        from app import create_app
+        from extensions import db
+
+        main_path = os.path.join(workdir, 'main.db')
+        archive_path = os.path.join(workdir, 'archive.db')
+        self.app = create_app({
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'SHARDING_ENABLED': False,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{main_path}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'creator': _creator(main_path)},
+            'SQLALCHEMY_BINDS': {'archive': {'url': f'sqlite:///{archive_path}', 'creator': _creator(archive_path)}},
+            'JINJA_BYTECODE_CACHE_DIR': os.path.join(workdir, 'jinja_cache'),
+            'SHARD_DIR': os.path.join(workdir, 'shards'),
+            'ASSET_DIR': os.path.join(workdir, 'assets'),
+            'ADMISSION_DB': os.path.join(workdir, 'admission.db'),
+            'RECONCILIATION_DIR': os.path.join(workdir, 'reconciliation'),
+            'RATE_LIMITS': {},
+        })
+        with self.app.app_context():
+            db.create_all()
+            self.ids = seed(db)
+            # Something for registration_status to report on
+            self.ids['intent_id'] = admission_queue.submit(self.ids['student_id'], self.ids['event_id']).id
+        self.ids['reset_token'] = self.app.serializer.dumps('student1@example.com', salt='password-reset')
+
+        self.clients = {'anonymous': self.app.test_client()}
+        for role in ACCOUNTS:
+            self.clients[role] = self.login(role)
+
+    def login(self, role):
+        client = self.app.test_client()
+        response = client.post('/auth/login', data={'username': ACCOUNTS[role], 'password': 'password123'})
+        if response.status_code != 302:
+            raise RuntimeError(f'Could not log in as {ACCOUNTS[role]}')
+        return client
+
+    def cold_caches(self):
+        """Empty the shared cache and the fragment cache, so no scenario is served from another's work."""
+        from shared_cache import shared_cache, MemoryCache
+
+        shared_cache.backend = MemoryCache()
+        self.app.jinja_env.fragment_cache.clear()
+
+    def measure(self, scenario):
+        client = self.login(scenario.role) if scenario.own_session else self.clients[scenario.role]
+        data = None
+        if scenario.data is not None:
+            # Files are (bytes, filename); the test client needs a fresh stream each time
+            data = {key: (io.BytesIO(value[0]), value[1]) if isinstance(value, tuple) else value
+                    for key, value in scenario.data.items()}
+        self.cold_caches()
+        recorder.start()
+        response = client.open(scenario.url.format(**self.ids), method=scenario.method,
+                               data=data, json=scenario.json)
+        statements, rows = recorder.stop()
+        return Measurement(scenario.label, response.status_code, [normalize(sql) for sql in statements], rows)
+
+
+def verdict(measurement):
+    """'ok', 'HTTP <code>' or 'OVER BUDGET'."""
+    max_queries, max_rows = BUDGETS[measurement.label]
+    if measurement.status_code >= 400:
+        return f'HTTP {measurement.status_code}'
+    if len(measurement.statements) > max_queries or measurement.rows > max_rows:
+        return 'OVER BUDGET'
+    return 'ok'
+
+
+def summary(measurement, status):
+    max_queries, max_rows = BUDGETS[measurement.label]
+    return (f'{status:>12}  {measurement.label:<42} queries {len(measurement.statements):>3}/{max_queries:<3} '
+            f'rows {measurement.rows:>4}/{max_rows}')
+
+
+def load_snapshot():
+    if not os.path.exists(SNAPSHOT_PATH):
+        return {}
+    with open(SNAPSHOT_PATH) as f:
+        return json.load(f)
+
+
+def run(snapshot=False, verbose=False):
+    budget_run = BudgetRun(tempfile.mkdtemp(prefix='query_budget_'))
+    baseline = load_snapshot()
+
+    results, failures = {}, []
+    for scenario in SCENARIOS:
+        measurement = budget_run.measure(scenario)
+        results[measurement.label] = measurement.statements
+        status = verdict(measurement)
+        print(summary(measurement, status))
+
+        if status != 'ok':
+            failures.append(measurement.label)
+            print('\n'.join(explain(measurement, baseline.get(measurement.label))))
+        elif verbose:
+            for sql in measurement.statements:
+                print(f'              {sql}')
+
+    if snapshot:
+        with open(SNAPSHOT_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Snapshot written to {SNAPSHOT_PATH}')
+
+    if failures:
+        print(f'\n❌ {len(failures)} route(s) failed: {", ".join(failures)}')
+        return 1
+    print('\n✅ All routes within their query budgets')
+    return 0
+
+
+def explain(measurement, baseline):
+    """Lines showing what changed against ``baseline``, or the repeated statements without one."""
+    if baseline is not None:
+        diff = difflib.unified_diff(baseline, measurement.statements, 'snapshot', 'current', lineterm='', n=1)
+        return [f'              {line}' for line in diff]
+    return [f"              {f'{count}x' if count > 1 else '  ':>4} {sql}"
+            for sql, count in Counter(measurement.statements).most_common()]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check per-route SQL query budgets.')
+    parser.add_argument('--snapshot', action='store_true', help='record statements for future diffs')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+    sys.exit(run(args.snapshot, args.verbose))
@@ -0,0 +1,172 @@
+"""
+Token-bucket rate limiting for the authentication endpoints.
+
+Each limited endpoint has one bucket per client IP and one per submitted
+username/email (see RATE_LIMITS). Only POSTs are counted, so rendering a form
+is free, and a rejected request returns 429 before any password hashing or
+user lookup happens. /api/auth/token shares the 'login' buckets with
+/auth/login, so moving to the API buys an attacker no extra attempts.
+
+A bucket is two floats (tokens left, last update). A bucket that has been idle
+long enough to refill completely is identical to a fresh one, so it can be
+dropped without changing behaviour; that is how idle keys are evicted.
+
+RATE_LIMIT_BACKEND = 'memory' keeps buckets per process. 'sqlite' keeps them in
+a small shared database file (RATE_LIMIT_DB) so all workers on a host see the
+same counters.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, render_template, jsonify
+
+DEFAULT_RATE_LIMITS = {
+    # name: {scope: (requests, per seconds)}
+    'login': {'ip': (20, 60), 'account': (5, 300)},
+    'register': {'ip': (10, 600), 'account': (3, 600)},
+    'forgot_password': {'ip': (5, 600), 'account': (3, 3600)},
+}
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, updated, idle_after]
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, now=None):
+        """Take one token; returns seconds to wait, or 0 if allowed."""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            self._evict(now)
+            bucket = self._buckets.pop(key, None)
+            tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], now, capacity, rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            # Re-inserting keeps the dict ordered by last use
+            self._buckets[key] = [tokens, now, now + (capacity - tokens) / rate]
+            return wait
+
+    def _evict(self, now):
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if bucket[2] > now and len(buckets) < self.max_keys:
+                break
+            del buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, idle_after REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_buckets_idle_after ON buckets (idle_after)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, rate, now=None):
+        now = now if now is not None else time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else _refill(row[0], row[1], now, capacity, rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated, idle_after) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+                "updated = excluded.updated, idle_after = excluded.idle_after",
+                (key, tokens, now, now + (capacity - tokens) / rate)
+            )
+            conn.execute("DELETE FROM buckets WHERE idle_after < ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.buckets = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMITS', DEFAULT_RATE_LIMITS)
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATE_LIMIT_DB', os.path.join(app.instance_path, 'ratelimit.db'))
+        if app.config['RATE_LIMIT_BACKEND'] == 'sqlite':
+            os.makedirs(os.path.dirname(app.config['RATE_LIMIT_DB']), exist_ok=True)
+            self.buckets = SQLiteBuckets(app.config['RATE_LIMIT_DB'])
+        else:
+            self.buckets = MemoryBuckets()
+        app.extensions['rate_limiter'] = self
+
+    def check(self, name, identities):
+        """Charge every (scope, value) identity; returns the longest wait in seconds."""
+        limits = current_app.config['RATE_LIMITS'].get(name, {})
+        wait = 0
+        for scope, value in identities:
+            if scope not in limits or not value:
+                continue
+            requests, period = limits[scope]
+            wait = max(wait, self.buckets.consume(f'{name}:{scope}:{value}', requests, requests / period))
+        return wait
+
+
+limiter = RateLimiter()
+
+
+def _submitted(field):
+    """A submitted form field, or the same key of a JSON body (API clients)."""
+    value = request.form.get(field)
+    if value is None and request.is_json:
+        body = request.get_json(silent=True)
+        value = body.get(field) if isinstance(body, dict) else None
+    return value.strip().lower() if isinstance(value, str) else ''
+
+
+def rate_limited(name, account_field=None):
+    """Limit POSTs to a view by client IP and, optionally, by a submitted form or JSON field."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method == 'POST':
+                account = _submitted(account_field) if account_field else None
+                wait = limiter.check(name, [('ip', request.remote_addr), ('account', account)])
+                if wait:
+                    retry_after = math.ceil(wait)
+                    headers = {'Retry-After': str(retry_after)}
+                    if request.blueprint == 'api':
+                        return jsonify(error='rate_limited', retry_after=retry_after), 429, headers
+                    return render_template('errors/429.html', retry_after=retry_after), 429, headers
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,251 @@
+"""
+Batch payment reconciliation against event registrations.
+
+Reads a bank or gateway statement CSV as a stream. Columns are matched by name:
+reference (or payment_reference), amount, and optionally date (or
+payment_date / paid_at). Lines are matched to EventRegistration rows through
+the indexed payment_reference column, RECONCILIATION_BATCH_SIZE lines per
+query, so the file is never held in memory and the registrations are never
+scanned.
+
+Each line ends up as one of:
+
+* matched: the registration is marked paid (and a pending one confirmed);
+  the batch is flushed as one transaction, through the ORM so the dashboard
+  rollups see the payments;
+* unmatched: no registration carries the reference;
+* amount_differs: the paid amount is not the registration's payment_amount;
+* duplicate: the reference appeared earlier in the file, is already paid, or
+  belongs to more than one registration (in one shard or across shards);
+* invalid: the line has no reference or an unreadable amount (including NaN
+  and infinity). The decimal separator is '.'; a comma is only read as a
+  thousands separator ('1,250.00'), so '10,00' is invalid rather than 1000.
+
+Only lines that did not match are written to the mismatch report (CSV).
+
+    python reconciliation.py statement.csv --report mismatches.csv
+"""
+import csv
+import io
+import math
+import os
+import re
+import secrets
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from flask import current_app
+
+from models import Event, EventRegistration
+from sharding import shard_router
+
+MATCHED = 'matched'
+UNMATCHED = 'unmatched'
+AMOUNT_DIFFERS = 'amount_differs'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+REFERENCE_COLUMNS = ('reference', 'payment_reference', 'ref')
+AMOUNT_COLUMNS = ('amount', 'payment_amount')
+DATE_COLUMNS = ('date', 'payment_date', 'paid_at')
+REPORT_FIELDS = ('line', 'reference', 'amount', 'status', 'registration_id', 'expected_amount', 'detail')
+AMOUNT_TOLERANCE = 0.005
+
+# Commas only between groups of three digits before the decimal point
+GROUPED_AMOUNT_RE = re.compile(r'[-+]?\d{1,3}(,\d{3})+(\.\d*)?')
+
+Entry = namedtuple('Entry', 'line reference amount paid_at')
+
+
+def _column(row, names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ''):
+            return value.strip()
+    return None
+
+
+def _parse_amount(text):
+    text = text.lstrip('$€£₹ ')
+    if ',' in text and not GROUPED_AMOUNT_RE.fullmatch(text):
+        raise ValueError(f'comma is not a thousands separator: {text}')
+    amount = float(text.replace(',', ''))
+    if not math.isfinite(amount):
+        raise ValueError(f'not a finite amount: {text}')
+    return amount
+
+
+def _parse_date(text):
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def read_statement(stream):
+    """Yield (Entry, error) per data line of a statement CSV text stream."""
+    reader = csv.DictReader(stream)
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    for line, row in enumerate(reader, start=2):
+        reference = _column(row, REFERENCE_COLUMNS)
+        amount = _column(row, AMOUNT_COLUMNS)
+        entry = Entry(line, reference, amount, _parse_date(_column(row, DATE_COLUMNS)))
+        if not reference:
+            yield entry, 'missing reference'
+            continue
+        try:
+            yield entry._replace(amount=_parse_amount(amount or '')), None
+        except ValueError:
+            yield entry, 'unreadable amount'
+
+
+def _apply_batch(session, entries, now):
+    """Match a batch in one shard; returns {reference: (status, registration_id, expected, detail)}."""
+    registrations = session.query(EventRegistration).filter(
+        EventRegistration.payment_reference.in_([entry.reference for entry in entries])).all()
+    if not registrations:
+        return {}
+    # The rollup listener looks up each registration's event; load them in one
+    # query and keep them referenced so they stay in the identity map until the flush
+    events = session.query(Event).filter(Event.id.in_({r.event_id for r in registrations})).all()
+
+    by_reference = {}
+    for registration in registrations:
+        by_reference.setdefault(registration.payment_reference, []).append(registration)
+
+    outcomes = {}
+    for entry in entries:
+        matches = by_reference.get(entry.reference)
+        if not matches:
+            continue
+        registration = matches[0]
+        expected = registration.payment_amount or 0.0
+        if len(matches) > 1:
+            outcomes[entry.reference] = (DUPLICATE, None, None, f'reference matches {len(matches)} registrations')
+        elif registration.payment_status == 'paid':
+            outcomes[entry.reference] = (DUPLICATE, registration.id, expected, 'registration already paid')
+        elif abs(expected - entry.amount) > AMOUNT_TOLERANCE:
+            outcomes[entry.reference] = (AMOUNT_DIFFERS, registration.id, expected, None)
+        else:
+            registration.payment_status = 'paid'
+            registration.payment_date = entry.paid_at or now
+            if registration.status == 'pending':
+                registration.status = 'confirmed'
+            outcomes[entry.reference] = (MATCHED, registration.id, expected, None)
+
+    session.commit()
+    return outcomes
+
+
+def _references_held(session, references):
+    return {reference for (reference,) in session.query(EventRegistration.payment_reference).filter(
+        EventRegistration.payment_reference.in_(references)).distinct()}
+
+
+def _reconcile_batch(entries, writer, summary, now):
+    outcomes = {}
+    if shard_router.enabled:
+        # Each shard only sees its own registrations, so a reference held by two
+        # shards would be paid twice; find those before any shard applies the batch
+        references = [entry.reference for entry in entries]
+        shards = Counter()
+        for held in shard_router.fan_out(lambda session: _references_held(session, references)):
+            shards.update(held)
+        for reference, count in shards.items():
+            if count > 1:
+                outcomes[reference] = (DUPLICATE, None, None, f'reference matches registrations in {count} shards')
+        entries_to_apply = [entry for entry in entries if entry.reference not in outcomes]
+    else:
+        entries_to_apply = entries
+    if entries_to_apply:
+        for shard_outcomes in shard_router.fan_out(lambda session: _apply_batch(session, entries_to_apply, now)):
+            outcomes.update(shard_outcomes)
+    for entry in entries:
+        status, registration_id, expected, detail = outcomes.get(entry.reference, (UNMATCHED, None, None, None))
+        _record(writer, summary, entry, status, registration_id, expected, detail)
+
+
+def _record(writer, summary, entry, status, registration_id=None, expected=None, detail=None):
+    summary[status] += 1
+    if status != MATCHED:
+        writer.writerow({
+            'line': entry.line,
+            'reference': entry.reference,
+            'amount': entry.amount,
+            'status': status,
+            'registration_id': registration_id,
+            'expected_amount': expected,
+            'detail': detail
+        })
+
+
+def reconcile(stream, report, batch_size=None):
+    """
+    Reconcile a statement text stream, writing mismatches as CSV to ``report``.
+    Returns the number of lines per outcome.
+    """
+    batch_size = batch_size or current_app.config['RECONCILIATION_BATCH_SIZE']
+    writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS)
+    writer.writeheader()
+    summary = Counter()
+    seen = set()
+    now = datetime.utcnow()
+
+    batch = []
+    for entry, error in read_statement(stream):
+        if error:
+            _record(writer, summary, entry, INVALID, detail=error)
+            continue
+        if entry.reference in seen:
+            _record(writer, summary, entry, DUPLICATE, detail='reference repeated in statement')
+            continue
+        seen.add(entry.reference)
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            _reconcile_batch(batch, writer, summary, now)
+            batch = []
+    if batch:
+        _reconcile_batch(batch, writer, summary, now)
+    return dict(summary)
+
+
+def reconcile_file(file_storage):
+    """Reconcile an uploaded statement; returns (summary, report filename in RECONCILIATION_DIR)."""
+    report_dir = current_app.config['RECONCILIATION_DIR']
+    os.makedirs(report_dir, exist_ok=True)
+    # Random suffix: two uploads in the same second must not share a report
+    name = f"mismatches-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}.csv"
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    with open(os.path.join(report_dir, name), 'x', newline='') as report:
+        summary = reconcile(stream, report)
+    return summary, name
+
+
+def init_app(app):
+    # Statement lines per lookup; stays under SQLite's bound-parameter limit
+    app.config.setdefault('RECONCILIATION_BATCH_SIZE', 500)
+    app.config.setdefault('RECONCILIATION_DIR', os.path.join(app.instance_path, 'reconciliation'))
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Reconcile a payment statement CSV with registrations.')
+    parser.add_argument('path')
+    parser.add_argument('--report', help='mismatch report CSV (default: stdout)')
+    parser.add_argument('--batch-size', type=int)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context(), open(args.path, encoding='utf-8-sig', newline='') as statement:
+        report = open(args.report, 'w', newline='') if args.report else sys.stdout
+        try:
+            summary = reconcile(statement, report, args.batch_size)
+        finally:
+            if args.report:
+                report.close()
+        print(', '.join(f'{status}: {count}' for status, count in sorted(summary.items())), file=sys.stderr)
@@ -0,0 +1,163 @@
+"""
+Reminder scheduler for event starts and registration deadlines.
+
+Reminders are due REMINDER_EVENT_LEAD_HOURS before an event starts and
+REMINDER_DEADLINE_LEAD_HOURS before its registration deadline (end of that
+day). The scheduler never scans the events table: each tick it loads only the
+next slice of time, (loaded_until, now + lookahead], with range queries on the
+indexed events.date and events.registration_deadline columns, and keeps those
+reminders in a heap ordered by fire time.
+
+Due reminders are sent in batches to the confirmed registrants of each event,
+looked up with one query per batch. After every tick the cursor (the time up to
+which reminders have been sent) is stored in scheduler_state, so a restart
+resumes where it stopped and catches up on anything missed while down.
+
+    python reminders.py
+"""
+import heapq
+import time as time_module
+from datetime import datetime, timedelta, time
+
+from flask import current_app
+
+from extensions import db
+from models import Event, EventRegistration, User, SchedulerState
+from sharding import shard_router
+
+CURSOR_KEY = 'reminders.cursor'
+EVENT_START = 'event_start'
+DEADLINE = 'deadline'
+DEFAULT_START_TIME = time(9, 0)
+END_OF_DAY = time(23, 59)
+
+
+class ReminderScheduler:
+    def __init__(self):
+        config = current_app.config
+        self.event_lead = timedelta(hours=config['REMINDER_EVENT_LEAD_HOURS'])
+        self.deadline_lead = timedelta(hours=config['REMINDER_DEADLINE_LEAD_HOURS'])
+        self.lookahead = timedelta(minutes=config['REMINDER_LOOKAHEAD_MINUTES'])
+        self.batch_size = config['REMINDER_BATCH_SIZE']
+        self.heap = []
+        self.cursor = self._load_cursor()
+        self.loaded_until = self.cursor
+
+    def _load_cursor(self):
+        state = db.session.get(SchedulerState, CURSOR_KEY)
+        if state and state.value:
+            return datetime.fromisoformat(state.value)
+        # First run: start from now rather than replaying the past
+        return datetime.now()
+
+    def _save_cursor(self):
+        state = db.session.get(SchedulerState, CURSOR_KEY) or SchedulerState(key=CURSOR_KEY)
+        state.value = self.cursor.isoformat()
+        db.session.add(state)
+        db.session.commit()
+
+    def _load_window(self, start, end):
+        """Push reminders with fire time in (start, end] onto the heap."""
+        first_start, last_start = (start + self.event_lead).date(), (end + self.event_lead).date()
+        first_deadline, last_deadline = (start + self.deadline_lead).date(), (end + self.deadline_lead).date()
+
+        def load(session):
+            starts = session.query(Event.id, Event.title, Event.date, Event.start_time, Event.school_id).filter(
+                Event.date.between(first_start, last_start)).all()
+            deadlines = session.query(Event.id, Event.title, Event.registration_deadline, Event.school_id).filter(
+                Event.registration_deadline.between(first_deadline, last_deadline),
+                Event.registration_required.is_(True)).all()
+            return starts, deadlines
+
+        for starts, deadlines in shard_router.fan_out(load):
+            for event_id, title, day, start_time, school_id in starts:
+                fire_at = datetime.combine(day, start_time or DEFAULT_START_TIME) - self.event_lead
+                if start < fire_at <= end:
+                    heapq.heappush(self.heap, (fire_at, EVENT_START, event_id, title, school_id))
+            for event_id, title, day, school_id in deadlines:
+                fire_at = datetime.combine(day, END_OF_DAY) - self.deadline_lead
+                if start < fire_at <= end:
+                    heapq.heappush(self.heap, (fire_at, DEADLINE, event_id, title, school_id))
+
+    def tick(self, now=None):
+        """Send every reminder due by ``now``; returns how many reminders fired."""
+        now = now or datetime.now()
+        horizon = now + self.lookahead
+        if horizon > self.loaded_until:
+            self._load_window(self.loaded_until, horizon)
+            self.loaded_until = horizon
+
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        for i in range(0, len(due), self.batch_size):
+            self._fire(due[i:i + self.batch_size])
+
+        self.cursor = now
+        self._save_cursor()
+        return len(due)
+
+    def _recipients(self, reminders):
+        """event id -> [(email, name)] of confirmed registrants, one query per shard."""
+        by_school = {}
+        for _, _, event_id, _, school_id in reminders:
+            by_school.setdefault(school_id, set()).add(event_id)
+
+        registrations = []
+        for school_id, event_ids in by_school.items():
+            registrations += shard_router.session_for(school_id).query(
+                EventRegistration.event_id, EventRegistration.user_id
+            ).filter(
+                EventRegistration.event_id.in_(event_ids),
+                EventRegistration.status == 'confirmed'
+            ).all()
+
+        user_ids = {user_id for _, user_id in registrations}
+        users = dict((user_id, (email, name)) for user_id, email, name in db.session.query(
+            User.id, User.email, User.name).filter(User.id.in_(user_ids), User.is_active.is_(True)))
+
+        recipients = {}
+        for event_id, user_id in registrations:
+            if user_id in users:
+                recipients.setdefault(event_id, []).append(users[user_id])
+        return recipients
+
+    def _fire(self, reminders):
+        recipients = self._recipients(reminders)
+        for fire_at, kind, event_id, title, _ in reminders:
+            if kind == EVENT_START:
+                subject = f'Reminder: {title} starts soon'
+                body = f'"{title}" starts at {(fire_at + self.event_lead).strftime("%B %d, %Y %I:%M %p")}.'
+            else:
+                subject = f'Reminder: registration for {title} closes soon'
+                body = f'Registration for "{title}" closes on {(fire_at + self.deadline_lead).strftime("%B %d, %Y")}.'
+            for email, name in recipients.get(event_id, []):
+                current_app.send_email(subject, email, f'Hi {name},\n\n{body}')
+
+    def run_forever(self):
+        app = current_app._get_current_object()
+        interval = app.config['REMINDER_TICK_SECONDS']
+        while True:
+            # A fresh app context per tick so no session holds a read transaction open
+            with app.app_context():
+                fired = self.tick()
+            if fired:
+                app.logger.info(f"Sent {fired} reminders")
+            time_module.sleep(interval)
+
+
+def init_app(app):
+    app.config.setdefault('REMINDER_EVENT_LEAD_HOURS', 24)
+    app.config.setdefault('REMINDER_DEADLINE_LEAD_HOURS', 48)
+    app.config.setdefault('REMINDER_LOOKAHEAD_MINUTES', 60)
+    app.config.setdefault('REMINDER_TICK_SECONDS', 60)
+    app.config.setdefault('REMINDER_BATCH_SIZE', 200)
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        ReminderScheduler().run_forever()
@@ -0,0 +1,260 @@
+"""
+Per-school, per-month registration rollups.
+
+The rollup rows are kept up to date from a flush listener: every time an
+EventRegistration is inserted, updated or deleted (or an Event moves to another
+school or month) the difference is applied to school_monthly_rollups with a
+single atomic upsert in the same transaction. Dashboards read only the rollup
+table, so their cost does not depend on the number of registrations.
+
+Run this module directly to rebuild the rollups from the raw tables:
+
+    python rollups.py            # rebuild everything
+    python rollups.py --school 3 # rebuild one school
+"""
+from collections import defaultdict
+
+from sqlalchemy import event as sa_event, func, case, inspect, insert, delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import School, Event, EventRegistration, SchoolMonthlyRollup, ArchivedEvent, ArchivedEventRegistration
+from sharding import shard_router
+
+METRICS = ('registrations', 'confirmed', 'attended', 'cancelled', 'paid', 'revenue')
+
+
+def month_key(date):
+    return date.strftime('%Y-%m') if date else None
+
+
+def contribution(status, payment_status, payment_amount):
+    """What a single registration adds to its school/month rollup."""
+    status = status or 'pending'
+    paid = (payment_status or 'unpaid') == 'paid'
+    return {
+        'registrations': 1,
+        'confirmed': 1 if status == 'confirmed' else 0,
+        'attended': 1 if status == 'attended' else 0,
+        'cancelled': 1 if status == 'cancelled' else 0,
+        'paid': 1 if paid else 0,
+        'revenue': (payment_amount or 0.0) if paid else 0.0
+    }
+
+
+def aggregate_columns():
+    """SQL aggregates matching contribution(), in METRICS order."""
+    reg = EventRegistration
+    return (
+        func.count(reg.id),
+        func.coalesce(func.sum(case((reg.status == 'confirmed', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((reg.status == 'attended', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((reg.status == 'cancelled', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((reg.payment_status == 'paid', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((reg.payment_status == 'paid', func.coalesce(reg.payment_amount, 0.0)), else_=0.0)), 0.0),
+    )
+
+
+def _value(state, name, old):
+    """Current value of an attribute, or the committed one when ``old`` is set."""
+    history = state.attrs[name].history
+    if not history:
+        # Expired by a commit and not changed since: both are whatever loads
+        return getattr(state.obj(), name)
+    if old:
+        if history.deleted:
+            return history.deleted[0]
+        if history.unchanged:
+            return history.unchanged[0]
+        return None
+    if history.added:
+        return history.added[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _event_key(session, event_id):
+    event = session.get(Event, event_id) if event_id else None
+    if event is None:
+        return None
+    return event.school_id, month_key(event.date)
+
+
+def _registration_key(session, state, old):
+    # event_id assigned directly wins: the loaded relationship still points at
+    # the old event until the flush. A relationship assignment
+    # (registration.event = ...) is only copied into event_id during the flush,
+    # so otherwise look at the relationship first.
+    if state.attrs['event_id'].history.has_changes():
+        return _event_key(session, _value(state, 'event_id', old))
+    event = _value(state, 'event', old)
+    if event is not None:
+        return event.school_id, month_key(event.date)
+    return _event_key(session, _value(state, 'event_id', old))
+
+
+def _add(deltas, key, values, sign):
+    if key is None or key[0] is None or key[1] is None:
+        return
+    bucket = deltas[key]
+    for metric, value in zip(METRICS, values):
+        bucket[metric] += sign * value
+
+
+def _registration_values(state, old):
+    values = contribution(
+        _value(state, 'status', old),
+        _value(state, 'payment_status', old),
+        _value(state, 'payment_amount', old)
+    )
+    return [values[m] for m in METRICS]
+
+
+def _event_totals(session, event_id, exclude=()):
+    query = session.query(*aggregate_columns()).filter(EventRegistration.event_id == event_id)
+    if exclude:
+        query = query.filter(EventRegistration.id.notin_(exclude))
+    return query.one()
+
+
+def collect_deltas(session):
+    """Work out the rollup changes implied by the pending flush."""
+    deltas = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+
+    for obj in session.new:
+        if isinstance(obj, EventRegistration):
+            state = inspect(obj)
+            _add(deltas, _registration_key(session, state, False), _registration_values(state, False), 1)
+
+    # Registrations deleted along with their event are subtracted one by one
+    deleted_ids = [obj.id for obj in session.deleted if isinstance(obj, EventRegistration)]
+    for obj in session.deleted:
+        if isinstance(obj, EventRegistration):
+            state = inspect(obj)
+            _add(deltas, _registration_key(session, state, True), _registration_values(state, True), -1)
+        elif isinstance(obj, Event) and obj.id is not None:
+            state = inspect(obj)
+            key = (_value(state, 'school_id', True), month_key(_value(state, 'date', True)))
+            _add(deltas, key, _event_totals(session, obj.id, deleted_ids), -1)
+
+    for obj in session.dirty:
+        if not session.is_modified(obj):
+            continue
+        state = inspect(obj)
+        if isinstance(obj, EventRegistration):
+            _add(deltas, _registration_key(session, state, True), _registration_values(state, True), -1)
+            _add(deltas, _registration_key(session, state, False), _registration_values(state, False), 1)
+        elif isinstance(obj, Event):
+            # Registrations of a moved event move with it. Rows changed in this
+            # same flush are handled above against the event's new key.
+            old_key = (_value(state, 'school_id', True), month_key(_value(state, 'date', True)))
+            new_key = (obj.school_id, month_key(obj.date))
+            if old_key != new_key:
+                totals = _event_totals(session, obj.id)
+                _add(deltas, old_key, totals, -1)
+                _add(deltas, new_key, totals, 1)
+
+    return {key: values for key, values in deltas.items() if any(values.values())}
+
+
+def apply_deltas(connection, deltas):
+    table = SchoolMonthlyRollup.__table__
+    for (school_id, month), values in deltas.items():
+        stmt = sqlite_insert(table).values(school_id=school_id, month=month, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.school_id, table.c.month],
+            set_={m: table.c[m] + stmt.excluded[m] for m in METRICS}
+        )
+        connection.execute(stmt)
+
+
+# The old key and values of a changed row come from attribute history. Assigning
+# to an attribute that a commit expired records no old value, so have these
+# attributes load it first; otherwise the row is added to its new bucket without
+# leaving the old one.
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+for _attribute in (Event.school_id, Event.date, EventRegistration.event_id, EventRegistration.status,
+                   EventRegistration.payment_status, EventRegistration.payment_amount):
+    sa_event.listen(_attribute, 'set', _keep_old_value, active_history=True)
+
+
+@sa_event.listens_for(Session, 'before_flush')
+def _update_rollups(session, flush_context, instances):
+    if not any(isinstance(obj, (Event, EventRegistration))
+               for obj in (*session.new, *session.dirty, *session.deleted)):
+        return
+    with session.no_autoflush:
+        deltas = collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(bind_arguments={'mapper': SchoolMonthlyRollup}), deltas)
+
+
+def rebuild_rollups(session=None, school_id=None):
+    """
+    Recompute rollups from event_registrations in one set-based statement. With
+    sharding enabled (and no ``session`` given) each school is rebuilt in its own
+    shard, where the dashboard reads it, and committed separately.
+    """
+    if session is None and shard_router.enabled:
+        school_ids = [school_id] if school_id is not None else [
+            school_id for (school_id,) in db.session.query(School.id).order_by(School.id)]
+        for shard_school_id in school_ids:
+            _rebuild(shard_router.session_for(shard_school_id), shard_school_id)
+        return
+    _rebuild(session or db.session, school_id)
+
+
+def _rebuild(session, school_id):
+    table = SchoolMonthlyRollup.__table__
+    month = func.strftime('%Y-%m', Event.date)
+
+    source = select(Event.school_id, month, *aggregate_columns()).select_from(EventRegistration).join(
+        Event, EventRegistration.event_id == Event.id
+    ).group_by(Event.school_id, month)
+    clear = delete(table)
+    if school_id is not None:
+        source = source.where(Event.school_id == school_id)
+        clear = clear.where(table.c.school_id == school_id)
+
+    session.execute(clear)
+    session.execute(insert(table).from_select(['school_id', 'month', *METRICS], source))
+    apply_deltas(session.connection(bind_arguments={'mapper': SchoolMonthlyRollup}), archived_totals(school_id))
+    session.commit()
+
+
+def archived_totals(school_id=None):
+    """Rollup totals for registrations already moved to the archive by archive.py."""
+    reg, event = ArchivedEventRegistration, ArchivedEvent
+    month = func.strftime('%Y-%m', event.date)
+    query = db.session.query(
+        event.school_id, month,
+        func.count(reg.id),
+        func.sum(case((reg.status == 'confirmed', 1), else_=0)),
+        func.sum(case((reg.status == 'attended', 1), else_=0)),
+        func.sum(case((reg.status == 'cancelled', 1), else_=0)),
+        func.sum(case((reg.payment_status == 'paid', 1), else_=0)),
+        func.sum(case((reg.payment_status == 'paid', func.coalesce(reg.payment_amount, 0.0)), else_=0.0)),
+    ).join(event, reg.event_id == event.id).group_by(event.school_id, month)
+    if school_id is not None:
+        query = query.filter(event.school_id == school_id)
+    return {(row[0], row[1]): dict(zip(METRICS, row[2:])) for row in query}
+
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Rebuild registration rollups.')
+    parser.add_argument('--school', type=int, help='only rebuild this school id')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        rebuild_rollups(school_id=args.school)
+        print("✅ Rollups rebuilt")
@@ -0,0 +1,118 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, Response, stream_with_context, abort, send_from_directory
+from flask_login import login_required, current_user
+from extensions import db
+from models import School, SchoolMonthlyRollup
+from rollups import METRICS
+from sharding import shard_router
+from provisioning import provision_file
+from backup import backup_all, export_school
+from reconciliation import reconcile_file, MATCHED
+from shared_cache import shared_cache
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.before_request
+@login_required
+def require_admin():
+    if current_user.role != 'admin':
+        flash('You do not have permission to access the admin area.', 'danger')
+        return redirect(url_for('main.index'))
+
+@admin_bp.route('/dashboard')
+def dashboard():
+    # Reads only the rollup table; see rollups.py for how it is maintained
+    school_id = request.args.get('school_id', type=int)
+    start = request.args.get('from')  # 'YYYY-MM'
+    end = request.args.get('to')
+    
+    def load(session):
+        query = session.query(SchoolMonthlyRollup)
+        if school_id:
+            query = query.filter(SchoolMonthlyRollup.school_id == school_id)
+        if start:
+            query = query.filter(SchoolMonthlyRollup.month >= start)
+        if end:
+            query = query.filter(SchoolMonthlyRollup.month <= end)
+        return query.all()
+    
+    # With sharding enabled each school's rollups live in its own shard
+    rows = [row for rows in shard_router.fan_out(load, [school_id] if school_id else None) for row in rows]
+    rows.sort(key=lambda row: (row.month, -row.school_id), reverse=True)
+    
+    school_names = dict(db.session.query(School.id, School.name).all())
+    totals = dict.fromkeys(METRICS, 0)
+    for row in rows:
+        for metric in METRICS:
+            totals[metric] += getattr(row, metric)
+    
+    if request.args.get('format') == 'json':
+        return {
+            'rows': [dict(row.to_dict(), school_name=school_names.get(row.school_id)) for row in rows],
+            'totals': totals
+        }
+    
+    return render_template(
+        'admin/dashboard.html',
+        rows=rows,
+        totals=totals,
+        school_names=school_names,
+        school_id=school_id
+    )
+
+@admin_bp.route('/cache-stats')
+def cache_stats():
+    return {
+        'fragments': current_app.jinja_env.fragment_cache.stats(),
+        'shared': shared_cache.stats()
+    }
+
+@admin_bp.route('/users/bulk', methods=['GET', 'POST'])
+def bulk_users():
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV or JSON file to upload.', 'danger')
+            return redirect(url_for('admin.bulk_users'))
+        report = provision_file(upload, request.form.get('school_id', type=int))
+        if request.args.get('format') == 'json':
+            return {'report': report}
+        created = sum(1 for line in report if line['status'] == 'created')
+        flash(f'Created {created} of {len(report)} users.', 'success')
+    
+    schools = db.session.query(School.id, School.name).order_by(School.name).all()
+    return render_template('admin/bulk_users.html', schools=schools, report=report)
+
+@admin_bp.route('/backup', methods=['POST'])
+def backup():
+    # Online backup: the app keeps serving writes while the copy runs
+    return {'files': backup_all()}
+
+@admin_bp.route('/schools/<int:school_id>/export')
+def export(school_id):
+    if db.session.get(School, school_id) is None:
+        abort(404)
+    return Response(
+        stream_with_context(export_school(school_id)),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename=school-{school_id}.jsonl.gz'}
+    )
+
+@admin_bp.route('/payments/reconcile', methods=['GET', 'POST'])
+def reconcile_payments():
+    summary = report_name = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a statement CSV to upload.', 'danger')
+            return redirect(url_for('admin.reconcile_payments'))
+        summary, report_name = reconcile_file(upload)
+        if request.args.get('format') == 'json':
+            return {'summary': summary, 'report': url_for('admin.reconciliation_report', name=report_name)}
+        total = sum(summary.values())
+        flash(f'Matched {summary.get(MATCHED, 0)} of {total} statement lines.', 'success')
+    return render_template('admin/reconcile.html', summary=summary, report_name=report_name)
+
+@admin_bp.route('/payments/reconcile/<name>')
+def reconciliation_report(name):
+    return send_from_directory(current_app.config['RECONCILIATION_DIR'], name, as_attachment=True)
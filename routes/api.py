@@ -0,0 +1,120 @@
+from flask import Blueprint, request, jsonify, g, Response
+from models import User, Event, ModelAsset
+from policy import scoped
+from sharding import shard_router
+from rate_limit import rate_limited
+from tokens import token_required, issue_tokens, decode_token, revoke, bearer_token
+from school_directory import get_directory, parse_fields
+from assets import load_layout, layout_refs, asset_url
+import event_listing
+
+api_bp = Blueprint('api', __name__)
+
+def _body():
+    """The JSON object or form posted to an auth endpoint; None for any other JSON value."""
+    data = request.get_json(silent=True)
+    if data is None:
+        return request.form
+    return data if isinstance(data, dict) else None
+
+@api_bp.route('/auth/token', methods=['POST'])
+@rate_limited('login', account_field='username')
+def issue_token():
+    data = _body()
+    if data is None:
+        return jsonify(error='invalid_request'), 400
+    user = User.query.filter_by(username=data.get('username')).first()
+    if not user or not user.check_password(data.get('password') or ''):
+        return jsonify(error='invalid_credentials'), 401
+    if not user.is_active:
+        return jsonify(error='account_disabled'), 403
+    return jsonify(issue_tokens(user))
+
+@api_bp.route('/auth/refresh', methods=['POST'])
+def refresh_token():
+    data = _body()
+    if data is None:
+        return jsonify(error='invalid_request'), 400
+    claims = decode_token(data.get('refresh_token') or '', kind='refresh')
+    if claims is None:
+        return jsonify(error='invalid_token'), 401
+    
+    # Refresh is where account changes are picked up, so this one reads the user
+    user = User.query.get(claims['uid'])
+    if user is None or not user.is_active:
+        return jsonify(error='account_disabled'), 403
+    
+    # Refresh tokens are single use
+    revoke(claims)
+    return jsonify(issue_tokens(user))
+
+@api_bp.route('/auth/revoke', methods=['POST'])
+def revoke_token():
+    data = _body()
+    if data is None:
+        return jsonify(error='invalid_request'), 400
+    for token, kind in ((bearer_token(), 'access'), (data.get('refresh_token'), 'refresh')):
+        claims = decode_token(token, kind) if token else None
+        if claims is not None:
+            revoke(claims)
+    return '', 204
+
+@api_bp.route('/me')
+@token_required
+def me():
+    user = g.api_user
+    return jsonify(id=user.id, role=user.role, school_id=user.school_id)
+
+@api_bp.route('/events/<int:event_id>/3d-layout')
+@token_required
+def event_layout(event_id):
+    session = shard_router.session_for_event(event_id)
+    row = scoped(session.query(Event.layout_3d), Event, user=g.api_user).filter(
+        Event.id == event_id).first()
+    if row is None:
+        return jsonify(error='not_found'), 404
+    layout = load_layout(row.layout_3d)
+    
+    # Models are referenced by digest; one lookup resolves them to immutable URLs
+    digests = layout_refs(layout)
+    assets = {}
+    if digests:
+        assets = {digest: {'url': asset_url(digest, extension), 'format': extension.lstrip('.')}
+                  for digest, extension in ModelAsset.query.with_entities(
+                      ModelAsset.digest, ModelAsset.extension).filter(ModelAsset.digest.in_(digests))}
+    return jsonify(layout=layout, assets=assets)
+
+@api_bp.route('/events')
+@token_required
+def events():
+    args = request.args
+    try:
+        ids = event_listing.parse_ids(args['ids']) if 'ids' in args else None
+        start = event_listing.parse_date(args.get('from'))
+        end = event_listing.parse_date(args.get('to'))
+    except ValueError as e:
+        return jsonify(error='invalid_parameter', detail=str(e)), 400
+    limit = min(args.get('limit', event_listing.DEFAULT_LIMIT, type=int), event_listing.MAX_LIMIT)
+    
+    events = event_listing.list_events(
+        g.api_user,
+        fields=event_listing.parse_fields(args.get('fields')),
+        ids=ids,
+        school_id=args.get('school', type=int),
+        start=start,
+        end=end,
+        limit=max(limit, 1)
+    )
+    return Response(event_listing.encode({'events': events}), mimetype='application/json')
+
+@api_bp.route('/schools')
+@token_required
+def schools():
+    body, etag = get_directory(parse_fields(request.args.get('fields')), g.api_user)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -1,12 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import login_user, logout_user, current_user, login_required
 from extensions import db
 from models import User, School
 from forms import LoginForm, RegistrationForm, ForgotPasswordForm, ResetPasswordForm, ChangePasswordForm
+from rate_limit import rate_limited
+from school_index import school_index
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@rate_limited('login', account_field='username')
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
@@ -26,13 +29,12 @@ def login():
     return render_template('auth/login.html', form=form)
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
+@rate_limited('register', account_field='email')
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
         
     form = RegistrationForm()
-    # Only show schools for teacher registration
-    form.school_id.choices = [(0, '-- Select School --')] + [(s.id, s.name) for s in School.query.order_by('name').all()]
     
     if form.validate_on_submit():
         try:
@@ -52,7 +54,7 @@ def register():
                 email=form.email.data,
                 name=form.name.data,
                 role=form.role.data,
-                school_id=form.school_id.data if form.role.data == 'teacher' and form.school_id.data != 0 else None,
+                school_id=form.school_id.data if form.role.data == 'teacher' else None,
                 is_active=True
             )
             user.set_password(form.password.data)
@@ -73,6 +75,11 @@ def register():
     
     return render_template('auth/register.html', form=form)
 
+@auth_bp.route('/schools/search')
+def search_schools():
+    results = school_index.search(request.args.get('q', ''), limit=max(1, min(request.args.get('limit', 10, type=int), 50)))
+    return jsonify([{'id': school_id, 'name': name, 'location': location} for school_id, name, location in results])
+
 @auth_bp.route('/logout')
 @login_required
 def logout():
@@ -96,6 +103,7 @@ def change_password():
     return render_template('auth/change_password.html', form=form)
 
 @auth_bp.route('/forgot-password', methods=['GET', 'POST'])
+@rate_limited('forgot_password', account_field='email')
 def forgot_password():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
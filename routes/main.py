@@ -1,60 +1,125 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from datetime import date
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy import func
+from sqlalchemy.orm import load_only
 from extensions import db
 from models import School, Event
 from forms import EventForm
+from sharding import shard_router
+from archive import past_events
+from policy import scoped, scope_key, CREATE, EDIT, DELETE
+from shared_cache import shared_cache
+from admission import admission_queue, registration_closed, MESSAGES, CLOSED
+from assets import store_asset, save_layout, load_layout, layout_refs, release_refs, asset_url
+
+UPCOMING_EVENTS_LIMIT = 10
+PAST_EVENTS_PER_PAGE = 20
 
 main_bp = Blueprint('main', __name__)
 
+def _index_page(user, today):
+    # Only the schools this user may see, and only the columns the page shows
+    schools = scoped(School.query, School, user=user).options(
+        load_only(School.id, School.name, School.location)).all()
+    school_ids = [school.id for school in schools]
+    
+    # Event counts and the upcoming feed are read from every shard in parallel.
+    # The fan-out threads have no request context, so pass the user explicitly.
+    def load(session):
+        counts = scoped(session.query(Event.school_id, func.count(Event.id)), Event, user=user).filter(
+            Event.school_id.in_(school_ids)).group_by(Event.school_id).all()
+        upcoming = scoped(session.query(Event), Event, user=user).filter(
+            Event.school_id.in_(school_ids), Event.date >= today
+        ).options(load_only(Event.id, Event.title, Event.description, Event.date, Event.school_id,
+                            Event.updated_at)).order_by(Event.date).limit(UPCOMING_EVENTS_LIMIT).all()
+        # Plain dicts: the page is cached and may be read by another worker
+        return counts, [{
+            'id': event.id,
+            'title': event.title,
+            'description': event.description,
+            'date': event.date,
+            'school_id': event.school_id,
+            'updated_at': event.updated_at
+        } for event in upcoming]
+    
+    event_counts = {}
+    upcoming_events = []
+    for counts, upcoming in shard_router.fan_out(load, school_ids):
+        event_counts.update(counts)
+        upcoming_events.extend(upcoming)
+    upcoming_events = sorted(upcoming_events, key=lambda event: event['date'])[:UPCOMING_EVENTS_LIMIT]
+        
+    # Add event counts to each school
+    schools_with_counts = []
+    for school in schools:
+        school_data = {
+            'id': school.id,
+            'name': school.name,
+            'location': school.location,
+            'event_count': event_counts.get(school.id, 0)
+        }
+        schools_with_counts.append(school_data)
+    
+    return {
+        'schools': schools_with_counts,
+        'upcoming_events': upcoming_events,
+        'school_names': {school.id: school.name for school in schools}
+    }
+
 @main_bp.route('/')
 def index():
     if current_user.is_authenticated:
-        if current_user.role == 'admin':
-            schools = School.query.all()
-        elif current_user.role == 'teacher':
-            schools = [current_user.school]
-        else:  # student
-            schools = School.query.all()
-            
-        # Add event counts to each school
-        schools_with_counts = []
-        for school in schools:
-            school_data = {
-                'id': school.id,
-                'name': school.name,
-                'location': school.location,
-                'event_count': len(school.events)
-            }
-            schools_with_counts.append(school_data)
-            
-        return render_template('index.html', schools=schools_with_counts)
+        # Shared by every worker; event writes bump 'events', school writes bump 'schools'
+        today = date.today()
+        key = f"index:{scope_key(School)}:{scope_key(Event)}:{today}:{shared_cache.version('schools')}"
+        user = current_user._get_current_object()
+        page = shared_cache.get_or_set('events', key, lambda: _index_page(user, today))
+        return render_template('index.html', **page)
     return redirect(url_for('auth.login'))
 
 @main_bp.route('/school/<int:school_id>')
 @login_required
 def school_events(school_id):
-    school = School.query.get_or_404(school_id)
+    school = scoped(School.query, School).filter(School.id == school_id).first()
+    if school is None:
+        flash('You do not have permission to view events for this school.', 'danger')
+        return redirect(url_for('main.index'))
     
-    # Check if user has permission to view this school's events
-    if current_user.role == 'teacher' and current_user.school_id != school_id:
+    events = scoped(shard_router.session_for(school_id).query(Event), Event).filter(
+        Event.school_id == school_id, Event.date >= date.today()
+    ).order_by(Event.date).all()
+    return render_template('school_events.html', school=school, events=events)
+
+@main_bp.route('/school/<int:school_id>/past')
+@login_required
+def school_past_events(school_id):
+    school = scoped(School.query, School).filter(School.id == school_id).first()
+    if school is None:
         flash('You do not have permission to view events for this school.', 'danger')
         return redirect(url_for('main.index'))
-        
-    return render_template('school_events.html', school=school, events=school.events)
+    
+    # Reads recent past events from the hot tables and older ones from the archive
+    page = max(1, request.args.get('page', 1, type=int))
+    events, has_more = past_events(school_id, PAST_EVENTS_PER_PAGE, (page - 1) * PAST_EVENTS_PER_PAGE)
+    return render_template(
+        'school_events.html',
+        school=school,
+        events=events,
+        heading='Past Events',
+        read_only=True,
+        page=page,
+        has_more=has_more
+    )
 
 @main_bp.route('/school/<int:school_id>/event/new', methods=['GET', 'POST'])
 @login_required
 def new_event(school_id):
-    # Check permissions
-    if current_user.role not in ['admin', 'teacher']:
-        flash('You do not have permission to create events.', 'danger')
-        return redirect(url_for('main.index'))
-        
-    if current_user.role == 'teacher' and current_user.school_id != school_id:
+    school = scoped(School.query, School, CREATE).filter(School.id == school_id).first()
+    if school is None:
         flash('You can only create events for your own school.', 'danger')
         return redirect(url_for('main.index'))
     
-    school = School.query.get_or_404(school_id)
     form = EventForm()
     
     # Debug: Print current working directory and template path
@@ -93,6 +158,7 @@ def new_event(school_id):
             
             # Create event
             event = Event(
+                id=shard_router.allocate_event_id(school_id),
                 title=form.title.data,
                 description=form.description.data,
                 date=event_datetime,
@@ -102,13 +168,15 @@ def new_event(school_id):
                 created_by=current_user.id
             )
             
-            db.session.add(event)
-            db.session.commit()
+            session = shard_router.session_for(school_id)
+            session.add(event)
+            session.commit()
+            shared_cache.bump('events')
             flash('Event created successfully!', 'success')
             return redirect(url_for('main.school_events', school_id=school_id))
             
         except Exception as e:
-            db.session.rollback()
+            shard_router.session_for(school_id).rollback()
             current_app.logger.error(f"Error creating event: {str(e)}")
             flash('An error occurred while creating the event. Please try again.', 'error')
     
@@ -125,12 +193,11 @@ def new_event(school_id):
 @main_bp.route('/event/edit/<int:event_id>', methods=['GET', 'POST'])
 @login_required
 def edit_event(event_id):
-    event = Event.query.get_or_404(event_id)
-    
-    # Check permissions
-    if current_user.role == 'teacher' and (current_user.school_id != event.school_id or current_user.id != event.created_by):
+    session = shard_router.session_for_event(event_id)
+    event = scoped(session.query(Event), Event, EDIT).filter(Event.id == event_id).first()
+    if event is None:
         flash('You can only edit your own events.', 'danger')
-        return redirect(url_for('main.school_events', school_id=event.school_id))
+        return redirect(url_for('main.index'))
     
     form = EventForm(obj=event)
     
@@ -165,12 +232,13 @@ def edit_event(event_id):
                 image.save(os.path.join(current_app.static_folder, image_path))
                 event.image_path = image_path
             
-            db.session.commit()
+            session.commit()
+            shared_cache.bump('events')
             flash('Event updated successfully!', 'success')
             return redirect(url_for('main.school_events', school_id=event.school_id))
             
         except Exception as e:
-            db.session.rollback()
+            session.rollback()
             current_app.logger.error(f"Error updating event: {str(e)}")
             flash('An error occurred while updating the event. Please try again.', 'error')
     
@@ -181,7 +249,7 @@ def edit_event(event_id):
     return render_template(
         'event_form.html',
         form=form,
-        school=event.school,
+        school=db.session.get(School, event.school_id),
         title='Edit Event',
         is_edit=True
     )
@@ -189,19 +257,105 @@ def edit_event(event_id):
 @main_bp.route('/event/delete/<int:event_id>', methods=['POST'])
 @login_required
 def delete_event(event_id):
-    event = Event.query.get_or_404(event_id)
-    school_id = event.school_id
-    
-    # Check permissions
-    if current_user.role == 'teacher' and (current_user.school_id != event.school_id or current_user.id != event.created_by):
+    session = shard_router.session_for_event(event_id)
+    event = scoped(session.query(Event), Event, DELETE).filter(Event.id == event_id).first()
+    if event is None:
         flash('You can only delete your own events.', 'danger')
-        return redirect(url_for('main.school_events', school_id=school_id))
+        return redirect(url_for('main.index'))
+    school_id = event.school_id
+    asset_refs = layout_refs(load_layout(event.layout_3d))
     
-    db.session.delete(event)
-    db.session.commit()
+    session.delete(event)
+    session.commit()
+    shared_cache.bump('events')
+    shard_router.forget_event(event_id)
+    release_refs(asset_refs)
     flash('Event deleted successfully!', 'success')
     return redirect(url_for('main.school_events', school_id=school_id))
 
+@main_bp.route('/event/<int:event_id>/3d')
+@login_required
+def event_3d_viewer(event_id):
+    session = shard_router.session_for_event(event_id)
+    # A plain Session query (shards) has no first_or_404
+    event = scoped(session.query(Event), Event).filter(Event.id == event_id).first()
+    if event is None:
+        abort(404)
+    return render_template('event_3d_viewer.html', event=event)
+
+@main_bp.route('/event/<int:event_id>/3d/edit')
+@login_required
+def event_3d_builder(event_id):
+    session = shard_router.session_for_event(event_id)
+    event = scoped(session.query(Event), Event, EDIT).filter(Event.id == event_id).first()
+    if event is None:
+        flash('You can only edit your own events.', 'danger')
+        return redirect(url_for('main.index'))
+    return render_template('3d_editor.html', event=event)
+
+@main_bp.route('/event/<int:event_id>/3d/assets', methods=['POST'])
+@login_required
+def upload_event_asset(event_id):
+    session = shard_router.session_for_event(event_id)
+    if scoped(session.query(Event.id), Event, EDIT).filter(Event.id == event_id).first() is None:
+        return jsonify(error='You can only edit your own events.'), 403
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify(error='Choose a model file to upload.'), 400
+    try:
+        asset = store_asset(upload.stream, upload.filename)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(dict(asset.to_dict(), url=asset_url(asset.digest, asset.extension)))
+
+@main_bp.route('/event/<int:event_id>/3d/layout', methods=['POST'])
+@login_required
+def save_event_layout(event_id):
+    session = shard_router.session_for_event(event_id)
+    event = scoped(session.query(Event), Event, EDIT).filter(Event.id == event_id).first()
+    if event is None:
+        return jsonify(error='You can only edit your own events.'), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        layout = save_layout(session, event, data.get('layout'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(layout=layout)
+
+@main_bp.route('/event/<int:event_id>/register', methods=['POST'])
+@login_required
+def register_for_event(event_id):
+    if current_user.role != 'student':
+        return jsonify(error='Only students can register for events.'), 403
+    session = shard_router.session_for_event(event_id)
+    event = scoped(session.query(
+        Event.id, Event.date, Event.registration_required, Event.registration_deadline
+    ), Event).filter(Event.id == event_id).first()
+    if event is None:
+        return jsonify(error='Event not found.'), 404
+    if registration_closed(event):
+        return jsonify(error=MESSAGES[CLOSED]), 409
+    
+    # Accepted immediately; the admission writer decides the outcome in arrival order
+    intent = admission_queue.submit(current_user.id, event_id)
+    if intent is None:
+        response = jsonify(error='Registrations are busy right now. Please try again shortly.')
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    response = jsonify(dict(intent.to_dict(), poll_url=url_for('main.registration_status', intent_id=intent.id)))
+    return response, 202
+
+@main_bp.route('/event/registrations/<intent_id>')
+@login_required
+def registration_status(intent_id):
+    intent = admission_queue.get(intent_id, current_user.id)
+    if intent is None:
+        return jsonify(error='Unknown registration.'), 404
+    wait = min(request.args.get('wait', 0, type=float), 25)
+    if wait > 0:
+        intent = admission_queue.wait(intent, wait)
+    return jsonify(intent.to_dict())
+
 @main_bp.route('/contact')
 def contact():
     return render_template('contact.html', title='Contact Us')
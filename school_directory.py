@@ -0,0 +1,100 @@
+"""
+School directory for partner apps (GET /api/schools).
+
+The payload is built with two kinds of query: one for the schools (loading only
+the requested columns) and IN-batched queries for their primary contacts. The
+encoded JSON is kept in the shared cache (shared_cache.py) under the 'schools'
+namespace, keyed by the requested fields and the caller's policy scope. Any
+committed insert, update or delete of a School or Contact bumps the namespace
+version, and polling clients get a 304 while their ETag is still current. The
+ETag is a hash of the body, so it only changes when the payload does. With the
+default per-process cache backend a bump only reaches the worker that made the
+change, and other workers catch up when their entry's TTL runs out. Multi-worker
+deployments should set CACHE_BACKEND=sqlite.
+"""
+import hashlib
+import json
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session, load_only
+
+from models import School, Contact
+from policy import scoped, scope_key
+from shared_cache import shared_cache
+from sharding import shard_router
+
+SCHOOL_FIELDS = ('id', 'name', 'location', 'about', 'email', 'phone', 'address', 'website', 'logo_url')
+DEFAULT_FIELDS = ('id', 'name', 'location', 'contacts')
+CONTACT_BATCH_SIZE = 500  # stays well under SQLite's bound-parameter limit
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _note_directory_changes(session, flush_context):
+    if any(isinstance(obj, (School, Contact)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['school_directory_changed'] = True
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _invalidate_directory(session):
+    if session.info.pop('school_directory_changed', False):
+        shared_cache.bump('schools')
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_directory_changes(session):
+    session.info.pop('school_directory_changed', None)
+
+
+def parse_fields(raw):
+    """Requested fields from '?fields=a,b'; unknown names are ignored."""
+    if not raw:
+        return DEFAULT_FIELDS
+    requested = [name.strip() for name in raw.split(',')]
+    fields = tuple(name for name in requested if name in SCHOOL_FIELDS or name == 'contacts')
+    if 'id' not in fields:
+        fields = ('id',) + fields
+    return fields
+
+
+def primary_contacts(school_ids):
+    """school id -> list of primary contact dicts, fetched in IN batches."""
+    def load(session):
+        contacts = []
+        for i in range(0, len(school_ids), CONTACT_BATCH_SIZE):
+            contacts += session.query(Contact).filter(
+                Contact.school_id.in_(school_ids[i:i + CONTACT_BATCH_SIZE]),
+                Contact.is_primary.is_(True)
+            ).all()
+        return [(contact.school_id, contact.to_dict()) for contact in contacts]
+
+    by_school = {}
+    for rows in shard_router.fan_out(load, school_ids):
+        for school_id, contact in rows:
+            by_school.setdefault(school_id, []).append(contact)
+    return by_school
+
+
+def build_directory(fields, user):
+    columns = [getattr(School, name) for name in fields if name in SCHOOL_FIELDS]
+    schools = scoped(School.query, School, user=user).options(load_only(*columns)).order_by(School.name).all()
+    contacts = primary_contacts([school.id for school in schools]) if 'contacts' in fields else {}
+
+    payload = []
+    for school in schools:
+        item = {name: getattr(school, name) for name in fields if name in SCHOOL_FIELDS}
+        if 'contacts' in fields:
+            item['contacts'] = contacts.get(school.id, [])
+        payload.append(item)
+    return payload
+
+
+def get_directory(fields, user):
+    """(encoded JSON body, ETag) for the directory as ``user`` may see it."""
+    key = f"directory:{','.join(fields)}:{scope_key(School, user)}"
+
+    def build():
+        body = json.dumps({'schools': build_directory(fields, user)}, separators=(',', ':')).encode('utf-8')
+        # Hash of the payload: workers holding the same directory agree on the
+        # ETag, whichever cache backend (and version counter) they use
+        return body, hashlib.sha1(body).hexdigest()
+    return shared_cache.get_or_set('schools', key, build)
@@ -0,0 +1,183 @@
+"""
+In-memory search index over school names and locations.
+
+Backs the registration typeahead (/auth/schools/search) and the validation of
+RegistrationForm.school_id, so neither has to load every school per request.
+
+Each word of a school's name and location is indexed under all of its prefixes
+(up to MAX_PREFIX characters); every query word must prefix-match some word of
+the school. Queries that match nothing that way fall back to a trigram index,
+which finds substrings such as 'wood' in 'Greenwood High'.
+
+The index is built on first use and then kept up to date incrementally: Session
+listeners collect School inserts, updates and deletes on flush and apply them
+once the transaction commits. Each process keeps its own copy. A copy misses
+schools added by other workers until it is rebuilt: when the shared 'schools'
+version moves on (CACHE_BACKEND=sqlite), or else after MAX_AGE seconds. So that
+RegistrationForm never rejects a real school meanwhile, contains() falls back to
+the database on a miss.
+"""
+import re
+import threading
+import time
+
+from sqlalchemy import event as sa_event, inspect
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import School
+from shared_cache import shared_cache
+
+MAX_PREFIX = 12
+MAX_AGE = 300  # seconds before a copy is rebuilt to pick up other workers' changes
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _words(text):
+    return WORD_RE.findall((text or '').lower())
+
+
+def _trigrams(text):
+    text = f'  {(text or "").lower()} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SchoolIndex:
+    def __init__(self):
+        self._schools = {}    # id -> (name, location)
+        self._prefixes = {}   # prefix -> set of ids
+        self._trigrams = {}   # trigram -> set of ids
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.version = None  # shared 'schools' version the index was loaded at
+        self.loaded_at = 0.0
+
+    def _keys(self, name, location):
+        prefixes = set()
+        for word in _words(name) + _words(location):
+            for i in range(1, min(len(word), MAX_PREFIX) + 1):
+                prefixes.add(word[:i])
+        return prefixes, _trigrams(name) | _trigrams(location)
+
+    def add(self, school_id, name, location):
+        with self._lock:
+            self.remove(school_id)
+            self._schools[school_id] = (name, location)
+            prefixes, trigrams = self._keys(name, location)
+            for key in prefixes:
+                self._prefixes.setdefault(key, set()).add(school_id)
+            for key in trigrams:
+                self._trigrams.setdefault(key, set()).add(school_id)
+
+    def remove(self, school_id):
+        with self._lock:
+            entry = self._schools.pop(school_id, None)
+            if entry is None:
+                return
+            prefixes, trigrams = self._keys(*entry)
+            for index, keys in ((self._prefixes, prefixes), (self._trigrams, trigrams)):
+                for key in keys:
+                    ids = index.get(key)
+                    if ids is not None:
+                        ids.discard(school_id)
+                        if not ids:
+                            del index[key]
+
+    def load(self):
+        with self._lock:
+            self.version = shared_cache.version('schools')
+            self.loaded_at = time.monotonic()
+            self._schools.clear()
+            self._prefixes.clear()
+            self._trigrams.clear()
+            for school_id, name, location in db.session.query(School.id, School.name, School.location):
+                self.add(school_id, name, location)
+            self.loaded = True
+
+    def ensure_loaded(self):
+        if (not self.loaded or time.monotonic() - self.loaded_at > MAX_AGE
+                or (shared_cache.shared and shared_cache.version('schools') != self.version)):
+            self.load()
+
+    def contains(self, school_id):
+        if school_id is None:
+            return False
+        self.ensure_loaded()
+        if school_id in self._schools:
+            return True
+        # Another worker may have added the school since this copy was loaded
+        row = db.session.query(School.id, School.name, School.location).filter(School.id == school_id).first()
+        if row is None:
+            return False
+        self.add(*row)
+        return True
+
+    def _prefix_matches(self, words):
+        candidates = None
+        for word in words:
+            ids = set(self._prefixes.get(word[:MAX_PREFIX], ()))
+            if len(word) > MAX_PREFIX:
+                ids = {i for i in ids if any(w.startswith(word) for w in _words(' '.join(self._schools[i])))}
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return candidates or set()
+
+    def _trigram_matches(self, query):
+        candidates = None
+        # Only the query's inner trigrams: the match may start mid-word
+        for key in {query[i:i + 3] for i in range(len(query) - 2)}:
+            ids = self._trigrams.get(key, set())
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return {i for i in (candidates or ()) if query in ' '.join(self._schools[i]).lower()}
+
+    def search(self, query, limit=10):
+        """[(id, name, location)] best matches first."""
+        self.ensure_loaded()
+        query = (query or '').strip().lower()
+        words = _words(query)
+        if not words:
+            return []
+        with self._lock:
+            ids = self._prefix_matches(words)
+            if not ids and len(query) >= 3:
+                ids = self._trigram_matches(query)
+            results = [(i, *self._schools[i]) for i in ids]
+
+        def rank(result):
+            name = result[1].lower()
+            return (not name.startswith(query), not name.startswith(words[0]), name)
+        return sorted(results, key=rank)[:limit]
+
+
+school_index = SchoolIndex()
+
+
+@sa_event.listens_for(Session, 'after_flush')
+def _collect_school_changes(session, flush_context):
+    changes = session.info.setdefault('school_index_changes', {})
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, School):
+            changes[obj.id] = (obj.name, obj.location)
+    for obj in session.deleted:
+        if isinstance(obj, School):
+            changes[inspect(obj).identity[0]] = None
+
+
+@sa_event.listens_for(Session, 'after_commit')
+def _apply_school_changes(session):
+    changes = session.info.pop('school_index_changes', None)
+    if not changes or not school_index.loaded:
+        return
+    for school_id, entry in changes.items():
+        if entry is None:
+            school_index.remove(school_id)
+        else:
+            school_index.add(school_id, *entry)
+
+
+@sa_event.listens_for(Session, 'after_rollback')
+def _discard_school_changes(session):
+    session.info.pop('school_index_changes', None)
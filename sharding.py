@@ -0,0 +1,162 @@
+"""
+Optional per-school database sharding.
+
+With SHARDING_ENABLED set, each school's events, contacts, registrations and
+rollups live in their own SQLite file (SHARD_DIR/school_<id>.db), so a
+registration rush at one school no longer holds the write lock for everyone
+else. The default database stays the global catalog: users, schools and the
+event directory that hands out event ids and remembers each event's shard.
+
+When sharding is disabled every helper falls back to db.session, so routes use
+the same code in both modes.
+
+Run this module directly to copy an existing single-file database into shards:
+
+    python sharding.py
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g, current_app, abort
+from sqlalchemy import create_engine, select, insert
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import School, Event, Contact, EventRegistration, SchoolMonthlyRollup, EventDirectory
+
+SHARDED_MODELS = (Event, Contact, EventRegistration, SchoolMonthlyRollup)
+
+
+class ShardRouter:
+    def __init__(self, app=None):
+        self._engines = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SHARDING_ENABLED', False)
+        app.config.setdefault('SHARD_DIR', os.path.join(app.instance_path, 'shards'))
+        app.config.setdefault('SHARD_FANOUT_WORKERS', 8)
+        app.extensions['shard_router'] = self
+        app.teardown_appcontext(self._close_sessions)
+
+    @property
+    def enabled(self):
+        return current_app.config['SHARDING_ENABLED']
+
+    def shard_path(self, school_id):
+        return os.path.join(current_app.config['SHARD_DIR'], f'school_{int(school_id)}.db')
+
+    def engine_for(self, school_id):
+        path = self.shard_path(school_id)
+        with self._lock:
+            engine = self._engines.get(path)
+            if engine is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                engine = create_engine(f'sqlite:///{path}')
+                db.metadata.create_all(engine, tables=[m.__table__ for m in SHARDED_MODELS])
+                self._engines[path] = engine
+        return engine
+
+    def session_for(self, school_id):
+        """Session holding ``school_id``'s events, contacts and registrations."""
+        if not self.enabled:
+            return db.session
+        sessions = g.setdefault('_shard_sessions', {})
+        if school_id not in sessions:
+            sessions[school_id] = Session(self.engine_for(school_id))
+        return sessions[school_id]
+
+    def _close_sessions(self, exc):
+        for session in g.pop('_shard_sessions', {}).values():
+            session.close()
+
+    def allocate_event_id(self, school_id):
+        """Reserve a globally unique event id in the catalog (None when unsharded)."""
+        if not self.enabled:
+            return None
+        entry = EventDirectory(school_id=school_id)
+        db.session.add(entry)
+        db.session.commit()
+        return entry.id
+
+    def session_for_event(self, event_id):
+        if not self.enabled:
+            return db.session
+        entry = db.session.get(EventDirectory, event_id)
+        if entry is None:
+            abort(404)
+        return self.session_for(entry.school_id)
+
+    def forget_event(self, event_id):
+        if self.enabled:
+            EventDirectory.query.filter_by(id=event_id).delete()
+            db.session.commit()
+
+    def fan_out(self, fn, school_ids=None):
+        """
+        Call ``fn(session)`` against every shard in parallel and return the list
+        of results for the caller to merge. Each worker gets its own short-lived
+        session, so returned ORM objects are detached: load what you need inside
+        ``fn``. Unsharded, ``fn`` runs once against db.session.
+        """
+        if not self.enabled:
+            return [fn(db.session)]
+        if school_ids is None:
+            school_ids = [school_id for (school_id,) in db.session.query(School.id)]
+        engines = [self.engine_for(school_id) for school_id in school_ids
+                   if os.path.exists(self.shard_path(school_id))]
+        if not engines:
+            return []
+
+        def run(engine):
+            with Session(engine, expire_on_commit=False) as session:
+                return fn(session)
+
+        workers = min(current_app.config['SHARD_FANOUT_WORKERS'], len(engines))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(run, engines))
+
+
+shard_router = ShardRouter()
+
+
+def migrate_to_shards():
+    """Copy every school's rows from the single database into its shard."""
+    tables = [m.__table__ for m in SHARDED_MODELS]
+    for school_id in [school_id for (school_id,) in db.session.query(School.id)]:
+        event_ids = select(Event.id).where(Event.school_id == school_id)
+        sources = {
+            Event.__table__: select(Event.__table__).where(Event.school_id == school_id),
+            Contact.__table__: select(Contact.__table__).where(Contact.school_id == school_id),
+            EventRegistration.__table__: select(EventRegistration.__table__).where(
+                EventRegistration.event_id.in_(event_ids)),
+            SchoolMonthlyRollup.__table__: select(SchoolMonthlyRollup.__table__).where(
+                SchoolMonthlyRollup.school_id == school_id),
+        }
+        with shard_router.engine_for(school_id).begin() as shard:
+            for table in tables:
+                rows = [dict(row._mapping) for row in db.session.execute(sources[table])]
+                if rows:
+                    shard.execute(insert(table).prefix_with('OR REPLACE'), rows)
+
+        known = {entry_id for (entry_id,) in db.session.query(EventDirectory.id).filter(
+            EventDirectory.id.in_(event_ids))}
+        for (event_id,) in db.session.execute(event_ids):
+            if event_id not in known:
+                db.session.add(EventDirectory(id=event_id, school_id=school_id))
+        db.session.commit()
+        print(f"Migrated school {school_id}")
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    app.config['SHARDING_ENABLED'] = True
+    with app.app_context():
+        db.create_all()
+        migrate_to_shards()
+        print("✅ Shards populated")
@@ -0,0 +1,245 @@
+"""
+Cache tier shared by all worker processes on a host.
+
+Without it every worker builds its own copy of the school lists, the index page
+counts and the rendered event cards, so memory is multiplied by the worker
+count and each worker misses on its own. CACHE_BACKEND picks the store:
+
+* 'memory': a dict in the process (the default; right for a single worker);
+* 'sqlite': a small shared database file (CACHE_DB) in WAL mode, which every
+  worker on the host reads and writes.
+
+Keys are versioned by namespace. ``get_or_set('events', key, compute)`` stores
+the value under the current version of 'events', and ``bump('events')``, called
+from the event write paths in routes/main.py, moves every worker to fresh keys
+at once. Entries under the old version are never read again and expire on
+their TTL.
+
+Stampede protection: an entry past its TTL is kept for CACHE_STALE_SECONDS.
+The first worker to find it expired takes a short lock (an atomic insert) and
+recomputes it. Other workers keep serving the stale value meanwhile, or, if
+there is none, wait briefly for the new one instead of querying in parallel.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+VERSION_PREFIX = 'version:'
+LOCK_PREFIX = 'lock:'
+
+
+class MemoryCache:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.time():
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._prune()
+            self._entries[key] = (value, time.time() + ttl)
+
+    def add(self, key, value, ttl):
+        """Set ``key`` only if it is absent or expired; returns whether it was set."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= time.time():
+                return False
+            self._entries[key] = (value, time.time() + ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = (self._entries.get(key, (0, None))[0] or 0) + 1
+            self._entries[key] = (value, float('inf'))
+            return value
+
+    def _prune(self):
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self._entries.items() if expires_at < now]:
+            del self._entries[key]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    def __init__(self, path, prune_every=500):
+        self.path = path
+        self.prune_every = prune_every
+        self._writes = 0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # a cache may lose its last writes on power loss
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at >= ?", (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+
+    def add(self, key, value, ttl):
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE cache.expires_at < ?",
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key):
+        # Stored as a plain integer so the upsert can add to it
+        row = self._connect().execute(
+            "INSERT INTO cache (key, value, expires_at) VALUES (?, 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = cache.value + 1 RETURNING value",
+            (key, float('inf'))
+        ).fetchone()
+        return row[0]
+
+    def version(self, key):
+        row = self._connect().execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class SharedCache:
+    def __init__(self, app=None):
+        self.backend = MemoryCache()
+        self.default_ttl = 300
+        self.stale_seconds = 60
+        self.lock_timeout = 10
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_DB', os.path.join(app.instance_path, 'shared_cache.db'))
+        app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+        app.config.setdefault('CACHE_STALE_SECONDS', 60)
+        app.config.setdefault('CACHE_LOCK_TIMEOUT', 10)
+        if app.config['CACHE_BACKEND'] == 'sqlite':
+            os.makedirs(os.path.dirname(app.config['CACHE_DB']), exist_ok=True)
+            self.backend = SQLiteCache(app.config['CACHE_DB'])
+        else:
+            self.backend = MemoryCache()
+        self.default_ttl = app.config['CACHE_DEFAULT_TTL']
+        self.stale_seconds = app.config['CACHE_STALE_SECONDS']
+        self.lock_timeout = app.config['CACHE_LOCK_TIMEOUT']
+        app.extensions['shared_cache'] = self
+
+    @property
+    def shared(self):
+        return not isinstance(self.backend, MemoryCache)
+
+    def version(self, namespace):
+        key = VERSION_PREFIX + namespace
+        if isinstance(self.backend, SQLiteCache):
+            return self.backend.version(key)
+        return self.backend.get(key) or 0
+
+    def bump(self, namespace):
+        """Invalidate every entry of ``namespace`` in all workers."""
+        return self.backend.incr(VERSION_PREFIX + namespace)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl or self.default_ttl)
+
+    def get_or_set(self, namespace, key, compute, ttl=None):
+        """
+        Cached ``compute()`` for ``key`` under the current version of
+        ``namespace``, recomputed by one worker at a time.
+        """
+        ttl = ttl or self.default_ttl
+        full_key = f'{namespace}:{self.version(namespace)}:{key}'
+        entry = self.backend.get(full_key)  # (fresh until, value)
+        now = time.time()
+        if entry is not None and entry[0] >= now:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+
+        lock_key = LOCK_PREFIX + full_key
+        if not self.backend.add(lock_key, True, self.lock_timeout):
+            if entry is not None:
+                # Someone else is recomputing; the stale value will do until then
+                return entry[1]
+            deadline = now + self.lock_timeout
+            while time.time() < deadline:
+                time.sleep(0.05)
+                entry = self.backend.get(full_key)
+                if entry is not None:
+                    return entry[1]
+            # The holder died or is too slow. Compute for this request only: the
+            # lock is not ours to release, and the holder will store its own value
+            return compute()
+
+        try:
+            value = compute()
+            self.backend.set(full_key, (time.time() + ttl, value), ttl + self.stale_seconds)
+            return value
+        finally:
+            self.backend.delete(lock_key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'sqlite' if isinstance(self.backend, SQLiteCache) else 'memory',
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+shared_cache = SharedCache()
@@ -0,0 +1,138 @@
+"""
+Template caching.
+
+* A persistent Jinja bytecode cache in the instance folder, so new workers load
+  compiled templates instead of parsing and compiling them again.
+* A ``{% cache %}`` tag for fragments that are expensive to render and only
+  change when their model does, such as event cards:
+
+      {% cache 'school-card', event.id, event.updated_at %}
+          ... markup ...
+      {% endcache %}
+
+  The key is built from the tag arguments, so include everything the fragment
+  depends on (and keep per-user markup such as edit buttons outside the block).
+  Fragments are kept in a per-process LRU bounded by total size and entry count.
+  With a shared CACHE_BACKEND (see shared_cache.py) the LRU is backed by the
+  shared cache, so a card rendered by one worker is reused by the others.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes, FileSystemBytecodeCache
+from jinja2.ext import Extension
+
+from shared_cache import shared_cache
+
+FRAGMENT_PREFIX = 'fragment:'
+
+
+class FragmentCache:
+    def __init__(self, max_bytes=4 * 1024 * 1024, max_entries=10000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += size
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class LazyBytecodeCache(FileSystemBytecodeCache):
+    """Creates its directory on the first write rather than when the app is built."""
+
+    def dump_bytecode(self, bucket):
+        os.makedirs(self.directory, exist_ok=True)
+        super().dump_bytecode(bucket)
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [nodes.List(parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        key = '|'.join(str(part) for part in parts)
+        cache = self.environment.fragment_cache
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if shared_cache.shared:
+            value = shared_cache.get(FRAGMENT_PREFIX + key)
+        if value is None:
+            value = caller()
+            if shared_cache.shared:
+                shared_cache.set(FRAGMENT_PREFIX + key, value)
+        cache.set(key, value)
+        return value
+
+
+def init_app(app):
+    app.config.setdefault('JINJA_BYTECODE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+    app.config.setdefault('FRAGMENT_CACHE_MAX_BYTES', 4 * 1024 * 1024)
+    app.config.setdefault('FRAGMENT_CACHE_MAX_ENTRIES', 10000)
+
+    app.jinja_env.bytecode_cache = LazyBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = FragmentCache(
+        app.config['FRAGMENT_CACHE_MAX_BYTES'],
+        app.config['FRAGMENT_CACHE_MAX_ENTRIES']
+    )
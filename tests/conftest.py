@@ -0,0 +1,59 @@
+"""
+Shared fixtures: the application on throwaway databases.
+
+Every test gets a fresh create_app() whose databases, shards and caches live in
+pytest's tmp_path, so nothing touches instance/.
+"""
+import pytest
+
+from app import create_app
+from extensions import db
+from models import User
+
+
+def app_config(tmp_path, **overrides):
+    config = {
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SHARDING_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'main.db'}",
+        'SQLALCHEMY_BINDS': {'archive': f"sqlite:///{tmp_path / 'archive.db'}"},
+        'SHARD_DIR': str(tmp_path / 'shards'),
+        'ASSET_DIR': str(tmp_path / 'assets'),
+        'RECONCILIATION_DIR': str(tmp_path / 'reconciliation'),
+        'JINJA_BYTECODE_CACHE_DIR': str(tmp_path / 'jinja_cache'),
+        'ADMISSION_DB': str(tmp_path / 'admission.db'),
+    }
+    config.update(overrides)
+    return config
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """create_app() on tmp_path with config overrides; tables are created."""
+    def make(**overrides):
+        app = create_app(app_config(tmp_path, **overrides))
+        with app.app_context():
+            db.create_all()
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_user(app, username, role='student', password='password123', school_id=None):
+    with app.app_context():
+        user = User(username=username, email=f'{username}@example.com', name=username.title(),
+                    role=role, school_id=school_id, is_active=True)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
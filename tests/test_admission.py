@@ -0,0 +1,140 @@
+from datetime import date, datetime, timedelta
+
+from admission import AdmissionQueue, admission_queue, Intent, CONFIRMED, DUPLICATE, PENDING, CLOSED
+from conftest import add_user
+from extensions import db
+from models import School, Event, EventRegistration, SchoolMonthlyRollup
+
+
+def _add_event(app, teacher_id, school_id, capacity=None, **fields):
+    fields = dict({'date': date.today() + timedelta(days=30), 'registration_required': True}, **fields)
+    with app.app_context():
+        event = Event(title='Science Fair', school_id=school_id, created_by=teacher_id, capacity=capacity,
+                      **fields)
+        db.session.add(event)
+        db.session.commit()
+        return event.id
+
+
+def _setup(app):
+    with app.app_context():
+        school = School(name='North High', location='North')
+        db.session.add(school)
+        db.session.commit()
+        school_id = school.id
+    teacher_id = add_user(app, 'teacher', role='teacher', school_id=school_id)
+    add_user(app, 'alice')
+    return school_id, _add_event(app, teacher_id, school_id)
+
+
+def _login(app, username):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': username, 'password': 'password123'})
+    return client
+
+
+def _register(client, event_id):
+    response = client.post(f'/event/{event_id}/register')
+    assert response.status_code == 202
+    return client.get(response.get_json()['poll_url'] + '?wait=5').get_json()
+
+
+def test_intents_are_visible_to_every_worker(app):
+    _, event_id = _setup(app)
+    client = _login(app, 'alice')
+
+    outcome = _register(client, event_id)
+    assert outcome['status'] == CONFIRMED
+
+    # Another worker process: its own queue object on the same store
+    other = AdmissionQueue()
+    other.init_app(app)
+    with app.app_context():
+        alice_id = EventRegistration.query.one().user_id
+    intent = other.get(outcome['id'], alice_id)
+    assert intent is not None and intent.status == CONFIRMED
+    assert intent.registration_id == outcome['registration_id']
+    assert other.get(outcome['id'], alice_id + 1) is None
+
+
+def test_second_registration_is_a_duplicate(app):
+    _, event_id = _setup(app)
+    client = _login(app, 'alice')
+
+    assert _register(client, event_id)['status'] == CONFIRMED
+    assert _register(client, event_id)['status'] == DUPLICATE
+    with app.app_context():
+        assert EventRegistration.query.count() == 1
+
+
+def test_cancelled_registration_is_reactivated(app):
+    _, event_id = _setup(app)
+    client = _login(app, 'alice')
+
+    first = _register(client, event_id)
+    with app.app_context():
+        db.session.get(EventRegistration, first['registration_id']).status = 'cancelled'
+        db.session.commit()
+    second = _register(client, event_id)
+    assert second['status'] == CONFIRMED
+    assert second['registration_id'] == first['registration_id']
+
+
+def test_deleting_an_event_deletes_its_registrations(app):
+    school_id, event_id = _setup(app)
+    assert _register(_login(app, 'alice'), event_id)['status'] == CONFIRMED
+
+    response = _login(app, 'teacher').post(f'/event/delete/{event_id}')
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Event, event_id) is None
+        assert EventRegistration.query.count() == 0
+        # Subtracted once, not once per registration and again for the event
+        rollup = SchoolMonthlyRollup.query.filter_by(school_id=school_id).one()
+        assert rollup.registrations == 0
+
+
+def test_closed_events_are_refused_before_queueing(app):
+    school_id, _ = _setup(app)
+    with app.app_context():
+        teacher_id = Event.query.one().created_by
+    closed = [
+        _add_event(app, teacher_id, school_id, registration_required=False),
+        _add_event(app, teacher_id, school_id, date=date.today() - timedelta(days=1)),
+        _add_event(app, teacher_id, school_id, registration_deadline=date.today() - timedelta(days=1)),
+    ]
+    client = _login(app, 'alice')
+
+    for event_id in closed:
+        assert client.post(f'/event/{event_id}/register').status_code == 409
+
+
+def test_event_closed_after_submission_is_answered_closed(app):
+    _, event_id = _setup(app)
+    bob_id = add_user(app, 'bob')
+    with app.app_context():
+        db.session.get(Event, event_id).date = date.today() - timedelta(days=1)
+        db.session.commit()
+        intent = Intent('intent', bob_id, event_id)
+        admission_queue.apply([intent])
+    assert intent.status == CLOSED
+
+
+def test_unpaid_hold_expires_and_frees_its_seat(app):
+    school_id, _ = _setup(app)
+    with app.app_context():
+        teacher_id = Event.query.one().created_by
+    event_id = _add_event(app, teacher_id, school_id, capacity=1, price=10.0)
+    bob_id = add_user(app, 'bob')
+    with app.app_context():
+        stale = EventRegistration(user_id=bob_id, event_id=event_id, status='pending', payment_status='unpaid',
+                                  payment_amount=10.0, registration_date=datetime.utcnow() - timedelta(days=3))
+        db.session.add(stale)
+        db.session.commit()
+        stale_id = stale.id
+
+    assert _register(_login(app, 'alice'), event_id)['status'] == PENDING
+    with app.app_context():
+        assert db.session.get(EventRegistration, stale_id).status == 'cancelled'
+        rollup = SchoolMonthlyRollup.query.filter_by(school_id=school_id).one()
+        assert (rollup.registrations, rollup.cancelled) == (2, 1)
@@ -0,0 +1,57 @@
+import re
+from datetime import date, timedelta
+
+from archive import past_events
+from conftest import add_user
+from extensions import db
+from models import School, Event, ArchivedEvent
+
+
+def _setup(app, hot=3, cold=4):
+    with app.app_context():
+        school = School(name='North High', location='North')
+        db.session.add(school)
+        db.session.commit()
+        school_id = school.id
+    teacher_id = add_user(app, 'teacher', role='teacher', school_id=school_id)
+    today = date.today()
+    with app.app_context():
+        # Hot events finished 1..hot days ago, archived ones further back
+        db.session.add_all([Event(title=f'Hot {n}', date=today - timedelta(days=n), school_id=school_id,
+                                  created_by=teacher_id) for n in range(1, hot + 1)])
+        db.session.add(Event(title='Future 1', date=today + timedelta(days=1), school_id=school_id,
+                             created_by=teacher_id))
+        db.session.add_all([ArchivedEvent(id=100 + n, title=f'Cold {n}', date=today - timedelta(days=100 + n),
+                                          school_id=school_id, created_by=teacher_id) for n in range(1, cold + 1)])
+        db.session.commit()
+    return school_id
+
+
+def test_pages_run_from_hot_events_into_the_archive(app):
+    school_id = _setup(app)
+    expected = ['Hot 1', 'Hot 2', 'Hot 3', 'Cold 1', 'Cold 2', 'Cold 3', 'Cold 4']
+    with app.app_context():
+        for limit in (1, 2, 3, 4, 7, 10):
+            titles, offset, has_more = [], 0, True
+            while has_more:
+                events, has_more = past_events(school_id, limit, offset)
+                assert len(events) <= limit
+                titles += [event.title for event in events]
+                offset += limit
+            assert titles == expected
+        assert past_events(school_id, 2, 20) == ([], False)
+
+
+def test_past_view_is_paginated(app, client, monkeypatch):
+    monkeypatch.setattr('routes.main.PAST_EVENTS_PER_PAGE', 3)
+    school_id = _setup(app)
+    add_user(app, 'alice')
+    client.post('/auth/login', data={'username': 'alice', 'password': 'password123'})
+
+    def page(query=''):
+        html = client.get(f'/school/{school_id}/past{query}').get_data(as_text=True)
+        return re.findall(r'(?:Hot|Cold|Future) \d', html), set(re.findall(r'past\?page=(\d+)', html))
+
+    assert page() == (['Hot 1', 'Hot 2', 'Hot 3'], {'2'})
+    assert page('?page=2') == (['Cold 1', 'Cold 2', 'Cold 3'], {'1', '3'})
+    assert page('?page=3') == (['Cold 4'], {'2'})
@@ -0,0 +1,35 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgi import PooledWsgiToAsgi
+
+
+def _call(application, path='/'):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': [],
+             'http_version': '1.1', 'server': ('localhost', 80), 'client': ('127.0.0.1', 1234)}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return messages
+
+
+def test_wsgi_app_runs_on_the_pool():
+    def wsgi_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', '5')])
+        # More than the declared length: the excess is not sent
+        return [threading.current_thread().name.encode()[:4], b'-extra']
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='pool') as executor:
+        messages = _call(PooledWsgiToAsgi(wsgi_app, executor))
+
+    assert messages[0]['type'] == 'http.response.start' and messages[0]['status'] == 200
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    assert body == b'pool-'
+    assert messages[-1] == {'type': 'http.response.body'}
@@ -0,0 +1,114 @@
+import io
+import os
+from datetime import date
+
+import pytest
+
+from assets import (store_asset, save_layout, release_refs, collect_garbage, recount, asset_path, load_layout,
+                    layout_refs)
+from conftest import add_user
+from extensions import db
+from models import School, Event, ArchivedEvent, ModelAsset
+
+
+@pytest.fixture
+def event_id(app):
+    with app.app_context():
+        school = School(name='North High', location='North')
+        db.session.add(school)
+        db.session.commit()
+        school_id = school.id
+    teacher_id = add_user(app, 'teacher', role='teacher', school_id=school_id)
+    with app.app_context():
+        event = Event(title='Gala', date=date(2026, 12, 1), school_id=school_id, created_by=teacher_id)
+        db.session.add(event)
+        db.session.commit()
+        return event.id
+
+
+def _store(data, name='stage.glb'):
+    return store_asset(io.BytesIO(data), name).digest
+
+
+def _refs():
+    return {asset.digest: asset.ref_count for asset in ModelAsset.query}
+
+
+def _layout(*digests):
+    return [{'type': 'model', 'asset': digest} for digest in digests]
+
+
+def test_identical_uploads_are_stored_once(app):
+    with app.app_context():
+        assert _store(b'stage', 'a.glb') == _store(b'stage', 'b.glb')
+        assert ModelAsset.query.count() == 1
+        with pytest.raises(ValueError):
+            _store(b'stage', 'stage.exe')
+
+
+def test_saving_layouts_moves_references(app, event_id):
+    with app.app_context():
+        stage, chair, booth = _store(b'stage'), _store(b'chair'), _store(b'booth')
+        event = db.session.get(Event, event_id)
+
+        save_layout(db.session, event, _layout(stage, chair))
+        assert _refs() == {stage: 1, chair: 1, booth: 0}
+        save_layout(db.session, event, _layout(chair, booth))
+        assert _refs() == {stage: 0, chair: 1, booth: 1}
+        assert layout_refs(load_layout(db.session.get(Event, event_id).layout_3d)) == {chair, booth}
+
+
+def test_layout_with_an_unknown_asset_is_refused_without_taking_references(app, event_id):
+    with app.app_context():
+        stage = _store(b'stage')
+        event = db.session.get(Event, event_id)
+        with pytest.raises(ValueError):
+            save_layout(db.session, event, _layout(stage, 'f' * 64))
+        assert _refs() == {stage: 0}
+        assert db.session.get(Event, event_id).layout_3d is None
+
+
+def test_gc_deletes_only_unreferenced_assets(app, event_id):
+    with app.app_context():
+        stage, chair = _store(b'stage'), _store(b'chair')
+        save_layout(db.session, db.session.get(Event, event_id), _layout(stage))
+
+        # Within the grace period even the unreferenced upload stays
+        assert collect_garbage() == 0
+        assert collect_garbage(grace_hours=0) == 1
+        assert set(_refs()) == {stage}
+        assert os.path.exists(asset_path(stage, '.glb'))
+        assert not os.path.exists(asset_path(chair, '.glb'))
+
+        release_refs({stage})
+        assert collect_garbage(grace_hours=0) == 1
+        assert ModelAsset.query.count() == 0
+        assert not os.path.exists(asset_path(stage, '.glb'))
+
+
+def test_recount_counts_hot_and_archived_layouts(app, event_id):
+    with app.app_context():
+        stage, chair = _store(b'stage'), _store(b'chair')
+        event = db.session.get(Event, event_id)
+        save_layout(db.session, event, _layout(stage))
+        db.session.add(ArchivedEvent(id=100, title='Old Gala', date=date(2025, 12, 1), school_id=event.school_id,
+                                     created_by=event.created_by, layout_3d=f'[{{"asset": "{stage}"}}]'))
+        ModelAsset.query.update({'ref_count': 5})
+        db.session.commit()
+
+        assert recount() == 1
+        assert _refs() == {stage: 2, chair: 0}
+        # The archived layout keeps the asset alive
+        assert collect_garbage(grace_hours=0) == 1
+        assert set(_refs()) == {stage}
+
+
+def test_inline_models_are_extracted_into_the_store(app, event_id):
+    with app.app_context():
+        event = db.session.get(Event, event_id)
+        layout = save_layout(db.session, event, [{'type': 'model', 'name': 'stage', 'model': {'asset': 'gltf'}}])
+
+        digest = layout[0]['asset']
+        assert 'model' not in layout[0] and layout[0]['format'] == 'gltf'
+        assert _refs() == {digest: 1}
+        assert os.path.exists(asset_path(digest, '.gltf'))
@@ -0,0 +1,31 @@
+from datetime import date
+
+from conftest import add_user
+from extensions import db
+from models import School, Event
+
+
+def test_malformed_layout_is_listed_as_empty(app, client):
+    with app.app_context():
+        school = School(name='North High', location='North')
+        db.session.add(school)
+        db.session.commit()
+        school_id = school.id
+    teacher_id = add_user(app, 'teacher', role='teacher', school_id=school_id)
+    with app.app_context():
+        db.session.add_all([
+            Event(title='Broken', date=date(2026, 12, 1), school_id=school_id, created_by=teacher_id,
+                  layout_3d='{not json'),
+            Event(title='Object', date=date(2026, 12, 2), school_id=school_id, created_by=teacher_id,
+                  layout_3d='{"asset": "abc"}'),
+            Event(title='Valid', date=date(2026, 12, 3), school_id=school_id, created_by=teacher_id,
+                  layout_3d='[{"type": "booth"}]'),
+        ])
+        db.session.commit()
+
+    token = client.post('/api/auth/token', json={'username': 'teacher', 'password': 'password123'})
+    response = client.get('/api/events?fields=title,layout_3d',
+                          headers={'Authorization': f"Bearer {token.get_json()['access_token']}"})
+    assert response.status_code == 200
+    layouts = {event['title']: event['layout_3d'] for event in response.get_json()['events']}
+    assert layouts == {'Broken': [], 'Object': [], 'Valid': [{'type': 'booth'}]}
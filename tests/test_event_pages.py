@@ -0,0 +1,31 @@
+import os
+
+from conftest import add_user
+from extensions import db
+from models import School, EventDirectory
+
+
+def test_3d_viewer_is_404_for_a_missing_sharded_event(make_app):
+    app = make_app(SHARDING_ENABLED=True)
+    with app.app_context():
+        school = School(name='North High', location='North')
+        db.session.add(school)
+        db.session.commit()
+        # In the catalog, but gone from the shard (e.g. deleted mid-request)
+        entry = EventDirectory(school_id=school.id)
+        db.session.add(entry)
+        db.session.commit()
+        event_id = entry.id
+    add_user(app, 'alice')
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'alice', 'password': 'password123'})
+
+    assert client.get(f'/event/{event_id}/3d').status_code == 404
+
+
+def test_bytecode_cache_dir_is_created_on_first_render(app, client):
+    cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    assert not os.path.exists(cache_dir)
+
+    assert client.get('/auth/login').status_code == 200
+    assert os.listdir(cache_dir)
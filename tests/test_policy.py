@@ -0,0 +1,129 @@
+from datetime import date
+
+import pytest
+
+from conftest import add_user
+from extensions import db
+from models import School, Event, EventRegistration
+from policy import scoped, scope_key, VIEW, CREATE, EDIT, DELETE
+from tokens import TokenPrincipal
+
+
+class Anonymous:
+    is_authenticated = False
+
+
+def _principal(user_id, role, school_id=None):
+    return TokenPrincipal({'uid': user_id, 'role': role, 'sid': school_id, 'jti': 'test', 'exp': 0})
+
+
+@pytest.fixture
+def world(app):
+    """Two schools, a teacher in each, two events per school and a registration on each event."""
+    with app.app_context():
+        schools = [School(name='North High', location='North'), School(name='South High', location='South')]
+        db.session.add_all(schools)
+        db.session.commit()
+        north, south = (school.id for school in schools)
+    ids = {
+        'north': north, 'south': south,
+        'admin': add_user(app, 'admin', role='admin'),
+        'teacher': add_user(app, 'teacher', role='teacher', school_id=north),
+        'colleague': add_user(app, 'colleague', role='teacher', school_id=north),
+        'rival': add_user(app, 'rival', role='teacher', school_id=south),
+        'alice': add_user(app, 'alice'),
+        'bob': add_user(app, 'bob'),
+    }
+    with app.app_context():
+        events = {
+            'own': Event(title='Own', date=date(2026, 12, 1), school_id=north, created_by=ids['teacher']),
+            'colleagues': Event(title='Colleagues', date=date(2026, 12, 2), school_id=north,
+                                created_by=ids['colleague']),
+            'south': Event(title='South', date=date(2026, 12, 3), school_id=south, created_by=ids['rival']),
+        }
+        db.session.add_all(events.values())
+        db.session.commit()
+        db.session.add_all([
+            EventRegistration(user_id=ids['alice'], event_id=events['own'].id),
+            EventRegistration(user_id=ids['bob'], event_id=events['colleagues'].id),
+            EventRegistration(user_id=ids['alice'], event_id=events['south'].id),
+        ])
+        db.session.commit()
+    return ids
+
+
+def _titles(model, user, action=VIEW):
+    if model is EventRegistration:
+        rows = scoped(db.session.query(EventRegistration), EventRegistration, action, user).all()
+        return sorted((row.event.title, row.user.username) for row in rows)
+    column = School.name if model is School else Event.title
+    return sorted(title for (title,) in scoped(db.session.query(column), model, action, user))
+
+
+def test_admin_sees_and_changes_everything(app, world):
+    admin = _principal(world['admin'], 'admin')
+    with app.app_context():
+        for action in (VIEW, CREATE, EDIT, DELETE):
+            assert _titles(Event, admin, action) == ['Colleagues', 'Own', 'South']
+            assert scope_key(Event, admin, action) == 'all'
+        assert len(_titles(EventRegistration, admin)) == 3
+        assert scope_key(EventRegistration, admin) == 'all'
+
+
+def test_teacher_is_limited_to_their_school(app, world):
+    teacher = _principal(world['teacher'], 'teacher', world['north'])
+    with app.app_context():
+        assert _titles(School, teacher) == ['North High']
+        assert _titles(School, teacher, CREATE) == ['North High']
+        assert _titles(Event, teacher) == ['Colleagues', 'Own']
+        assert _titles(Event, teacher, EDIT) == ['Own']
+        assert _titles(Event, teacher, DELETE) == ['Own']
+        # Every registration for their school's events, whoever made the event
+        assert _titles(EventRegistration, teacher) == [('Colleagues', 'bob'), ('Own', 'alice')]
+
+    north = f"school:{world['north']}"
+    assert scope_key(School, teacher) == north
+    assert scope_key(Event, teacher) == north
+    assert scope_key(Event, teacher, EDIT) == f"{north}:user:{world['teacher']}"
+    assert scope_key(EventRegistration, teacher) == north
+
+
+def test_teachers_of_one_school_share_cache_keys_only_where_they_see_the_same_rows(app, world):
+    teacher = _principal(world['teacher'], 'teacher', world['north'])
+    colleague = _principal(world['colleague'], 'teacher', world['north'])
+    rival = _principal(world['rival'], 'teacher', world['south'])
+    with app.app_context():
+        for model, action in ((Event, VIEW), (EventRegistration, VIEW), (Event, EDIT)):
+            same_rows = _titles(model, teacher, action) == _titles(model, colleague, action)
+            assert same_rows == (scope_key(model, teacher, action) == scope_key(model, colleague, action))
+            assert scope_key(model, teacher, action) != scope_key(model, rival, action)
+
+
+def test_teacher_without_a_school_sees_nothing(app, world):
+    teacher = _principal(world['teacher'], 'teacher')
+    with app.app_context():
+        assert _titles(School, teacher) == []
+        assert _titles(Event, teacher) == []
+    assert scope_key(School, teacher) == 'none'
+    assert scope_key(Event, teacher) == 'none'
+
+
+def test_student_views_every_school_but_only_their_registrations(app, world):
+    alice = _principal(world['alice'], 'student')
+    with app.app_context():
+        assert _titles(School, alice) == ['North High', 'South High']
+        assert _titles(Event, alice) == ['Colleagues', 'Own', 'South']
+        for action in (CREATE, EDIT, DELETE):
+            assert _titles(Event, alice, action) == []
+            assert scope_key(Event, alice, action) == 'none'
+        assert _titles(EventRegistration, alice) == [('Own', 'alice'), ('South', 'alice')]
+        assert _titles(EventRegistration, alice, EDIT) == [('Own', 'alice'), ('South', 'alice')]
+    assert scope_key(Event, alice) == 'all'
+    assert scope_key(EventRegistration, alice) == f"user:{world['alice']}"
+
+
+def test_anonymous_sees_nothing(app, world):
+    with app.app_context():
+        for model in (School, Event, EventRegistration):
+            assert _titles(model, Anonymous()) == []
+            assert scope_key(model, Anonymous()) == 'none'
@@ -0,0 +1,28 @@
+"""Per-route SQL query budgets; see query_budget.py for the dataset and BUDGETS."""
+import pytest
+
+from query_budget import BUDGETS, SCENARIOS, BudgetRun, explain, load_snapshot, summary, verdict
+
+BUDGETED_BLUEPRINTS = ('main', 'auth')
+
+
+@pytest.fixture(scope='module')
+def budget_run(tmp_path_factory):
+    # One seeded database for the module; scenarios run in SCENARIOS order
+    return BudgetRun(str(tmp_path_factory.mktemp('query_budget')))
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS, ids=lambda scenario: scenario.label)
+def test_route_within_budget(budget_run, scenario):
+    measurement = budget_run.measure(scenario)
+    status = verdict(measurement)
+    assert status == 'ok', '\n'.join(
+        [summary(measurement, status)] + explain(measurement, load_snapshot().get(measurement.label)))
+
+
+def test_every_route_has_a_budget(budget_run):
+    endpoints = {rule.endpoint for rule in budget_run.app.url_map.iter_rules()
+                 if rule.endpoint.split('.')[0] in BUDGETED_BLUEPRINTS}
+    budgeted = {scenario.endpoint for scenario in SCENARIOS}
+    assert endpoints - budgeted == set()
+    assert {scenario.label for scenario in SCENARIOS} == set(BUDGETS)
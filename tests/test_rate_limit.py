@@ -0,0 +1,55 @@
+from conftest import add_user
+
+LIMITS = {'login': {'ip': (100, 60), 'account': (3, 300)}}
+
+
+def _token(client, username, password='wrong-password', **kwargs):
+    return client.post('/api/auth/token', json={'username': username, 'password': password}, **kwargs)
+
+
+def test_api_token_is_limited_per_username(make_app):
+    app = make_app(RATE_LIMITS=LIMITS)
+    add_user(app, 'alice')
+    client = app.test_client()
+
+    for _ in range(3):
+        assert _token(client, 'alice').status_code == 401
+    response = _token(client, 'Alice ')
+    assert response.status_code == 429
+    assert response.get_json()['error'] == 'rate_limited'
+    assert int(response.headers['Retry-After']) > 0
+
+    # Rejected before the password is checked, even when it is right
+    assert _token(client, 'alice', 'password123').status_code == 429
+    # Other accounts still have their own budget
+    assert _token(client, 'bob').status_code == 401
+
+
+def test_api_token_shares_login_buckets_with_web_login(make_app):
+    app = make_app(RATE_LIMITS=LIMITS)
+    add_user(app, 'alice')
+    client = app.test_client()
+
+    for _ in range(3):
+        response = client.post('/auth/login', data={'username': 'alice', 'password': 'wrong-password'})
+        assert response.status_code != 429
+    assert _token(client, 'alice').status_code == 429
+
+
+def test_api_token_is_limited_per_ip(make_app):
+    app = make_app(RATE_LIMITS={'login': {'ip': (2, 60), 'account': (100, 60)}})
+    client = app.test_client()
+
+    assert _token(client, 'user1').status_code == 401
+    assert _token(client, 'user2').status_code == 401
+    assert _token(client, 'user3').status_code == 429
+    other = _token(client, 'user4', environ_base={'REMOTE_ADDR': '10.0.0.9'})
+    assert other.status_code == 401
+
+
+def test_api_token_still_issues_tokens(make_app):
+    app = make_app(RATE_LIMITS=LIMITS)
+    add_user(app, 'alice')
+    response = _token(app.test_client(), 'alice', 'password123')
+    assert response.status_code == 200
+    assert response.get_json()['token_type'] == 'Bearer'
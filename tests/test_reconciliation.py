@@ -0,0 +1,78 @@
+import csv
+import io
+from datetime import date
+
+from werkzeug.datastructures import FileStorage
+
+from conftest import add_user
+from extensions import db
+from models import School, Event, EventRegistration
+from reconciliation import reconcile, reconcile_file, DUPLICATE, INVALID, MATCHED, UNMATCHED
+from sharding import shard_router
+
+
+def _add_registration(school_id, event_id, user_id, reference, amount=10.0):
+    session = shard_router.session_for(school_id)
+    session.add(Event(id=event_id, title='Gala', date=date(2026, 12, 1), school_id=school_id,
+                      created_by=user_id, price=amount))
+    session.add(EventRegistration(user_id=user_id, event_id=event_id, status='pending',
+                                  payment_amount=amount, payment_reference=reference))
+    session.commit()
+
+
+def _reconcile(app, lines):
+    statement = io.StringIO('reference,amount\n' + ''.join(f'{line}\n' for line in lines))
+    report = io.StringIO()
+    with app.app_context():
+        summary = reconcile(statement, report)
+    return summary, list(csv.DictReader(io.StringIO(report.getvalue())))
+
+
+def test_non_finite_amounts_are_invalid(app):
+    summary, rows = _reconcile(app, ['ES1-AAAA,nan', 'ES1-BBBB,inf', 'ES1-CCCC,-Infinity'])
+    assert summary == {INVALID: 3}
+    assert {row['detail'] for row in rows} == {'unreadable amount'}
+
+
+def test_reference_on_two_shards_is_a_duplicate(make_app):
+    app = make_app(SHARDING_ENABLED=True)
+    with app.app_context():
+        schools = [School(name='North High', location='North'), School(name='South High', location='South')]
+        db.session.add_all(schools)
+        db.session.commit()
+        school_ids = [school.id for school in schools]
+    user_id = add_user(app, 'alice')
+    with app.app_context():
+        _add_registration(school_ids[0], 1, user_id, 'ES1-SAME')
+        _add_registration(school_ids[1], 2, user_id, 'ES1-SAME')
+        _add_registration(school_ids[1], 3, user_id, 'ES3-ONLY')
+
+    summary, rows = _reconcile(app, ['ES1-SAME,10.00', 'ES3-ONLY,10.00'])
+    assert summary == {DUPLICATE: 1, MATCHED: 1}
+    assert rows[0]['reference'] == 'ES1-SAME'
+    assert rows[0]['detail'] == 'reference matches registrations in 2 shards'
+    with app.app_context():
+        # Neither shard marked the ambiguous reference paid
+        for school_id in school_ids:
+            statuses = shard_router.session_for(school_id).query(
+                EventRegistration.payment_reference, EventRegistration.payment_status).all()
+            assert all(status == 'unpaid' for reference, status in statuses if reference == 'ES1-SAME')
+
+
+def test_comma_is_only_a_thousands_separator(app):
+    summary, rows = _reconcile(app, ['ES1-AAAA,"10,00"', 'ES1-BBBB,"1,5"', 'ES1-CCCC,"1,250.00"'])
+    # The well-formed amount is read and simply finds no registration
+    assert summary == {INVALID: 2, UNMATCHED: 1}
+    assert {row['reference']: row['amount'] for row in rows} == {
+        'ES1-AAAA': '10,00', 'ES1-BBBB': '1,5', 'ES1-CCCC': '1250.0'}
+
+
+def test_reports_from_the_same_second_do_not_collide(app):
+    names = set()
+    with app.test_request_context():
+        for _ in range(3):
+            upload = FileStorage(io.BytesIO(b'reference,amount\nES1-AAAA,nan\n'), 'statement.csv')
+            summary, name = reconcile_file(upload)
+            assert summary == {INVALID: 1}
+            names.add(name)
+    assert len(names) == 3
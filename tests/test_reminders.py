@@ -0,0 +1,92 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from conftest import add_user
+from extensions import db
+from models import School, Event, EventRegistration, User, SchedulerState
+from reminders import ReminderScheduler, CURSOR_KEY
+
+
+@pytest.fixture
+def sent(app, monkeypatch):
+    emails = []
+    monkeypatch.setattr(app, 'send_email', lambda subject, recipient, body: emails.append((subject, recipient)))
+    return emails
+
+
+def _event(app, day, **fields):
+    fields = dict({'start_time': time(9, 0)}, **fields)
+    with app.app_context():
+        event = Event(title='Gala', date=day, school_id=School.query.one().id,
+                      created_by=User.query.filter_by(role='teacher').one().id, **fields)
+        db.session.add(event)
+        db.session.commit()
+        return event.id
+
+
+def _setup(app, cursor=None):
+    with app.app_context():
+        db.session.add(School(name='North High', location='North'))
+        if cursor is not None:
+            db.session.add(SchedulerState(key=CURSOR_KEY, value=cursor.isoformat()))
+        db.session.commit()
+        school_id = School.query.one().id
+    add_user(app, 'teacher', role='teacher', school_id=school_id)
+    return {name: add_user(app, name) for name in ('alice', 'bob', 'carol')}
+
+
+def _register(app, event_id, users):
+    with app.app_context():
+        db.session.add_all([
+            EventRegistration(user_id=users['alice'], event_id=event_id, status='confirmed'),
+            EventRegistration(user_id=users['bob'], event_id=event_id, status='cancelled'),
+            EventRegistration(user_id=users['carol'], event_id=event_id, status='confirmed'),
+        ])
+        db.session.get(User, users['carol']).is_active = False
+        db.session.commit()
+
+
+def _tick(app, now):
+    with app.app_context():
+        return ReminderScheduler().tick(now)
+
+
+def test_restart_resumes_from_the_stored_cursor(app, sent):
+    start = datetime(2026, 11, 2, 8, 0)
+    users = _setup(app, cursor=start)
+    # The start reminder is due 24 hours ahead, at 09:00 on the 2nd
+    _register(app, _event(app, date(2026, 11, 3)), users)
+
+    assert _tick(app, start + timedelta(minutes=30)) == 0
+    # Down from 08:30 to 10:00: the missed reminder is sent on restart, once
+    assert _tick(app, start + timedelta(hours=2)) == 1
+    assert _tick(app, start + timedelta(hours=2, minutes=5)) == 0
+
+    # Only confirmed registrants with active accounts
+    assert sent == [('Reminder: Gala starts soon', 'alice@example.com')]
+    with app.app_context():
+        assert db.session.get(SchedulerState, CURSOR_KEY).value == (start + timedelta(hours=2, minutes=5)).isoformat()
+
+
+def test_first_run_does_not_replay_the_past(app, sent):
+    users = _setup(app)
+    # Started in an hour, so its reminder was due 23 hours ago
+    soon = datetime.now() + timedelta(hours=1)
+    _register(app, _event(app, soon.date(), start_time=soon.time()), users)
+
+    assert _tick(app, datetime.now()) == 0
+    assert sent == []
+
+
+def test_deadline_reminders_only_for_events_taking_registrations(app, sent):
+    start = datetime(2026, 11, 1, 0, 0)
+    users = _setup(app, cursor=start)
+    # Registration closes at the end of the 4th; the reminder is due 48 hours earlier
+    required = _event(app, date(2026, 11, 20), registration_required=True, registration_deadline=date(2026, 11, 4))
+    _event(app, date(2026, 11, 21), registration_required=False, registration_deadline=date(2026, 11, 4))
+    _register(app, required, users)
+
+    assert _tick(app, datetime(2026, 11, 2, 23, 58)) == 0
+    assert _tick(app, datetime(2026, 11, 3, 0, 0)) == 1
+    assert sent == [('Reminder: registration for Gala closes soon', 'alice@example.com')]
@@ -0,0 +1,85 @@
+from datetime import date
+
+from conftest import add_user
+from extensions import db
+from models import School, Event, EventRegistration, SchoolMonthlyRollup, ArchivedEvent, ArchivedEventRegistration
+from rollups import rebuild_rollups
+from sharding import shard_router
+
+
+def _setup(app):
+    with app.app_context():
+        school = School(name='North High', location='North')
+        db.session.add(school)
+        db.session.commit()
+        school_id = school.id
+    teacher_id = add_user(app, 'teacher', role='teacher', school_id=school_id)
+    student_id = add_user(app, 'alice')
+    with app.app_context():
+        event = Event(title='Gala', date=date(2026, 12, 1), school_id=school_id, created_by=teacher_id)
+        db.session.add(event)
+        db.session.commit()
+        registration = EventRegistration(user_id=student_id, event_id=event.id, status='confirmed')
+        db.session.add(registration)
+        db.session.commit()
+        return school_id, event.id, registration.id
+
+
+def _rollup(school_id):
+    row = SchoolMonthlyRollup.query.filter_by(school_id=school_id, month='2026-12').one()
+    return row.registrations, row.confirmed, row.cancelled
+
+
+def test_changing_an_expired_event_keeps_its_rollup(app):
+    school_id, event_id, _ = _setup(app)
+    with app.app_context():
+        event = db.session.get(Event, event_id)
+        db.session.commit()  # expires the event
+        event.layout_3d = '[]'
+        db.session.commit()
+        assert _rollup(school_id) == (1, 1, 0)
+
+
+def test_assigning_an_expired_registration_moves_it_between_metrics(app):
+    school_id, _, registration_id = _setup(app)
+    with app.app_context():
+        registration = db.session.get(EventRegistration, registration_id)
+        db.session.commit()  # expires the registration
+        registration.status = 'cancelled'
+        db.session.commit()
+        assert _rollup(school_id) == (1, 0, 1)
+
+
+def test_rebuild_repairs_each_shard(make_app):
+    app = make_app(SHARDING_ENABLED=True)
+    with app.app_context():
+        schools = [School(name='North High', location='North'), School(name='South High', location='South')]
+        db.session.add_all(schools)
+        db.session.commit()
+        school_ids = [school.id for school in schools]
+    teacher_id = add_user(app, 'teacher', role='teacher', school_id=school_ids[0])
+    student_id = add_user(app, 'alice')
+    with app.app_context():
+        for event_id, school_id in enumerate(school_ids, start=1):
+            session = shard_router.session_for(school_id)
+            session.add(Event(id=event_id, title='Gala', date=date(2026, 12, 1), school_id=school_id,
+                              created_by=teacher_id))
+            session.add(EventRegistration(user_id=student_id, event_id=event_id, status='confirmed'))
+            session.commit()
+        # One archived registration for the first school, in the shared archive database
+        db.session.add(ArchivedEvent(id=100, title='Old Gala', date=date(2026, 12, 5), school_id=school_ids[0],
+                                     created_by=teacher_id))
+        db.session.add(ArchivedEventRegistration(user_id=student_id, event_id=100, status='attended'))
+        db.session.commit()
+
+        shard = shard_router.session_for(school_ids[0])
+        shard.query(SchoolMonthlyRollup).update({'registrations': 99})
+        shard.commit()
+
+        rebuild_rollups()
+
+        for school_id, expected in zip(school_ids, (2, 1)):
+            row = shard_router.session_for(school_id).query(SchoolMonthlyRollup).one()
+            assert (row.school_id, row.registrations) == (school_id, expected)
+        # Nothing lands in the catalog database, which the dashboard does not read when sharded
+        assert SchoolMonthlyRollup.query.count() == 0
@@ -0,0 +1,85 @@
+import pytest
+
+from extensions import db
+from models import School
+from school_index import school_index
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    # The index is per process; load it from this test's database
+    school_index.loaded = False
+    yield
+    school_index.loaded = False
+
+
+def _add_schools(app, *schools):
+    with app.app_context():
+        rows = [School(name=name, location=location) for name, location in schools]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [row.id for row in rows]
+
+
+def _names(app, query, limit=10):
+    with app.app_context():
+        return [name for _, name, _ in school_index.search(query, limit)]
+
+
+def test_every_word_must_prefix_match(app):
+    _add_schools(app, ('North High', 'Springfield'), ('North Academy', 'Shelbyville'), ('South High', 'Springfield'))
+
+    assert _names(app, 'nor') == ['North Academy', 'North High']
+    assert _names(app, 'high spring') == ['North High', 'South High']
+    assert _names(app, 'north shelby') == ['North Academy']
+    assert _names(app, 'nor', limit=1) == ['North Academy']
+
+
+def test_names_starting_with_the_query_rank_first(app):
+    _add_schools(app, ('Academy of Oak', 'Oakdale'), ('Oak Ridge', 'Hill Valley'))
+
+    assert _names(app, 'oak') == ['Oak Ridge', 'Academy of Oak']
+
+
+def test_substrings_fall_back_to_trigrams(app):
+    _add_schools(app, ('Greenwood High', 'Riverside'), ('Lake School', 'Riverside'))
+
+    assert _names(app, 'wood') == ['Greenwood High']
+    assert _names(app, 'zz') == []
+
+
+def test_committed_changes_update_a_loaded_index(app):
+    school_id, = _add_schools(app, ('North High', 'Springfield'))
+    assert _names(app, 'north') == ['North High']
+
+    with app.app_context():
+        db.session.add(School(name='North Academy', location='Shelbyville'))
+        db.session.get(School, school_id).name = 'Lakeside High'
+        db.session.commit()
+        assert school_index.loaded
+        assert _names(app, 'north') == ['North Academy']
+        assert _names(app, 'lake') == ['Lakeside High']
+
+        db.session.delete(db.session.get(School, school_id))
+        db.session.commit()
+        assert _names(app, 'lake') == []
+
+
+def test_rolled_back_changes_are_not_indexed(app):
+    _add_schools(app, ('North High', 'Springfield'))
+    assert _names(app, 'north') == ['North High']
+
+    with app.app_context():
+        db.session.add(School(name='North Academy', location='Shelbyville'))
+        db.session.flush()
+        db.session.rollback()
+        assert _names(app, 'north') == ['North High']
+
+
+def test_search_endpoint_clamps_the_limit(app, client):
+    _add_schools(app, *[(f'School {n}', 'Springfield') for n in range(60)])
+
+    for limit, expected in (('0', 1), ('-5', 1), ('3', 3), ('100', 50)):
+        response = client.get(f'/auth/schools/search?q=school&limit={limit}')
+        assert response.status_code == 200
+        assert len(response.get_json()) == expected
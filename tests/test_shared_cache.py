@@ -0,0 +1,27 @@
+from shared_cache import SharedCache, LOCK_PREFIX
+
+
+def test_lock_wait_timeout_computes_without_caching_or_unlocking():
+    cache = SharedCache()
+    cache.lock_timeout = 0.1
+    lock_key = LOCK_PREFIX + 'events:0:index'
+    # Another worker is recomputing and has not finished
+    assert cache.backend.add(lock_key, True, 60)
+
+    assert cache.get_or_set('events', 'index', lambda: 'fresh') == 'fresh'
+    assert cache.backend.get('events:0:index') is None
+    assert cache.backend.get(lock_key) is True
+
+
+def test_lock_holder_stores_the_value_and_releases_the_lock():
+    cache = SharedCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'value'
+
+    assert cache.get_or_set('events', 'index', compute) == 'value'
+    assert cache.get_or_set('events', 'index', compute) == 'value'
+    assert len(calls) == 1
+    assert cache.backend.get(LOCK_PREFIX + 'events:0:index') is None
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from conftest import add_user
+from extensions import db
+from models import User
+
+
+def _issue(client, username='alice', password='password123'):
+    return client.post('/api/auth/token', json={'username': username, 'password': password})
+
+
+def _me(client, access_token):
+    return client.get('/api/me', headers={'Authorization': f'Bearer {access_token}'})
+
+
+@pytest.mark.parametrize('path', ['/api/auth/token', '/api/auth/refresh', '/api/auth/revoke'])
+def test_auth_endpoints_reject_a_json_body_that_is_not_an_object(client, path):
+    response = client.post(path, json=[1, 2])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'invalid_request'
+
+
+def test_refresh_token_of_the_wrong_type_is_invalid(app, client):
+    add_user(app, 'alice')
+    response = client.post('/api/auth/refresh', json={'refresh_token': 5})
+    assert response.status_code == 401
+
+
+def test_issued_access_token_authorizes_without_a_session(app, client):
+    user_id = add_user(app, 'alice')
+    tokens = _issue(client).get_json()
+    assert tokens['token_type'] == 'Bearer' and tokens['expires_in'] == app.config['API_ACCESS_TOKEN_TTL']
+
+    response = _me(app.test_client(), tokens['access_token'])
+    assert response.status_code == 200
+    assert response.get_json() == {'id': user_id, 'role': 'student', 'school_id': None}
+    assert app.test_client().get('/api/me').status_code == 401
+
+
+def test_bad_credentials_and_disabled_accounts_get_no_tokens(app, client):
+    user_id = add_user(app, 'alice')
+    assert _issue(client, password='wrong-password').status_code == 401
+    assert _issue(client, username='nobody').status_code == 401
+    with app.app_context():
+        db.session.get(User, user_id).is_active = False
+        db.session.commit()
+    assert _issue(client).status_code == 403
+
+
+def test_tokens_are_not_interchangeable(app, client):
+    add_user(app, 'alice')
+    tokens = _issue(client).get_json()
+    assert _me(client, tokens['refresh_token']).status_code == 401
+    assert client.post('/api/auth/refresh', json={'refresh_token': tokens['access_token']}).status_code == 401
+    assert _me(client, tokens['access_token'] + 'x').status_code == 401
+
+
+def test_expired_access_token_is_rejected(app, client, monkeypatch):
+    add_user(app, 'alice')
+    tokens = _issue(client).get_json()
+    assert _me(client, tokens['access_token']).status_code == 200
+    later = time.time() + app.config['API_ACCESS_TOKEN_TTL'] + 5
+    monkeypatch.setattr(time, 'time', lambda: later)
+
+    assert _me(client, tokens['access_token']).status_code == 401
+    # The refresh token lives longer and still works
+    response = client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 200
+
+
+def test_refresh_token_is_single_use_and_picks_up_role_changes(app, client):
+    user_id = add_user(app, 'alice')
+    tokens = _issue(client).get_json()
+    with app.app_context():
+        db.session.get(User, user_id).role = 'teacher'
+        db.session.commit()
+
+    response = client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 200
+    assert _me(client, response.get_json()['access_token']).get_json()['role'] == 'teacher'
+    reused = client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert reused.status_code == 401
+
+
+def test_refresh_for_a_disabled_account_is_refused(app, client):
+    user_id = add_user(app, 'alice')
+    tokens = _issue(client).get_json()
+    with app.app_context():
+        db.session.get(User, user_id).is_active = False
+        db.session.commit()
+    response = client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 403
+
+
+def test_revoke_kills_both_tokens(app, client):
+    add_user(app, 'alice')
+    tokens = _issue(client).get_json()
+    response = client.post('/api/auth/revoke', json={'refresh_token': tokens['refresh_token']},
+                           headers={'Authorization': f"Bearer {tokens['access_token']}"})
+    assert response.status_code == 204
+
+    assert _me(client, tokens['access_token']).status_code == 401
+    assert client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']}).status_code == 401
+    # Revoking again is harmless
+    assert client.post('/api/auth/revoke', json={'refresh_token': tokens['refresh_token']}).status_code == 204
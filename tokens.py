@@ -0,0 +1,142 @@
+"""
+Stateless bearer tokens for API clients (kiosks, mobile apps).
+
+Access tokens are signed with app.serializer and carry the user id, role and
+school_id, so read-only API endpoints can authorize a request without a session
+cookie, load_user or a users lookup. They are short-lived; refresh tokens are
+longer-lived and are the only place the database is consulted again (to pick up
+deactivated accounts and role changes).
+
+Revocation uses an in-memory denylist of token ids. Entries are dropped once the
+token would have expired anyway, so it stays small. The denylist is per process:
+a revoked access token may still be accepted by another worker until it expires,
+which is why access tokens are kept short.
+"""
+import secrets
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, request, g, jsonify
+from flask_login import current_user
+from itsdangerous import BadSignature, SignatureExpired
+
+ACCESS_SALT = 'api-access'
+REFRESH_SALT = 'api-refresh'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class TokenPrincipal:
+    """The caller described by an access token; usable with policy.scoped()."""
+    is_authenticated = True
+    is_active = True
+
+    def __init__(self, claims):
+        self.id = claims['uid']
+        self.role = claims['role']
+        self.school_id = claims.get('sid')
+        self.jti = claims['jti']
+        self.expires_at = claims['exp']
+
+
+class Denylist:
+    def __init__(self, prune_every=256):
+        self._entries = {}  # jti -> unix time after which the token is dead anyway
+        self._lock = threading.Lock()
+        self._prune_every = prune_every
+        self._adds = 0
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._entries[jti] = expires_at
+            self._adds += 1
+            if self._adds % self._prune_every == 0:
+                now = time.time()
+                self._entries = {k: v for k, v in self._entries.items() if v > now}
+
+    def __contains__(self, jti):
+        with self._lock:
+            return jti in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+denylist = Denylist()
+
+
+def _claims(user, ttl, kind):
+    return {
+        'uid': user.id,
+        'role': user.role,
+        'sid': user.school_id,
+        'jti': secrets.token_urlsafe(9),
+        'typ': kind,
+        'exp': int(time.time()) + ttl
+    }
+
+
+def issue_tokens(user):
+    access_ttl = current_app.config['API_ACCESS_TOKEN_TTL']
+    refresh_ttl = current_app.config['API_REFRESH_TOKEN_TTL']
+    serializer = current_app.serializer
+    return {
+        'token_type': 'Bearer',
+        'access_token': serializer.dumps(_claims(user, access_ttl, 'access'), salt=ACCESS_SALT),
+        'refresh_token': serializer.dumps(_claims(user, refresh_ttl, 'refresh'), salt=REFRESH_SALT),
+        'expires_in': access_ttl
+    }
+
+
+def decode_token(token, kind='access'):
+    """Return the token's claims, or None if it is forged, expired or revoked."""
+    if not isinstance(token, str):
+        return None
+    salt = ACCESS_SALT if kind == 'access' else REFRESH_SALT
+    ttl = current_app.config['API_ACCESS_TOKEN_TTL' if kind == 'access' else 'API_REFRESH_TOKEN_TTL']
+    try:
+        claims = current_app.serializer.loads(token, salt=salt, max_age=ttl)
+    except (BadSignature, SignatureExpired):
+        return None
+    if claims.get('typ') != kind or claims['jti'] in denylist:
+        return None
+    return claims
+
+
+def revoke(claims):
+    denylist.add(claims['jti'], claims['exp'])
+
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[7:].strip()
+    return None
+
+
+def token_required(view):
+    """
+    Authorize from a bearer token without touching the database. Browser pages
+    calling the API with their session cookie are still accepted, but only for
+    safe methods: the API blueprint is exempt from CSRF protection, so a
+    cookie-authenticated POST would be forgeable.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        token = bearer_token()
+        if token:
+            claims = decode_token(token)
+            if claims is None:
+                return jsonify(error='invalid_token'), 401
+            g.api_user = TokenPrincipal(claims)
+        elif current_user.is_authenticated and request.method in SAFE_METHODS:
+            g.api_user = current_user._get_current_object()
+        else:
+            return jsonify(error='authentication_required'), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def init_app(app):
+    app.config.setdefault('API_ACCESS_TOKEN_TTL', 15 * 60)
+    app.config.setdefault('API_REFRESH_TOKEN_TTL', 14 * 24 * 3600)